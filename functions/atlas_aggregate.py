@@ -0,0 +1,88 @@
+"""Write side of the sharded catalog aggregate (see "Catalog aggregates" in atlas_chat).
+
+Kept out of atlas_chat because firestore_fn and firebase_admin.firestore pull in the Firestore
+client and grpc at import; main.py only loads this module for the atlasCatalogAggregate
+trigger, the rebuild script and deploy-time discovery.
+"""
+
+import time
+import traceback
+from typing import Any, Dict, Optional
+
+from firebase_admin import firestore
+from firebase_functions import firestore_fn
+
+import atlas_chat
+
+
+@firestore.transactional
+def _write_aggregate_entry(transaction, ref, book_id: str, entry: Optional[Dict[str, Any]], event_ms: int) -> bool:
+	snap = ref.get(transaction=transaction)
+	entries = atlas_chat._decode_aggregate_shard(snap.to_dict() or {}, markers=True) if snap.exists else {}
+	if entries is None:
+		atlas_chat.logger.error(f"[atlasCatalogAggregate] {ref.id} has a stale format; run scripts/rebuild_catalog_aggregate.py")
+		return False
+
+	prev = entries.get(book_id)
+	# Triggers are at-least-once and unordered; never let an older write replace a newer one,
+	# including a deletion (kept as a marker).
+	if prev is not None and atlas_chat._aggregate_entry_ms(prev) > event_ms:
+		return False
+	if entry is None and prev is not None and "_deleted_ms" in prev:
+		return False
+	entries[book_id] = entry if entry is not None else atlas_chat._aggregate_marker(book_id, event_ms)
+
+	expired = event_ms - atlas_chat.ATLAS_CATALOG_AGGREGATE_MARKER_TTL_SEC * 1000
+	for bid in [b for b, e in entries.items() if "_deleted_ms" in e and e["_deleted_ms"] < expired]:
+		del entries[bid]
+	transaction.set(ref, atlas_chat._encode_aggregate_shard(entries))
+	return True
+
+
+def _apply_aggregate_write(book_id: str, data: Optional[Dict[str, Any]], updated_ms: int) -> bool:
+	db = atlas_chat._get_db()
+	ref = db.collection(atlas_chat.ATLAS_CATALOG_AGGREGATE_COLLECTION).document(atlas_chat._aggregate_shard_id(book_id))
+	entry = atlas_chat._aggregate_entry(atlas_chat._book_record_from_doc(book_id, data, updated_ms)) if data is not None else None
+	return _write_aggregate_entry(db.transaction(), ref, book_id, entry, updated_ms)
+
+
+def _rebuild_catalog_aggregates() -> int:
+	items = atlas_chat._read_atlas_books()
+	shards: Dict[str, Dict[str, Dict[str, Any]]] = {
+		f"shard-{i:03d}": {} for i in range(atlas_chat.ATLAS_CATALOG_AGGREGATE_SHARDS)
+	}
+	for rec in items:
+		shards[atlas_chat._aggregate_shard_id(rec["id"])][rec["id"]] = atlas_chat._aggregate_entry(rec)
+
+	db = atlas_chat._get_db()
+	coll = db.collection(atlas_chat.ATLAS_CATALOG_AGGREGATE_COLLECTION)
+	batch = db.batch()
+	for shard_id, entries in shards.items():
+		batch.set(coll.document(shard_id), atlas_chat._encode_aggregate_shard(entries))
+	batch.commit()
+	return len(items)
+
+
+@firestore_fn.on_document_written(document="atlasBooks/{bookId}")
+def atlasCatalogAggregate(event: firestore_fn.Event[firestore_fn.Change[Optional[firestore_fn.DocumentSnapshot]]]) -> None:
+	book_id = str((event.params or {}).get("bookId") or "")
+	if not book_id:
+		return
+
+	after = event.data.after if event.data is not None else None
+	if after is not None and after.exists:
+		data: Optional[Dict[str, Any]] = after.to_dict() or {}
+		updated_ms = atlas_chat._doc_updated_ms(after)
+	else:
+		data = None
+		updated_ms = int(event.time.timestamp() * 1000) if hasattr(event.time, "timestamp") else int(time.time() * 1000)
+
+	try:
+		changed = _apply_aggregate_write(book_id, data, updated_ms)
+	except Exception as e:
+		atlas_chat.logger.error(f"[atlasCatalogAggregate] {book_id} failed: {e}\n{traceback.format_exc()}")
+		raise
+	atlas_chat.logger.info(
+		f"[atlasCatalogAggregate] book={book_id} shard={atlas_chat._aggregate_shard_id(book_id)} "
+		f"{'removed' if data is None else 'upserted'} changed={changed}"
+	)
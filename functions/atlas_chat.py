@@ -1,32 +1,70 @@
 import os
 import re
+import gzip
 import time
+import sys
 import json
+import hashlib
+import heapq
+import zlib
 import logging
+import threading
 import traceback
-from typing import Dict, Any, List, Tuple, Optional
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections import OrderedDict
+from functools import lru_cache
+from itertools import groupby
+from types import MappingProxyType
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, FrozenSet, List, NamedTuple, Tuple, Optional, Sequence
 
-import requests
 from firebase_functions import https_fn
-from firebase_admin import firestore, initialize_app, get_app
 
-try:
-	import pycountry  # optional; improves country-name hints + iso conversions
-except Exception:
-	pycountry = None
+from atlas_geo import GeoMatcher
+from atlas_search import (
+	BM25FIndex,
+	FacetBitmaps,
+	InvertedIndex,
+	TrigramIndex,
+	bits_to_ordinals as _bits_to_ordinals,
+	ordinals_to_bits as _ordinals_to_bits,
+)
+from atlas_text import (
+	fold_name as _fold_name,
+	fold_spans as _fold_spans,
+	fold_terms as _fold_terms,
+	fold_text as _normalize_text,
+)
+from atlas_countries import (
+	extract_iso2_candidates as _extract_iso2_candidates,
+	iso2_to_country_name as _iso2_to_country_name,
+)
 
 try:
-	get_app()
-except ValueError:
-	initialize_app()
+	import brotli  # optional; smaller pre-encoded catalog bodies for clients that accept br
+except Exception:
+	brotli = None
 
+# firebase_admin.firestore (grpc + the Firestore client, ~300ms) and requests are imported on
+# first use, so an instance whose catalog comes from a file, the static export or an already
+# warm cache never pays for them. test_import_budget.py keeps it that way.
 _db = None
+_DB_LOCK = threading.Lock()
 
 
 def _get_db():
 	global _db
 	if _db is None:
-		_db = firestore.client()
+		with _DB_LOCK:
+			if _db is None:
+				from firebase_admin import firestore, get_app, initialize_app
+
+				try:
+					get_app()
+				except ValueError:
+					initialize_app()
+				_db = firestore.client()
 	return _db
 
 logger = logging.getLogger()
@@ -36,11 +74,31 @@ ATLAS_CHAT_MODEL = os.environ.get("ATLAS_CHAT_MODEL") or "gpt-4o-mini"
 ATLAS_CHAT_CACHE_TTL_SEC = int(os.environ.get("ATLAS_CHAT_CACHE_TTL_SEC") or 600)
 ATLAS_CHAT_DEBUG = (os.environ.get("ATLAS_CHAT_DEBUG") or "").strip() == "1"
 ATLAS_CHAT_BUILD = os.environ.get("ATLAS_CHAT_BUILD") or "atlas_chat_2026_06_17b"
-
-_ATLAS_BOOK_CACHE_TS = 0.0
-_ATLAS_BOOK_CACHE: List[Dict[str, Any]] = []
-_ATLAS_BOOK_BY_ID: Dict[str, Dict[str, Any]] = {}
-_ATLAS_AVAILABLE_COUNTRIES_CACHE: List[Dict[str, str]] = []
+ATLAS_CATALOG_CACHE_CONTROL = (
+	os.environ.get("ATLAS_CATALOG_CACHE_CONTROL")
+	or "public, max-age=60, s-maxage=300, stale-while-revalidate=600"
+)
+
+# Catalog version = newest Firestore update_time (ms) seen, bumped by one when a deletion is
+# observed (never from the local clock, so instances that saw the same changes agree).
+# Deletions are remembered as tombstones so ?since= deltas can report them. An instance knows
+# nothing about deletions before its first load or past an evicted tombstone, so versions
+# older than either need a full snapshot.
+ATLAS_CATALOG_TOMBSTONE_LIMIT = int(os.environ.get("ATLAS_CATALOG_TOMBSTONE_LIMIT") or 1000)
+ATLAS_CATALOG_DELTA_MAX_FRACTION = float(os.environ.get("ATLAS_CATALOG_DELTA_MAX_FRACTION") or 0.5)
+
+# Filtered list bodies (?country=, ?tags=, ?pick=) are encoded once per snapshot and filter,
+# like country buckets, for up to ATLAS_CATALOG_FILTER_CACHE distinct filters per snapshot;
+# past that they are sent as plain JSON rather than compressed on every request.
+ATLAS_CATALOG_FILTER_CACHE = int(os.environ.get("ATLAS_CATALOG_FILTER_CACHE") or 256)
+
+# Requests per instance. Above 1 the functions also ask for a full vCPU, which Cloud Run
+# requires for concurrency; the catalog is published as one immutable snapshot, so
+# concurrent requests never observe a half-updated cache.
+ATLAS_FUNCTION_CONCURRENCY = int(os.environ.get("ATLAS_FUNCTION_CONCURRENCY") or 1)
+_CONCURRENCY_OPTIONS: Dict[str, Any] = (
+	{"concurrency": ATLAS_FUNCTION_CONCURRENCY, "cpu": 1} if ATLAS_FUNCTION_CONCURRENCY > 1 else {}
+)
 
 
 # ─────────── Response helpers ───────────
@@ -49,131 +107,107 @@ def _json_response(
 	status: int = 200,
 	*,
 	methods: str = "POST, OPTIONS",
+	cache_control: Optional[str] = None,
 ) -> https_fn.Response:
 	headers = {
 		"Content-Type": "application/json",
 		"Access-Control-Allow-Origin": "*",
-		"Access-Control-Allow-Headers": "Content-Type",
+		"Access-Control-Allow-Headers": "Content-Type, If-None-Match",
 		"Access-Control-Allow-Methods": methods,
 	}
+	if cache_control:
+		headers["Cache-Control"] = cache_control
 	return https_fn.Response(json.dumps(body, ensure_ascii=False), status=status, headers=headers)
 
 
-def _normalize_text(s: Any) -> str:
-	try:
-		txt = str(s or "")
-	except Exception:
-		txt = ""
-	txt = txt.strip().lower()
-	txt = re.sub(r"[^a-z0-9]+", " ", txt)
-	txt = re.sub(r"\s+", " ", txt).strip()
-	return txt
-
-
-def _country_string_to_iso2(val: Any) -> Optional[str]:
-	if val is None:
-		return None
-	try:
-		raw = str(val).strip()
-	except Exception:
-		return None
-	if not raw:
-		return None
-
-	t = raw.strip()
-	t = t.replace("_", " ").replace("-", " ").strip()
-
-	if len(t) == 2 and t.isalpha():
-		return t.upper()
-
-	if len(t) == 3 and t.isalpha() and pycountry is not None:
-		try:
-			c = pycountry.countries.get(alpha_3=t.upper())
-			if c and getattr(c, "alpha_2", None):
-				return str(c.alpha_2).upper()
-		except Exception:
-			pass
-
-	if pycountry is not None:
+def _encode_json_body(body: Dict[str, Any]) -> Dict[str, Any]:
+	raw = json.dumps(body, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+	encoded: Dict[str, Any] = {
+		"etag": '"' + hashlib.sha256(raw).hexdigest()[:32] + '"',
+		"identity": raw,
+		"gzip": gzip.compress(raw, compresslevel=9),
+	}
+	if brotli is not None:
 		try:
-			c = pycountry.countries.lookup(raw)
-			if c and getattr(c, "alpha_2", None):
-				return str(c.alpha_2).upper()
+			encoded["br"] = brotli.compress(raw, quality=9)
 		except Exception:
 			pass
+	return encoded
 
-	return None
-
-
-def _extract_iso2_candidates(val: Any) -> List[str]:
-	out: List[str] = []
 
-	def _add(x: Any):
-		iso2 = _country_string_to_iso2(x)
-		if iso2:
-			out.append(iso2)
-
-	if isinstance(val, dict):
-		for key in ("iso2", "code", "country", "value", "name"):
-			if key in val:
-				_add(val.get(key))
-		for v in val.values():
-			if isinstance(v, str):
-				_add(v)
-			elif isinstance(v, list):
-				for vv in v:
-					_add(vv)
-	elif isinstance(val, list):
-		for item in val:
-			_add(item)
-	elif isinstance(val, str):
-		raw = [p.strip() for p in re.split(r"[,;|/]", val) if p.strip()]
-		for item in raw:
-			_add(item)
-	else:
-		_add(val)
-
-	seen = set()
-	uniq: List[str] = []
-	for x in out:
-		if x in seen:
+def _pick_content_encoding(accept_encoding: str, encoded: Dict[str, Any]) -> str:
+	accepted: Dict[str, float] = {}
+	for part in str(accept_encoding or "").split(","):
+		bits = [b.strip() for b in part.split(";")]
+		name = bits[0].lower()
+		if not name:
 			continue
-		seen.add(x)
-		uniq.append(x)
-	return uniq
+		q = 1.0
+		for param in bits[1:]:
+			if param.lower().startswith("q="):
+				try:
+					q = float(param[2:])
+				except ValueError:
+					q = 0.0
+		accepted[name] = q
+
+	for name in ("br", "gzip"):
+		q = accepted.get(name, accepted.get("*", 0.0))
+		if q > 0 and encoded.get(name):
+			return name
+	return "identity"
+
+
+# Each encoding of a body is a different byte sequence, so each gets its own strong ETag.
+_ETAG_SUFFIXES = {"identity": "", "gzip": "-gz", "br": "-br"}
+
+
+def _encoding_etag(etag: str, encoding: str) -> str:
+	suffix = _ETAG_SUFFIXES.get(encoding, "")
+	return f"{etag[:-1]}{suffix}\"" if suffix else etag
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+	# Any encoding's tag revalidates the body: they all name the same content.
+	variants = {_encoding_etag(etag, encoding) for encoding in _ETAG_SUFFIXES}
+	for tag in str(if_none_match or "").split(","):
+		tag = tag.strip()
+		if tag == "*":
+			return True
+		if tag.startswith("W/"):
+			tag = tag[2:]
+		if tag in variants:
+			return True
+	return False
+
+
+def _encoded_json_response(
+	req: https_fn.Request,
+	encoded: Dict[str, Any],
+	*,
+	methods: str = "GET, OPTIONS",
+	cache_control: str = ATLAS_CATALOG_CACHE_CONTROL,
+) -> https_fn.Response:
+	headers = {
+		"Access-Control-Allow-Origin": "*",
+		"Access-Control-Allow-Headers": "Content-Type, If-None-Match",
+		"Access-Control-Allow-Methods": methods,
+		"Access-Control-Expose-Headers": "ETag",
+		"Cache-Control": cache_control,
+		"Vary": "Accept-Encoding",
+	}
+	encoding = _pick_content_encoding(req.headers.get("Accept-Encoding") or "", encoded)
+	headers["ETag"] = _encoding_etag(encoded["etag"], encoding)
+	if _etag_matches(req.headers.get("If-None-Match") or "", encoded["etag"]):
+		return https_fn.Response(b"", status=304, headers=headers)
 
-
-def _iso2_to_country_name(iso2: str) -> str:
-	code = str(iso2 or "").strip().upper()
-	if not (len(code) == 2 and code.isalpha()):
-		return ""
-	if pycountry is not None:
-		try:
-			c = pycountry.countries.get(alpha_2=code)
-			if c and getattr(c, "name", None):
-				return str(c.name)
-		except Exception:
-			pass
-	return code
+	headers["Content-Type"] = "application/json; charset=utf-8"
+	if encoding != "identity":
+		headers["Content-Encoding"] = encoding
+	return https_fn.Response(encoded[encoding], status=200, headers=headers)
 
 
 # ─────────── Book indexing ───────────
-def _places_for_book(b: Dict[str, Any]) -> Dict[str, List[Dict[str, str]]]:
-	def build(field_name: str) -> List[Dict[str, str]]:
-		out: List[Dict[str, str]] = []
-		for iso2 in _extract_iso2_candidates(b.get(field_name)):
-			name = _iso2_to_country_name(iso2)
-			out.append({"iso2": iso2, "name": name or iso2})
-		return out
-
-	return {
-		"override": build("country_override"),
-		"setting": build("setting_country"),
-		"author_country": build("author_country"),
-		"author_origin": build("author_origin"),
-	}
-
-
 def _iso2_sets_for_book(b: Dict[str, Any]) -> Dict[str, set]:
 	places = b.get("_places") or {}
 
@@ -194,105 +228,974 @@ def _iso2_sets_for_book(b: Dict[str, Any]) -> Dict[str, set]:
 	return {"override": override, "setting": setting, "author": author, "any": any_place}
 
 
-def _build_book_search_blob(b: Dict[str, Any]) -> str:
-	parts: List[str] = []
-	for k in ("title", "author", "summary", "description", "year"):
-		v = b.get(k) or ""
-		if v:
-			parts.append(str(v))
+def _doc_updated_ms(doc: Any) -> int:
+	ts = getattr(doc, "update_time", None)
+	try:
+		return int(ts.timestamp() * 1000) if ts is not None else 0
+	except Exception:
+		return 0
+
+
+# ─────────── Compact book store ───────────
+# Cached books are __slots__ records rather than dicts. Tags, categories and ISO2 codes go
+# through per-instance vocabularies (term <-> integer id), and every distinct combination is
+# stored once: books with the same tags share one tuple, books with the same countries share
+# one _places / _iso2_sets pair. A description identical to the summary reuses its string.
+# Publishing a snapshot prunes these tables to what its books use (_retain_shared_tables), so
+# combinations that only older catalogs had do not pile up for the life of the instance.
+class _Vocabulary:
+	__slots__ = ("ids", "_next", "_combos", "_lock")
+
+	def __init__(self):
+		self.ids: Dict[str, int] = {}
+		self._next = 0
+		self._combos: Dict[Tuple[int, ...], Tuple[Tuple[str, ...], Tuple[int, ...]]] = {}
+		self._lock = threading.Lock()
+
+	def id_for(self, term: str) -> int:
+		tid = self.ids.get(term)
+		if tid is None:
+			with self._lock:
+				tid = self.ids.get(term)
+				if tid is None:
+					tid = self._next
+					self._next += 1
+					self.ids[sys.intern(term)] = tid
+		return tid
+
+	def combo(self, values: Any) -> Tuple[Tuple[str, ...], Tuple[int, ...]]:
+		terms = tuple(sys.intern(str(v)) for v in values)
+		ids = tuple(self.id_for(t) for t in terms)
+		hit = self._combos.get(ids)
+		if hit is None:
+			hit = self._combos.setdefault(ids, (terms, ids))
+		return hit
+
+	def retain(self, combos: Dict[Tuple[int, ...], Tuple[Tuple[str, ...], Tuple[int, ...]]]) -> None:
+		# Ids are never reused, so a record built from an id dropped here still reads correctly.
+		live = {tid for ids in combos for tid in ids}
+		with self._lock:
+			self._combos = combos
+			self.ids = {term: tid for term, tid in self.ids.items() if tid in live}
+
+
+_TAG_VOCAB = _Vocabulary()
+_CATEGORY_VOCAB = _Vocabulary()
+_COUNTRY_VOCAB = _Vocabulary()
+
+_PLACE_FIELDS = (
+	("override", "country_override"),
+	("setting", "setting_country"),
+	("author_country", "author_country"),
+	("author_origin", "author_origin"),
+)
+_SHARED_PLACE_ENTRIES: Dict[str, Dict[str, str]] = {}
+_SHARED_GEO: Dict[Tuple[Tuple[int, ...], ...], Tuple[Dict[str, Any], Dict[str, frozenset]]] = {}
+
+_BOOK_RECORD_FIELDS = (
+	"id", "title", "author", "summary", "description", "year", "page_count", "tags", "categories",
+	"country_override", "setting_country", "author_country", "author_origin", "cover_url",
+	"bookshop_url", "google_books_url", "info_link", "preview_link", "read", "stamp",
+	"_places", "_iso2_sets", "_title_norm", "_author_norm", "_updated_ms", "_tag_ids", "_category_ids",
+)
+_BOOK_RECORD_FIELD_SET = frozenset(_BOOK_RECORD_FIELDS)
+
+
+class BookRecord:
+	"""Slotted catalog record with the read-only mapping API the ranking code expects."""
+
+	__slots__ = _BOOK_RECORD_FIELDS
+
+	def __init__(self, **fields: Any):
+		for key in _BOOK_RECORD_FIELDS:
+			setattr(self, key, fields.get(key))
+
+	def get(self, key: str, default: Any = None) -> Any:
+		if key not in _BOOK_RECORD_FIELD_SET:
+			return default
+		val = getattr(self, key)
+		return default if val is None else val
+
+	def __getitem__(self, key: str) -> Any:
+		if key not in _BOOK_RECORD_FIELD_SET:
+			raise KeyError(key)
+		return getattr(self, key)
+
+	def __contains__(self, key: object) -> bool:
+		return key in _BOOK_RECORD_FIELD_SET
+
+	def keys(self) -> Tuple[str, ...]:
+		return _BOOK_RECORD_FIELDS
+
+
+def _intern_field(val: Any) -> Any:
+	if isinstance(val, str):
+		return sys.intern(val.strip())
+	if isinstance(val, (list, tuple)):
+		return tuple(_intern_field(v) for v in val)
+	return val
+
+
+def _place_entry(iso2: str) -> Dict[str, str]:
+	entry = _SHARED_PLACE_ENTRIES.get(iso2)
+	if entry is None:
+		name = _iso2_to_country_name(iso2)
+		entry = _SHARED_PLACE_ENTRIES.setdefault(iso2, {"iso2": iso2, "name": sys.intern(name or iso2)})
+	return entry
+
+
+def _shared_geo_for_book(b: Any) -> Tuple[Dict[str, Any], Dict[str, frozenset]]:
+	return _shared_geo_for_codes([_extract_iso2_candidates(b.get(field)) for _, field in _PLACE_FIELDS])
+
+
+def _shared_geo_for_codes(codes_per_field: List[Any]) -> Tuple[Dict[str, Any], Dict[str, frozenset]]:
+	combos = [_COUNTRY_VOCAB.combo(codes or ()) for codes in codes_per_field]
+	key = tuple(ids for _, ids in combos)
+	hit = _SHARED_GEO.get(key)
+	if hit is None:
+		places = {name: [_place_entry(iso2) for iso2 in codes] for (name, _), (codes, _) in zip(_PLACE_FIELDS, combos)}
+		sets = {k: frozenset(v) for k, v in _iso2_sets_for_book({"_places": places}).items()}
+		hit = _SHARED_GEO.setdefault(key, (places, sets))
+	return hit
+
+
+def _retain_shared_tables(books: Sequence[Any]) -> None:
+	global _SHARED_PLACE_ENTRIES, _SHARED_GEO
+
+	tags: Dict[Tuple[int, ...], Tuple[Tuple[str, ...], Tuple[int, ...]]] = {}
+	categories: Dict[Tuple[int, ...], Tuple[Tuple[str, ...], Tuple[int, ...]]] = {}
+	live_geo = set()
+	for b in books:
+		if not isinstance(b, BookRecord):
+			continue
+		if b._tag_ids is not None:
+			tags[b._tag_ids] = (b.tags, b._tag_ids)
+		if b._category_ids is not None:
+			categories[b._category_ids] = (b.categories, b._category_ids)
+		live_geo.add(id(b._places))
+
+	geo = {key: hit for key, hit in _SHARED_GEO.items() if id(hit[0]) in live_geo}
+	countries: Dict[Tuple[int, ...], Tuple[Tuple[str, ...], Tuple[int, ...]]] = {}
+	for key, (places, _sets) in geo.items():
+		for (name, _), ids in zip(_PLACE_FIELDS, key):
+			countries[ids] = (tuple(entry["iso2"] for entry in places.get(name) or ()), ids)
+	live_iso2 = {iso2 for codes, _ in countries.values() for iso2 in codes}
+
+	_TAG_VOCAB.retain(tags)
+	_CATEGORY_VOCAB.retain(categories)
+	_COUNTRY_VOCAB.retain(countries)
+	_SHARED_GEO = geo
+	_SHARED_PLACE_ENTRIES = {iso2: e for iso2, e in _SHARED_PLACE_ENTRIES.items() if iso2 in live_iso2}
+
+
+def _book_record_from_doc(
+	bid: str,
+	data: Dict[str, Any],
+	updated_ms: int = 0,
+	derived: Optional[Dict[str, Any]] = None
+) -> BookRecord:
+	summary = str(data.get("summary") or "").strip()
+	description = str(data.get("description") or "").strip()
+	if description == summary:
+		description = summary
+	tags, tag_ids = _TAG_VOCAB.combo(data.get("tags") if isinstance(data.get("tags"), list) else [])
+	categories, category_ids = _CATEGORY_VOCAB.combo(
+		data.get("categories") if isinstance(data.get("categories"), list) else []
+	)
 
-	for k in ("tags", "categories"):
-		v = b.get(k) or []
-		if isinstance(v, list):
-			parts.extend([str(x) for x in v if str(x).strip()])
-		elif isinstance(v, str) and v.strip():
-			parts.append(v)
+	rec = BookRecord(
+		id=bid,
+		title=str(data.get("title") or "").strip(),
+		author=sys.intern(str(data.get("author") or "").strip()),
+		summary=summary,
+		description=description,
+		year=sys.intern(str(data.get("year") or "").strip()),
+		page_count=int(data.get("page_count") or 0),
+		tags=tags,
+		categories=categories,
+		country_override=_intern_field(data.get("country_override")) if data.get("country_override") is not None else "",
+		setting_country=_intern_field(data.get("setting_country")) if data.get("setting_country") is not None else (),
+		author_country=_intern_field(data.get("author_country")) if data.get("author_country") is not None else (),
+		author_origin=_intern_field(data.get("author_origin")) if data.get("author_origin") is not None else (),
+		cover_url=str(data.get("cover_url") or "").strip(),
+		bookshop_url=str(data.get("bookshop_url") or "").strip(),
+		google_books_url=str(data.get("google_books_url") or "").strip(),
+		info_link=str(data.get("info_link") or "").strip(),
+		preview_link=str(data.get("preview_link") or "").strip(),
+		read=data.get("read") is True,
+		stamp=data.get("stamp") is True,
+		_tag_ids=tag_ids,
+		_category_ids=category_ids,
+		_updated_ms=int(updated_ms or 0),
+	)
+
+	if derived is not None:
+		# Aggregate shards carry the place codes and folded text computed by the trigger.
+		iso2 = derived.get("_iso2") or {}
+		rec._places, rec._iso2_sets = _shared_geo_for_codes([iso2.get(name) for name, _ in _PLACE_FIELDS])
+		rec._title_norm = str(derived.get("_title_norm") or "")
+		rec._author_norm = str(derived.get("_author_norm") or "")
+		return rec
+
+	rec._places, rec._iso2_sets = _shared_geo_for_book(rec)
+	rec._title_norm = _normalize_text(rec.title)
+	rec._author_norm = _normalize_text(rec.author)
+	return rec
+
+
+def _available_countries_from_iso2(iso_set) -> List[Dict[str, str]]:
+	available: List[Dict[str, str]] = []
+	for iso2 in sorted([x for x in iso_set if isinstance(x, str) and len(x) == 2]):
+		nm = _iso2_to_country_name(iso2)
+		available.append({"iso2": iso2, "name": nm or iso2})
+	return available
+
+
+# ─────────── Catalog snapshot ───────────
+# Everything a request reads about the catalog lives on one CatalogSnapshot. Publishing
+# builds a complete new snapshot and swaps _ATLAS_CATALOG in a single assignment, so a
+# request that pins a snapshot sees one consistent version for its whole lifetime.
+class CatalogSnapshot:
+	__slots__ = (
+		"version", "loaded_at", "books", "by_id", "available_countries",
+		"tombstones", "history_floor", "country_buckets", "_encoded", "_derived", "_locks", "_locks_guard",
+	)
+
+	def __init__(
+		self,
+		version: int,
+		loaded_at: float,
+		books: Tuple[Dict[str, Any], ...],
+		by_id: Dict[str, Dict[str, Any]],
+		available_countries: Tuple[Dict[str, str], ...],
+		tombstones: "OrderedDict[str, int]",
+		history_floor: int,
+		country_buckets: Dict[str, Tuple[Dict[str, Any], ...]],
+	):
+		self.version = version
+		self.loaded_at = loaded_at
+		self.books = books
+		self.by_id = MappingProxyType(by_id)
+		self.available_countries = available_countries
+		self.tombstones = MappingProxyType(tombstones)
+		self.history_floor = history_floor
+		self.country_buckets = MappingProxyType(country_buckets)
+		self._encoded: Dict[Any, Dict[str, Any]] = {}
+		self._derived: Dict[str, Any] = {}
+		self._locks: Dict[Any, threading.Lock] = {}
+		self._locks_guard = threading.Lock()
+
+	def __len__(self) -> int:
+		return len(self.books)
+
+	def _lock_for(self, key: Any) -> threading.Lock:
+		# One lock per memoized value, so a slow index build never holds up other bodies or indexes.
+		with self._locks_guard:
+			lock = self._locks.get(key)
+			if lock is None:
+				lock = self._locks[key] = threading.Lock()
+		return lock
+
+	def _memo_encoded(self, key: Any, build) -> Dict[str, Any]:
+		encoded = self._encoded.get(key)
+		if encoded is None:
+			with self._lock_for(("encoded", key)):
+				encoded = self._encoded.get(key)
+				if encoded is None:
+					encoded = self._encoded[key] = _encode_json_body(build())
+		return encoded
+
+	def derived(self, name: str, build) -> Any:
+		# Indexes over this snapshot, built once and never mutated. Reloads build them before the
+		# snapshot is published (_prebuild_catalog); otherwise on first use or by warmup.
+		value = self._derived.get(name)
+		if value is None:
+			with self._lock_for(("derived", name)):
+				value = self._derived.get(name)
+				if value is None:
+					value = self._derived[name] = build(self.books)
+		return value
+
+	def facet_bitmaps(self) -> FacetBitmaps:
+		return self.derived("facets", _facet_bitmaps)
+
+	def search_index(self) -> "CatalogSearchIndex":
+		facets = self.facet_bitmaps()
+		return self.derived("search", lambda books: CatalogSearchIndex(books, facets))
+
+	def geo_matcher(self) -> GeoMatcher:
+		return self.derived("geo", lambda _books: GeoMatcher(c["iso2"] for c in self.available_countries))
+
+	def lookup_index(self) -> "LookupIndex":
+		return self.derived("lookup", LookupIndex)
+
+	def typeahead_index(self) -> "TypeaheadIndex":
+		return self.derived("typeahead", TypeaheadIndex)
+
+	def query_planner(self) -> "QueryPlanner":
+		geo = self.geo_matcher()
+		return self.derived("planner", lambda _books: QueryPlanner(geo))
+
+	def encoded_catalog(self, fields: str = "full") -> Dict[str, Any]:
+		def build() -> Dict[str, Any]:
+			rows = [_CLIENT_PROJECTIONS[fields](rec) for rec in self.books]
+			return {"books": rows, "count": len(rows), "version": self.version}
+		return self._memo_encoded(fields, build)
+
+	def encoded_bucket(self, fields: str, iso2: str) -> Optional[Dict[str, Any]]:
+		# Lite buckets are encoded by _prebuild_catalog; others when a country is first requested.
+		books = self.country_buckets.get(iso2)
+		if books is None:
+			return None
+
+		def build() -> Dict[str, Any]:
+			rows = [_CLIENT_PROJECTIONS[fields](b) for b in books]
+			return {"iso2": iso2, "books": rows, "count": len(rows), "version": self.version}
+		return self._memo_encoded((fields, iso2), build)
+
+	def encoded_book(self, book_id: str) -> Optional[Dict[str, Any]]:
+		# One book's detail body, encoded on its first request and reused until the next publish.
+		rec = self.by_id.get(book_id)
+		if rec is None:
+			return None
+		return self._memo_encoded(("book", book_id), lambda: {
+			"book": _book_record_for_client(rec), "version": int(rec.get("_updated_ms") or 0),
+		})
+
+	def filtered_body(self, fields: str, country: Optional[str], tags: Sequence[str], pick: bool) -> Dict[str, Any]:
+		bits = _list_filter_bits(self.facet_bitmaps(), country, list(tags), pick)
+		rows = [_CLIENT_PROJECTIONS[fields](self.books[i]) for i in _bits_to_ordinals(bits)]
+		return {
+			"books": rows, "count": len(rows), "version": self.version,
+			"filter": {"country": country, "tags": list(tags), "pick": pick},
+		}
+
+	def encoded_filtered(self, fields: str, country: Optional[str], tags: Sequence[str], pick: bool) -> Optional[Dict[str, Any]]:
+		# None once ATLAS_CATALOG_FILTER_CACHE other filters are memoized on this snapshot.
+		key = ("filter", fields, country, tuple(sorted(tags)), pick)
+		if key not in self._encoded:
+			if sum(1 for k in list(self._encoded) if k[0] == "filter") >= ATLAS_CATALOG_FILTER_CACHE:
+				return None
+		return self._memo_encoded(key, lambda: self.filtered_body(fields, country, key[3], pick))
+
+
+def _build_catalog_snapshot(
+	items: List[Dict[str, Any]],
+	by_id: Dict[str, Dict[str, Any]],
+	available: List[Dict[str, str]],
+	ts: float,
+	previous: Optional[CatalogSnapshot] = None
+) -> CatalogSnapshot:
+	first_load = previous is None or not previous.books
+	prev_version = previous.version if previous is not None else 0
+	tombstones: "OrderedDict[str, int]" = OrderedDict(previous.tombstones if previous is not None else ())
+
+	version = max([prev_version] + [int(b.get("_updated_ms") or 0) for b in items])
+	history_floor = version if first_load else previous.history_floor
+	removed = [bid for bid in (previous.by_id if previous is not None else ()) if bid not in by_id]
+	if removed:
+		version += 1
+		for bid in removed:
+			tombstones.pop(bid, None)
+			tombstones[bid] = version
+	for bid in [x for x in tombstones if x in by_id]:
+		del tombstones[bid]
+	while len(tombstones) > ATLAS_CATALOG_TOMBSTONE_LIMIT:
+		_, evicted = tombstones.popitem(last=False)
+		history_floor = max(history_floor, evicted)
+
+	return CatalogSnapshot(
+		version=version,
+		loaded_at=ts,
+		books=tuple(items),
+		by_id=dict(by_id),
+		available_countries=tuple(available),
+		tombstones=tombstones,
+		history_floor=history_floor,
+		country_buckets=_group_country_books(items),
+	)
+
+
+_ATLAS_CATALOG = CatalogSnapshot(0, 0.0, (), {}, (), OrderedDict(), 0, {})
+_ATLAS_PUBLISH_LOCK = threading.Lock()
+
+
+def _current_catalog() -> CatalogSnapshot:
+	return _ATLAS_CATALOG
+
+
+def _publish_atlas_books(
+	items: List[Dict[str, Any]],
+	by_id: Dict[str, Dict[str, Any]],
+	available: List[Dict[str, str]],
+	ts: float
+) -> CatalogSnapshot:
+	global _ATLAS_CATALOG
+
+	# Serialize publishers (listener callback vs. reload thread) so tombstones chain correctly;
+	# readers never take this lock. A snapshot replacing a served one gets its bodies and
+	# indexes built here, on the reloading thread, so no request pays for them after the swap.
+	with _ATLAS_PUBLISH_LOCK:
+		previous = _ATLAS_CATALOG
+		snapshot = _build_catalog_snapshot(items, by_id, available, ts, previous)
+		if previous.books and snapshot.books:
+			_prebuild_catalog(snapshot)
+		_ATLAS_CATALOG = snapshot
+		_retain_shared_tables(snapshot.books)
+	return snapshot
+
+
+def _touch_atlas_catalog(items: Sequence[Dict[str, Any]], ts: float) -> bool:
+	# True (and loaded_at moved to ts) when items are exactly the published snapshot's records.
+	with _ATLAS_PUBLISH_LOCK:
+		snapshot = _ATLAS_CATALOG
+		books = snapshot.books
+		if not books or len(items) != len(books) or any(a is not b for a, b in zip(items, books)):
+			return False
+		snapshot.loaded_at = max(snapshot.loaded_at, ts)
+	return True
+
+
+# ─────────── Live catalog sync (Firestore snapshot listener) ───────────
+# With ATLAS_CATALOG_SYNC=listener each instance keeps one on_snapshot watch on
+# atlasBooks and patches only the documents that changed, instead of re-streaming
+# the collection every ATLAS_CHAT_CACHE_TTL_SEC. Any other value keeps polling.
+# The first snapshot is published from the callback; later callbacks only patch the
+# listener's records and a publisher thread coalesces everything that arrives within
+# ATLAS_CATALOG_LISTENER_DEBOUNCE_SEC into one publish (and one index/body rebuild).
+ATLAS_CATALOG_SYNC = (os.environ.get("ATLAS_CATALOG_SYNC") or "poll").strip().lower()
+ATLAS_CATALOG_LISTENER_WAIT_SEC = float(os.environ.get("ATLAS_CATALOG_LISTENER_WAIT_SEC") or 20)
+ATLAS_CATALOG_LISTENER_DEBOUNCE_SEC = float(os.environ.get("ATLAS_CATALOG_LISTENER_DEBOUNCE_SEC") or 2)
+# After a callback fails to patch the catalog the watch is dropped and requests poll instead,
+# until a new listener is tried ATLAS_CATALOG_LISTENER_RETRY_SEC later.
+ATLAS_CATALOG_LISTENER_RETRY_SEC = float(os.environ.get("ATLAS_CATALOG_LISTENER_RETRY_SEC") or 60)
+
+_ATLAS_LISTENER = None
+_ATLAS_LISTENER_START_LOCK = threading.Lock()
+_ATLAS_LISTENER_STATE_LOCK = threading.Lock()
+# Set once the first callback has finished, successfully or not (see _ATLAS_LISTENER_FAILED_AT).
+_ATLAS_LISTENER_READY = threading.Event()
+_ATLAS_LISTENER_FAILED_AT = 0.0
+_ATLAS_LISTENER_BOOKS: Dict[str, Dict[str, Any]] = {}
+_ATLAS_LISTENER_ISO_COUNTS: Dict[str, int] = {}
+# Set by callbacks whose changes are not published yet; drained by the publisher thread.
+_ATLAS_LISTENER_DIRTY = threading.Event()
+_ATLAS_LISTENER_PUBLISHER: Optional[threading.Thread] = None
+_ATLAS_LISTENER_PUBLISHER_GUARD = threading.Lock()
+
+
+def _listener_count_iso2(rec: Dict[str, Any], delta: int) -> None:
+	for iso2 in _book_geo_iso2(rec):
+		n = _ATLAS_LISTENER_ISO_COUNTS.get(iso2, 0) + delta
+		if n > 0:
+			_ATLAS_LISTENER_ISO_COUNTS[iso2] = n
+		else:
+			_ATLAS_LISTENER_ISO_COUNTS.pop(iso2, None)
+
+
+def _apply_atlas_book_changes(changes) -> Tuple[int, int]:
+	upserted = 0
+	removed = 0
+	with _ATLAS_LISTENER_STATE_LOCK:
+		for change in changes or []:
+			doc = change.document
+			bid = doc.id
+			prev = _ATLAS_LISTENER_BOOKS.pop(bid, None)
+			if prev is not None:
+				_listener_count_iso2(prev, -1)
+
+			if change.type.name == "REMOVED":
+				removed += 1
+				continue
+
+			try:
+				data = doc.to_dict() or {}
+			except Exception:
+				data = {}
+			rec = _book_record_from_doc(bid, data, _doc_updated_ms(doc))
+			_ATLAS_LISTENER_BOOKS[bid] = rec
+			_listener_count_iso2(rec, 1)
+			upserted += 1
+
+	return upserted, removed
+
+
+def _publish_listener_books() -> CatalogSnapshot:
+	started = time.time()
+	with _ATLAS_LISTENER_STATE_LOCK:
+		by_id = dict(_ATLAS_LISTENER_BOOKS)
+		iso2s = list(_ATLAS_LISTENER_ISO_COUNTS)
+	items = [by_id[bid] for bid in sorted(by_id)]
+	return _publish_atlas_books(items, by_id, _available_countries_from_iso2(iso2s), started)
+
+
+def _run_listener_publisher() -> None:
+	global _ATLAS_LISTENER_FAILED_AT
+
+	while True:
+		_ATLAS_LISTENER_DIRTY.wait()
+		# Let the rest of a burst land, then publish everything patched so far at once.
+		time.sleep(ATLAS_CATALOG_LISTENER_DEBOUNCE_SEC)
+		_ATLAS_LISTENER_DIRTY.clear()
+		# A restarting watch has no first snapshot yet, and a failed one may be half-applied.
+		if not _ATLAS_LISTENER_READY.is_set() or _ATLAS_LISTENER_FAILED_AT:
+			continue
+		try:
+			snapshot = _publish_listener_books()
+		except Exception as e:
+			logger.error(f"[atlasChat] snapshot listener publish failed: {e}\n{traceback.format_exc()}")
+			_ATLAS_LISTENER_FAILED_AT = time.time()
+			continue
+		logger.info(f"[atlasChat] listener published atlasBooks={len(snapshot)} version={snapshot.version}")
 
-	for field in ("country_override", "setting_country", "author_country", "author_origin"):
-		for iso2 in _extract_iso2_candidates(b.get(field)):
-			parts.append(iso2)
-			nm = _iso2_to_country_name(iso2)
-			if nm and nm != iso2:
-				parts.append(nm)
 
-	return _normalize_text(" ".join(parts))
+def _start_listener_publisher() -> None:
+	global _ATLAS_LISTENER_PUBLISHER
 
+	with _ATLAS_LISTENER_PUBLISHER_GUARD:
+		if _ATLAS_LISTENER_PUBLISHER is not None and _ATLAS_LISTENER_PUBLISHER.is_alive():
+			return
+		_ATLAS_LISTENER_PUBLISHER = threading.Thread(
+			target=_run_listener_publisher,
+			name="atlas-listener-publish",
+			daemon=True,
+		)
+		_ATLAS_LISTENER_PUBLISHER.start()
 
-def _load_atlas_books_cached() -> Tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]], List[Dict[str, str]]]:
-	global _ATLAS_BOOK_CACHE_TS, _ATLAS_BOOK_CACHE, _ATLAS_BOOK_BY_ID, _ATLAS_AVAILABLE_COUNTRIES_CACHE
 
-	now = time.time()
-	if _ATLAS_BOOK_CACHE and (now - _ATLAS_BOOK_CACHE_TS) < ATLAS_CHAT_CACHE_TTL_SEC:
-		return _ATLAS_BOOK_CACHE, _ATLAS_BOOK_BY_ID, _ATLAS_AVAILABLE_COUNTRIES_CACHE
+def _on_atlas_books_snapshot(docs, changes, read_time) -> None:
+	global _ATLAS_LISTENER_FAILED_AT
 
 	try:
-		docs = _get_db().collection("atlasBooks").stream()
+		upserted, removed = _apply_atlas_book_changes(changes)
+		if _ATLAS_LISTENER_READY.is_set():
+			_ATLAS_LISTENER_DIRTY.set()
+			_start_listener_publisher()
+		else:
+			# Requests are waiting on the first snapshot; publish it here.
+			_publish_listener_books()
 	except Exception as e:
-		logger.error(f"[atlasChat] Firestore stream error: {e}")
-		return _ATLAS_BOOK_CACHE, _ATLAS_BOOK_BY_ID, _ATLAS_AVAILABLE_COUNTRIES_CACHE
+		logger.error(f"[atlasChat] snapshot listener patch failed: {e}\n{traceback.format_exc()}")
+		# The patched state may be half-applied; the next request drops this watch. Wake any
+		# request waiting on the first snapshot so it polls instead of sitting out the wait.
+		_ATLAS_LISTENER_FAILED_AT = time.time()
+		_ATLAS_LISTENER_READY.set()
+		return
+	_ATLAS_LISTENER_READY.set()
+	logger.info(
+		f"[atlasChat] listener patched upserted={upserted} removed={removed} "
+		f"atlasBooks={len(_ATLAS_LISTENER_BOOKS)} published={_ATLAS_CATALOG.version} build={ATLAS_CHAT_BUILD}"
+	)
 
-	items: List[Dict[str, Any]] = []
-	by_id: Dict[str, Dict[str, Any]] = {}
 
-	for doc in docs:
+def _stop_atlas_books_listener(watch) -> None:
+	# Called from request threads only: a watch cannot be closed from its own callback thread.
+	try:
+		watch.unsubscribe()
+	except Exception as e:
+		logger.warning(f"[atlasChat] snapshot listener unsubscribe failed: {e}")
+
+
+def _ensure_atlas_books_listener() -> bool:
+	global _ATLAS_LISTENER, _ATLAS_LISTENER_FAILED_AT
+
+	with _ATLAS_LISTENER_START_LOCK:
+		watch = _ATLAS_LISTENER
+		failed_at = _ATLAS_LISTENER_FAILED_AT
+		if failed_at:
+			if watch is not None:
+				logger.warning("[atlasChat] snapshot listener failed; polling until it is retried")
+				_stop_atlas_books_listener(watch)
+				watch = _ATLAS_LISTENER = None
+			if time.time() - failed_at < ATLAS_CATALOG_LISTENER_RETRY_SEC:
+				return False
+		if watch is None or not getattr(watch, "is_active", True):
+			if watch is not None:
+				logger.warning("[atlasChat] snapshot listener inactive; restarting")
+			_ATLAS_LISTENER_READY.clear()
+			_ATLAS_LISTENER_DIRTY.clear()
+			_ATLAS_LISTENER_FAILED_AT = 0.0
+			with _ATLAS_LISTENER_STATE_LOCK:
+				_ATLAS_LISTENER_BOOKS.clear()
+				_ATLAS_LISTENER_ISO_COUNTS.clear()
+			try:
+				_ATLAS_LISTENER = _get_db().collection("atlasBooks").on_snapshot(_on_atlas_books_snapshot)
+			except Exception as e:
+				_ATLAS_LISTENER = None
+				logger.error(f"[atlasChat] snapshot listener start failed: {e}")
+				return False
+
+	return _ATLAS_LISTENER_READY.wait(timeout=ATLAS_CATALOG_LISTENER_WAIT_SEC) and not _ATLAS_LISTENER_FAILED_AT
+
+
+# ─────────── Catalog reload (stale-while-revalidate, single flight) ───────────
+# Past ATLAS_CHAT_CACHE_TTL_SEC the cached catalog keeps being served while one
+# background thread re-streams it; only past ATLAS_CATALOG_MAX_STALE_SEC (or with
+# no catalog at all) does a request block on the reload. Either way at most one
+# reload runs per instance and concurrent callers share its result.
+ATLAS_CATALOG_MAX_STALE_SEC = int(os.environ.get("ATLAS_CATALOG_MAX_STALE_SEC") or 3600)
+
+_ATLAS_RELOAD_LOCK = threading.Lock()
+_ATLAS_RELOAD_GUARD = threading.Lock()
+_ATLAS_RELOAD_THREAD: Optional[threading.Thread] = None
+
+
+def _atlas_books_age(now: Optional[float] = None) -> float:
+	snapshot = _ATLAS_CATALOG
+	if not snapshot.books:
+		return float("inf")
+	return (time.time() if now is None else now) - snapshot.loaded_at
+
+
+# Only the fields _book_record_from_doc maps are read. With ATLAS_CATALOG_READ_PARTITIONS > 1
+# the collection is split with a partition query and the slices are streamed concurrently on
+# at most ATLAS_CATALOG_READ_THREADS threads, each building records as its documents arrive.
+ATLAS_BOOK_FIELDS = (
+	"title", "author", "summary", "description", "year", "page_count", "tags", "categories",
+	"country_override", "setting_country", "author_country", "author_origin", "cover_url",
+	"bookshop_url", "google_books_url", "info_link", "preview_link", "read", "stamp",
+)
+ATLAS_CATALOG_READ_PARTITIONS = int(os.environ.get("ATLAS_CATALOG_READ_PARTITIONS") or 1)
+ATLAS_CATALOG_READ_THREADS = int(os.environ.get("ATLAS_CATALOG_READ_THREADS") or 8)
+
+
+def _read_atlas_books_query(query) -> List[Dict[str, Any]]:
+	items: List[Dict[str, Any]] = []
+	for doc in query.stream():
+		# Partition queries run over the collection group; skip nested atlasBooks collections.
+		ref = getattr(doc, "reference", None)
+		if ref is not None and ref.parent.parent is not None:
+			continue
 		try:
 			data = doc.to_dict() or {}
 		except Exception:
 			data = {}
+		items.append(_book_record_from_doc(doc.id, data, _doc_updated_ms(doc)))
+	return items
 
-		bid = doc.id
-		rec: Dict[str, Any] = {
-			"id": bid,
-			"title": str(data.get("title") or "").strip(),
-			"author": str(data.get("author") or "").strip(),
-			"summary": str(data.get("summary") or "").strip(),
-			"description": str(data.get("description") or "").strip(),
-			"year": str(data.get("year") or "").strip(),
-			"page_count": int(data.get("page_count") or 0),
-			"tags": data.get("tags") if isinstance(data.get("tags"), list) else [],
-			"categories": data.get("categories") if isinstance(data.get("categories"), list) else [],
-			"country_override": data.get("country_override") if data.get("country_override") is not None else "",
-			"setting_country": data.get("setting_country") if data.get("setting_country") is not None else [],
-			"author_country": data.get("author_country") if data.get("author_country") is not None else [],
-			"author_origin": data.get("author_origin") if data.get("author_origin") is not None else [],
-			"cover_url": str(data.get("cover_url") or "").strip(),
-			"bookshop_url": str(data.get("bookshop_url") or "").strip(),
-			"google_books_url": str(data.get("google_books_url") or "").strip(),
-			"info_link": str(data.get("info_link") or "").strip(),
-			"preview_link": str(data.get("preview_link") or "").strip(),
-			"read": data.get("read") is True,
-			"stamp": data.get("stamp") is True,
-		}
 
-		rec["_places"] = _places_for_book(rec)
-		rec["_iso2_sets"] = _iso2_sets_for_book(rec)
-		rec["_blob"] = _build_book_search_blob(rec)
+def _read_atlas_books() -> List[Dict[str, Any]]:
+	db = _get_db()
+	if ATLAS_CATALOG_READ_PARTITIONS <= 1:
+		return _read_atlas_books_query(db.collection("atlasBooks").select(ATLAS_BOOK_FIELDS))
+
+	partitions = list(db.collection_group("atlasBooks").get_partitions(ATLAS_CATALOG_READ_PARTITIONS))
+	queries = [p.query().select(ATLAS_BOOK_FIELDS) for p in partitions]
+	items: List[Dict[str, Any]] = []
+	with ThreadPoolExecutor(max_workers=max(1, min(ATLAS_CATALOG_READ_THREADS, len(queries)))) as pool:
+		# Partitions come back in document-name order, so this matches a single stream's order.
+		for part in pool.map(_read_atlas_books_query, queries):
+			items.extend(part)
+	return items
+
+
+# ─────────── Catalog aggregates (sharded, trigger-maintained) ───────────
+# atlasCatalogAggregate keeps every atlasBooks document in one of ATLAS_CATALOG_AGGREGATE_SHARDS
+# aggregate docs: a gzip'd JSON map of book id -> mapped fields plus the derived place codes and
+# folded title/author. A deleted book leaves a {"id", "_deleted_ms"} marker for
+# ATLAS_CATALOG_AGGREGATE_MARKER_TTL_SEC so a late, older trigger event cannot bring it back;
+# readers skip markers. With ATLAS_CATALOG_AGGREGATE=1 instances load the catalog from those
+# shards (one batched read of a handful of docs instead of one read per book), re-decode only
+# shards whose update_time moved, and poll every ATLAS_CATALOG_AGGREGATE_TTL_SEC; a poll where no
+# shard moved keeps the published snapshot instead of rebuilding it. A missing or
+# mismatched shard falls back to the full atlasBooks stream; scripts/rebuild_catalog_aggregate.py
+# (re)builds all shards.
+ATLAS_CATALOG_AGGREGATE = (os.environ.get("ATLAS_CATALOG_AGGREGATE") or "").strip().lower() in ("1", "true", "yes")
+ATLAS_CATALOG_AGGREGATE_COLLECTION = os.environ.get("ATLAS_CATALOG_AGGREGATE_COLLECTION") or "atlasCatalogShards"
+ATLAS_CATALOG_AGGREGATE_SHARDS = int(os.environ.get("ATLAS_CATALOG_AGGREGATE_SHARDS") or 16)
+ATLAS_CATALOG_AGGREGATE_TTL_SEC = int(os.environ.get("ATLAS_CATALOG_AGGREGATE_TTL_SEC") or 30)
+ATLAS_CATALOG_AGGREGATE_MARKER_TTL_SEC = int(os.environ.get("ATLAS_CATALOG_AGGREGATE_MARKER_TTL_SEC") or 7 * 86400)
+
+# Bump whenever the entry layout or the derived fields (normalizer, resolver) change.
+_AGGREGATE_FORMAT = 1
+_AGGREGATE_SHARD_WARN_BYTES = 900_000
+
+_ATLAS_AGGREGATE_SHARD_CACHE: Dict[str, Tuple[int, List[BookRecord]]] = {}
+
+
+def _aggregate_shard_id(book_id: str) -> str:
+	return f"shard-{zlib.crc32(book_id.encode('utf-8')) % ATLAS_CATALOG_AGGREGATE_SHARDS:03d}"
+
+
+def _catalog_row(rec: BookRecord) -> Dict[str, Any]:
+	row: Dict[str, Any] = {"id": rec.id, "_updated_ms": int(rec._updated_ms or 0)}
+	for field in ATLAS_BOOK_FIELDS:
+		val = rec[field]
+		row[field] = list(val) if isinstance(val, tuple) else val
+	return row
+
+
+def _aggregate_entry(rec: BookRecord) -> Dict[str, Any]:
+	entry = _catalog_row(rec)
+	entry["_iso2"] = {name: [p["iso2"] for p in rec._places.get(name) or []] for name, _ in _PLACE_FIELDS}
+	entry["_title_norm"] = rec._title_norm
+	entry["_author_norm"] = rec._author_norm
+	return entry
+
 
-		items.append(rec)
-		by_id[bid] = rec
+def _aggregate_marker(book_id: str, deleted_ms: int) -> Dict[str, Any]:
+	return {"id": book_id, "_deleted_ms": int(deleted_ms)}
+
+
+def _aggregate_entry_ms(entry: Dict[str, Any]) -> int:
+	# Event time of the write that produced an entry or a deletion marker.
+	return int(entry.get("_deleted_ms") or entry.get("_updated_ms") or 0)
+
+
+def _encode_aggregate_shard(entries: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+	deleted = sum(1 for entry in entries.values() if "_deleted_ms" in entry)
+	raw = json.dumps([entries[bid] for bid in sorted(entries)], ensure_ascii=False, separators=(",", ":"))
+	payload = gzip.compress(raw.encode("utf-8"), compresslevel=9)
+	if len(payload) > _AGGREGATE_SHARD_WARN_BYTES:
+		logger.warning(f"[atlasCatalogAggregate] shard payload {len(payload)} bytes; raise ATLAS_CATALOG_AGGREGATE_SHARDS")
+	return {
+		"format": _AGGREGATE_FORMAT,
+		"shards": ATLAS_CATALOG_AGGREGATE_SHARDS,
+		"count": len(entries) - deleted,
+		"deleted": deleted,
+		"payload": payload,
+	}
+
+
+def _decode_aggregate_shard(data: Dict[str, Any], markers: bool = False) -> Optional[Dict[str, Dict[str, Any]]]:
+	# None means the shard was written by another format or shard count and cannot be trusted.
+	# Deletion markers are only returned to the writer (markers=True).
+	if data.get("format") != _AGGREGATE_FORMAT or data.get("shards") != ATLAS_CATALOG_AGGREGATE_SHARDS:
+		return None
+	rows = json.loads(gzip.decompress(data.get("payload") or b"").decode("utf-8") or "[]")
+	entries = {row["id"]: row for row in rows if isinstance(row, dict) and isinstance(row.get("id"), str)}
+	deleted = sum(1 for entry in entries.values() if "_deleted_ms" in entry)
+	if len(entries) - deleted != int(data.get("count") or 0) or deleted != int(data.get("deleted") or 0):
+		return None
+	if markers:
+		return entries
+	return {bid: entry for bid, entry in entries.items() if "_deleted_ms" not in entry}
+
+
+def _read_atlas_books_from_aggregates() -> Optional[List[Dict[str, Any]]]:
+	db = _get_db()
+	coll = db.collection(ATLAS_CATALOG_AGGREGATE_COLLECTION)
+	refs = [coll.document(f"shard-{i:03d}") for i in range(ATLAS_CATALOG_AGGREGATE_SHARDS)]
+
+	items: List[Dict[str, Any]] = []
+	seen = 0
+	for doc in db.get_all(refs):
+		if not doc.exists:
+			logger.warning(f"[atlasChat] aggregate shard {doc.id} missing; falling back to full stream")
+			return None
+		seen += 1
+		updated_ms = _doc_updated_ms(doc)
+		cached = _ATLAS_AGGREGATE_SHARD_CACHE.get(doc.id)
+		if cached is not None and cached[0] == updated_ms:
+			items.extend(cached[1])
+			continue
+		entries = _decode_aggregate_shard(doc.to_dict() or {})
+		if entries is None:
+			logger.warning(f"[atlasChat] aggregate shard {doc.id} has a stale format; falling back to full stream")
+			return None
+		records = [
+			_book_record_from_doc(bid, entry, int(entry.get("_updated_ms") or 0), derived=entry)
+			for bid, entry in entries.items()
+		]
+		_ATLAS_AGGREGATE_SHARD_CACHE[doc.id] = (updated_ms, records)
+		items.extend(records)
+
+	if seen != ATLAS_CATALOG_AGGREGATE_SHARDS:
+		return None
+	# Same order as a collection stream (document id order).
+	items.sort(key=lambda b: b["id"])
+	return items
+
+
+def _read_catalog_items() -> List[Dict[str, Any]]:
+	if ATLAS_CATALOG_AGGREGATE:
+		items = _read_atlas_books_from_aggregates()
+		if items is not None:
+			return items
+	return _read_atlas_books()
+
+
+def _catalog_ttl_sec() -> int:
+	return ATLAS_CATALOG_AGGREGATE_TTL_SEC if ATLAS_CATALOG_AGGREGATE else ATLAS_CHAT_CACHE_TTL_SEC
+
+
+# ─────────── Catalog sources ───────────
+# Where _stream_atlas_books gets its records. ATLAS_CATALOG_SOURCE picks the backend:
+#   firestore (default)  atlasBooks, or the sharded aggregate with ATLAS_CATALOG_AGGREGATE=1
+#   file                 ATLAS_CATALOG_FILE: JSONL, or a JSON list / {"books": [...]}; .gz allowed
+#   memory               whatever _set_catalog_source(MemoryCatalogSource(rows)) installed
+# The listener (ATLAS_CATALOG_SYNC=listener) only applies to the Firestore source.
+ATLAS_CATALOG_SOURCE = (os.environ.get("ATLAS_CATALOG_SOURCE") or "firestore").strip().lower()
+ATLAS_CATALOG_FILE = os.environ.get("ATLAS_CATALOG_FILE") or ""
+
+
+class CatalogSource(ABC):
+	name = "base"
+
+	@abstractmethod
+	def read(self) -> List[Dict[str, Any]]:
+		...
+
+
+class FirestoreCatalogSource(CatalogSource):
+	name = "firestore"
+
+	def read(self) -> List[Dict[str, Any]]:
+		return _read_catalog_items()
+
+
+def _records_from_rows(rows: Any) -> List[Dict[str, Any]]:
+	items: List[Dict[str, Any]] = []
+	for row in rows:
+		if not isinstance(row, dict) or not isinstance(row.get("id"), str) or not row["id"]:
+			continue
+		updated_ms = int(row.get("_updated_ms") or row.get("updated_ms") or 0)
+		derived = row if isinstance(row.get("_iso2"), dict) and "_title_norm" in row else None
+		items.append(_book_record_from_doc(row["id"], row, updated_ms, derived=derived))
+	items.sort(key=lambda b: b["id"])
+	return items
+
+
+class FileCatalogSource(CatalogSource):
+	name = "file"
+
+	def __init__(self, path: str):
+		self.path = path
+		self._loaded: Optional[Tuple[float, List[Dict[str, Any]]]] = None
+
+	def _rows(self) -> Any:
+		opener = gzip.open if self.path.endswith(".gz") else open
+		with opener(self.path, "rt", encoding="utf-8") as f:
+			base = self.path[:-3] if self.path.endswith(".gz") else self.path
+			if base.endswith(".jsonl"):
+				return [json.loads(line) for line in f if line.strip()]
+			data = json.load(f)
+		return (data.get("books") or []) if isinstance(data, dict) else data
+
+	def read(self) -> List[Dict[str, Any]]:
+		# Records are rebuilt only when the file changes; reloads of an unchanged file are free.
+		mtime = os.path.getmtime(self.path)
+		if self._loaded is None or self._loaded[0] != mtime:
+			self._loaded = (mtime, _records_from_rows(self._rows()))
+		return list(self._loaded[1])
+
+
+class MemoryCatalogSource(CatalogSource):
+	name = "memory"
+
+	def __init__(self, rows: Any = ()):
+		self._items = _records_from_rows(rows)
+
+	def read(self) -> List[Dict[str, Any]]:
+		return list(self._items)
+
+
+def _write_catalog_file(path: str, items: List[Dict[str, Any]]) -> int:
+	opener = gzip.open if path.endswith(".gz") else open
+	with opener(path, "wt", encoding="utf-8") as f:
+		for rec in items:
+			f.write(json.dumps(_catalog_row(rec), ensure_ascii=False, separators=(",", ":")) + "\n")
+	return len(items)
+
+
+def _catalog_source_from_env() -> CatalogSource:
+	if ATLAS_CATALOG_SOURCE == "file":
+		if not ATLAS_CATALOG_FILE:
+			raise ValueError("ATLAS_CATALOG_SOURCE=file needs ATLAS_CATALOG_FILE")
+		return FileCatalogSource(ATLAS_CATALOG_FILE)
+	if ATLAS_CATALOG_SOURCE == "memory":
+		return MemoryCatalogSource()
+	if ATLAS_CATALOG_SOURCE != "firestore":
+		logger.warning(f"[atlasChat] unknown ATLAS_CATALOG_SOURCE={ATLAS_CATALOG_SOURCE}; using firestore")
+	return FirestoreCatalogSource()
+
+
+_ATLAS_CATALOG_SOURCE: CatalogSource = _catalog_source_from_env()
+
+
+def _get_catalog_source() -> CatalogSource:
+	return _ATLAS_CATALOG_SOURCE
+
+
+def _set_catalog_source(source: CatalogSource, reload: bool = True) -> None:
+	global _ATLAS_CATALOG_SOURCE
+	_ATLAS_CATALOG_SOURCE = source
+	if reload:
+		_stream_atlas_books()
+
+
+def _stream_atlas_books() -> bool:
+	started = time.time()
+	source = _ATLAS_CATALOG_SOURCE
+	try:
+		items = source.read()
+	except Exception as e:
+		logger.error(f"[atlasChat] {source.name} catalog read error: {e}")
+		return False
+
+	# Aggregate shards and catalog files hand back the same record objects while nothing changed;
+	# keep the published snapshot (and its built indexes and bodies) and just mark it fresh.
+	if _touch_atlas_catalog(items, started):
+		logger.info(f"[atlasChat] catalog unchanged atlasBooks={len(items)} source={source.name} build={ATLAS_CHAT_BUILD}")
+		return True
+
+	by_id: Dict[str, Dict[str, Any]] = {b["id"]: b for b in items}
 
 	iso_set = set()
 	for b in items:
-		sets = b.get("_iso2_sets") or {}
-		if isinstance(sets, dict):
-			iso_set |= set(sets.get("any") or set())
+		iso_set |= _book_geo_iso2(b)
 
-	available: List[Dict[str, str]] = []
-	for iso2 in sorted([x for x in iso_set if isinstance(x, str) and len(x) == 2]):
-		nm = _iso2_to_country_name(iso2)
-		available.append({"iso2": iso2, "name": nm or iso2})
+	available = _available_countries_from_iso2(iso_set)
+	_publish_atlas_books(items, by_id, available, started)
+
+	logger.info(
+		f"[atlasChat] cached atlasBooks={len(items)} countries={len(available)} source={source.name} "
+		f"ms={int((time.time() - started) * 1000)} build={ATLAS_CHAT_BUILD}"
+	)
+	return True
+
+
+def _reload_atlas_books_if_stale() -> None:
+	with _ATLAS_RELOAD_LOCK:
+		# Whoever held the lock before us may already have refreshed the catalog.
+		if _atlas_books_age() < _catalog_ttl_sec():
+			return
+		_stream_atlas_books()
+
+
+def _start_background_reload() -> None:
+	global _ATLAS_RELOAD_THREAD
+
+	with _ATLAS_RELOAD_GUARD:
+		if _ATLAS_RELOAD_THREAD is not None and _ATLAS_RELOAD_THREAD.is_alive():
+			return
+		_ATLAS_RELOAD_THREAD = threading.Thread(
+			target=_reload_atlas_books_if_stale,
+			name="atlas-catalog-reload",
+			daemon=True,
+		)
+		_ATLAS_RELOAD_THREAD.start()
+
+
+def _load_atlas_catalog() -> CatalogSnapshot:
+	if ATLAS_CATALOG_SYNC == "listener" and isinstance(_ATLAS_CATALOG_SOURCE, FirestoreCatalogSource):
+		if _ensure_atlas_books_listener():
+			return _ATLAS_CATALOG
+		logger.warning("[atlasChat] snapshot listener not ready; falling back to full stream")
 
-	_ATLAS_BOOK_CACHE_TS = now
-	_ATLAS_BOOK_CACHE = items
-	_ATLAS_BOOK_BY_ID = by_id
-	_ATLAS_AVAILABLE_COUNTRIES_CACHE = available
+	age = _atlas_books_age()
+	if age >= ATLAS_CATALOG_MAX_STALE_SEC:
+		_reload_atlas_books_if_stale()
+	elif age >= _catalog_ttl_sec():
+		_start_background_reload()
 
-	logger.info(f"[atlasChat] cached atlasBooks={len(items)} countries={len(available)} build={ATLAS_CHAT_BUILD}")
-	return items, by_id, available
+	return _ATLAS_CATALOG
 
 
 # ─────────── OpenAI plumbing ───────────
 def _call_openai(api_key: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+	import requests
+
 	r = requests.post(
 		"https://api.openai.com/v1/responses",
 		headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
@@ -331,6 +1234,45 @@ def _parse_output_text_json(resp_json: Dict[str, Any]) -> Dict[str, Any]:
 
 # ─────────── Tiered candidate ranking (no exclusion) ───────────
 TIER1_DETAIL_COUNT = int(os.environ.get("ATLAS_CHAT_TIER1_COUNT") or 50)
+# Query terms at least this long also match longer index terms ("memoir" -> "memoirs").
+# 0 keeps matching to whole terms only.
+ATLAS_CHAT_PREFIX_MIN = int(os.environ.get("ATLAS_CHAT_PREFIX_MIN") or 0)
+# bm25f (default) weighs each query term by rarity, field and field length; count is the
+# old one-point-per-matching-term score, kept for comparison and rollback.
+ATLAS_CHAT_RANKER = (os.environ.get("ATLAS_CHAT_RANKER") or "bm25f").strip().lower()
+# python (default) scores posting lists in a dict; numpy scores the same lists packed into
+# CSR matrices (atlas_numpy) with vector ops. Both produce the same order; numpy falls back to
+# python when NumPy is not installed.
+ATLAS_CHAT_ENGINE = (os.environ.get("ATLAS_CHAT_ENGINE") or "python").strip().lower()
+# Up to ATLAS_CHAT_SEMANTIC_K tier-1 slots go to the nearest books by hashed n-gram vectors
+# (atlas_numpy.SemanticIndex) whose cosine is at least ATLAS_CHAT_SEMANTIC_MIN, so paraphrased
+# queries reach books that share no exact term with them. 0 (default) turns it off; needs NumPy.
+ATLAS_CHAT_SEMANTIC_K = int(os.environ.get("ATLAS_CHAT_SEMANTIC_K") or 0)
+ATLAS_CHAT_SEMANTIC_DIM = int(os.environ.get("ATLAS_CHAT_SEMANTIC_DIM") or 512)
+ATLAS_CHAT_SEMANTIC_MIN = float(os.environ.get("ATLAS_CHAT_SEMANTIC_MIN") or 0.1)
+
+_BM25F_FIELD_WEIGHTS: Dict[str, float] = {
+	"title": 3.0,
+	"author": 2.5,
+	"tags": 2.0,
+	"places": 1.5,
+	"categories": 1.0,
+	"summary": 1.0,
+	"year": 0.5,
+}
+_BM25F_K1 = 1.2
+# Length normalisation per field: full strength for prose, none for short list fields.
+_BM25F_B: Dict[str, float] = {
+	"title": 0.5,
+	"author": 0.3,
+	"tags": 0.0,
+	"places": 0.0,
+	"categories": 0.0,
+	"summary": 0.75,
+	"year": 0.0,
+}
+_GEO_MATCH_BOOST = 3.0
+_SELECTED_COUNTRY_BOOST = 0.5
 
 _QUERY_STOPWORDS = frozenset({
 	"a", "an", "and", "any", "are", "book", "books", "for", "from", "in", "me", "my",
@@ -343,29 +1285,6 @@ _THEME_EXPANSIONS: Dict[str, List[str]] = {
 	"lgbtq": ["lgbtq", "lgbt", "lgbtqia", "queer", "gay", "lesbian", "bisexual", "trans", "transgender"],
 }
 
-_REGION_KEYWORDS: Dict[str, frozenset] = {
-	"africa": frozenset({
-		"DZ", "AO", "BJ", "BW", "BF", "BI", "CV", "CM", "CF", "TD", "KM", "CG", "CD", "CI", "DJ", "EG",
-		"GQ", "ER", "SZ", "ET", "GA", "GM", "GH", "GN", "GW", "KE", "LS", "LR", "LY", "MG", "MW", "ML",
-		"MR", "MU", "MA", "MZ", "NA", "NE", "NG", "RW", "ST", "SN", "SC", "SL", "SO", "ZA", "SS", "SD",
-		"TZ", "TG", "TN", "UG", "ZM", "ZW",
-	}),
-	"asia": frozenset({
-		"AF", "AM", "AZ", "BH", "BD", "BT", "BN", "KH", "CN", "GE", "IN", "ID", "IR", "IQ", "IL", "JP",
-		"JO", "KZ", "KW", "KG", "LA", "LB", "MY", "MV", "MN", "MM", "NP", "KP", "OM", "PK", "PH", "QA",
-		"SA", "SG", "KR", "LK", "SY", "TW", "TJ", "TH", "TL", "TR", "TM", "AE", "UZ", "VN", "YE",
-	}),
-	"europe": frozenset({
-		"AL", "AD", "AT", "BY", "BE", "BA", "BG", "HR", "CY", "CZ", "DK", "EE", "FI", "FR", "DE", "GR",
-		"HU", "IS", "IE", "IT", "LV", "LI", "LT", "LU", "MT", "MD", "MC", "ME", "NL", "MK", "NO", "PL",
-		"PT", "RO", "RU", "SM", "RS", "SK", "SI", "ES", "SE", "CH", "UA", "GB", "VA",
-	}),
-	"south america": frozenset({"AR", "BO", "BR", "CL", "CO", "EC", "GY", "PY", "PE", "SR", "UY", "VE"}),
-	"north america": frozenset({"CA", "MX", "US", "GT", "HN", "SV", "NI", "CR", "PA", "BZ", "CU", "DO", "HT", "JM", "TT"}),
-	"oceania": frozenset({"AU", "FJ", "KI", "MH", "FM", "NR", "NZ", "PW", "PG", "WS", "SB", "TO", "TV", "VU"}),
-}
-
-
 def _tokenize_query(text: str) -> List[str]:
 	norm = _normalize_text(text)
 	return [t for t in norm.split(" ") if len(t) >= 2 and t not in _QUERY_STOPWORDS]
@@ -383,55 +1302,30 @@ def _expand_theme_tokens(tokens: List[str]) -> List[str]:
 	return out
 
 
-def _infer_geo_iso2_from_query(user_text: str, available_countries: List[Dict[str, str]]) -> Optional[set]:
-	available = {
-		str(c.get("iso2") or "").upper()
-		for c in (available_countries or [])
-		if isinstance(c, dict) and isinstance(c.get("iso2"), str) and len(str(c.get("iso2"))) == 2
-	}
-	if not available:
-		return None
+@lru_cache(maxsize=8)
+def _geo_matcher_for(iso2s: frozenset) -> GeoMatcher:
+	return GeoMatcher(iso2s)
 
-	norm = _normalize_text(user_text)
-	if not norm:
-		return None
 
-	matched: set = set()
-	for keyword, region_iso in _REGION_KEYWORDS.items():
-		kw = keyword.replace(" ", "")
-		if keyword in norm or kw in norm.replace(" ", ""):
-			matched |= (region_iso & available)
+def _geo_matcher(available_countries: Sequence[Dict[str, str]]) -> GeoMatcher:
+	return _geo_matcher_for(frozenset(
+		str(c.get("iso2")).upper()
+		for c in (available_countries or [])
+		if isinstance(c, dict) and isinstance(c.get("iso2"), str) and len(str(c.get("iso2"))) == 2
+	))
 
-	for c in available_countries or []:
-		if not isinstance(c, dict):
-			continue
-		iso2 = str(c.get("iso2") or "").upper()
-		name = _normalize_text(c.get("name") or "")
-		if iso2 in available and name and len(name) >= 4 and name in norm:
-			matched.add(iso2)
 
-	return matched if matched else None
+def _infer_geo_iso2_from_query(user_text: str, available_countries: Sequence[Dict[str, str]]) -> Optional[set]:
+	matched = _geo_matcher(available_countries).match(user_text).iso2
+	return set(matched) if matched else None
 
 
 def _theme_tokens_from_query(
 	raw_tokens: List[str],
 	expanded_tokens: List[str],
-	geo_iso2: Optional[set],
-	available_countries: List[Dict[str, str]]
+	geo_terms: frozenset
 ) -> List[str]:
-	geo_terms: set = set()
-	for keyword in _REGION_KEYWORDS:
-		for part in keyword.split():
-			geo_terms.add(part)
-	for c in available_countries or []:
-		if not isinstance(c, dict):
-			continue
-		name = _normalize_text(c.get("name") or "")
-		if name:
-			for part in name.split():
-				if len(part) >= 3:
-					geo_terms.add(part)
-
+	# geo_terms are the query tokens a GeoMatcher consumed as place names.
 	out: List[str] = []
 	seen: set = set()
 	for tok in expanded_tokens:
@@ -442,12 +1336,370 @@ def _theme_tokens_from_query(
 	return out
 
 
+# ─────────── Query planning ───────────
+# A QueryPlanner per snapshot turns the user's text into one QueryPlan (tokens, theme terms,
+# geo constraint, quoted titles, "by ..." authors, title lookups, whether it asks for books
+# *like* something, whether it is phrased as a lookup, how many picks were asked for) that every
+# downstream stage reads. Plans are immutable and memoized in an LRU of
+# ATLAS_CHAT_PLAN_CACHE entries keyed on the whitespace- and case-normalized text.
+ATLAS_CHAT_PLAN_CACHE = int(os.environ.get("ATLAS_CHAT_PLAN_CACHE") or 512)
+MAX_RECOMMENDATIONS = 3
+
+_QUOTED_TITLE = re.compile(r'["\u201c\u201d\u00ab\u00bb]([^"\u201c\u201d\u00ab\u00bb]{2,120})["\u201c\u201d\u00ab\u00bb]')
+_AUTHOR_MENTION = re.compile(
+	r"\bby\s+(.+?)(?=\s+(?:about|and|from|in|or|set|that|who|with|like)\b|[,;:?!()]|\.(?:\s|$)|$)"
+)
+_LOOKUP_PHRASE = re.compile(
+	r"^(?:do you (?:have|carry|stock)|have you got|is there|got|looking for|searching for|find me|find)\s+"
+	r"(?:a copy of\s+|the book\s+)?(.+?)(?:\s+by\s+.*)?[?.!]*$"
+)
+_LOOKUP_SUFFIX = re.compile(r"^(?:is|are)\s+(.+?)\s+(?:in here|in stock|in the (?:catalog|atlas)|available)[?.!]*$")
+# "books like X", "similar to X", "more by X": the user wants neighbours, not X itself.
+_SIMILAR_PHRASE = re.compile(r"\b(?:like|similar|more|other|another|else|alike|vein|reminiscent|comparable)\b")
+# An unquoted lookup that opens like a description ("a love story") is a theme, not a title.
+_DESCRIPTION_START = frozenset({"a", "an", "any", "some"})
+_QUOTE_CHARS = "\"\u201c\u201d\u00ab\u00bb"
+_COUNT_WORDS = {"a": 1, "an": 1, "one": 1, "single": 1, "two": 2, "couple": 2, "three": 3, "few": 3}
+# A count only when it is what's being asked for: after a request verb ("recommend two novels",
+# "give me 3 books") or opening a sentence ("Two queer novels from Vietnam"), never in passing
+# ("I read a book about grief").
+_COUNT_MENTION = re.compile(
+	r"(?:^|[.?!;]\s*|\b(?:recommend|suggest|give|show|send|find|get|want|need|pick|name|list)(?:\s+(?:me|us))?\s+)"
+	r"(?:just\s+|only\s+)?(\d+|a\s+(?:couple|few|single)(?:\s+of)?|couple\s+of|an?|one|single|two|three|few)\s+"
+	r"(?:[a-z]+\s+){0,2}?(books?|novels?|reads?|titles?|picks?|recommendations?|memoirs?|stories)\b"
+)
+
+
+class QueryPlan(NamedTuple):
+	text: str
+	raw_tokens: Tuple[str, ...]
+	expanded_tokens: Tuple[str, ...]
+	theme_tokens: Tuple[str, ...]
+	geo_iso2: FrozenSet[str]
+	geo_terms: FrozenSet[str]
+	titles: Tuple[str, ...]
+	authors: Tuple[str, ...]
+	lookups: Tuple[str, ...]
+	similar: bool
+	phrased: bool
+	count: int
+
+	def as_log(self) -> Dict[str, Any]:
+		return {
+			"text": self.text,
+			"themes": list(self.theme_tokens),
+			"geo": sorted(self.geo_iso2),
+			"titles": list(self.titles),
+			"authors": list(self.authors),
+			"lookups": list(self.lookups),
+			"similar": self.similar,
+			"phrased": self.phrased,
+			"count": self.count,
+		}
+
+
+def _requested_count(lowered: str) -> int:
+	# "a book" asks for one, "a couple of novels" for two; plain plurals get the default.
+	m = _COUNT_MENTION.search(lowered)
+	if not m:
+		return MAX_RECOMMENDATIONS
+	word = [w for w in m.group(1).split() if w not in ("a", "of")] or ["a"]
+	word, noun = word[0], m.group(2)
+	n = int(word) if word.isdigit() else _COUNT_WORDS[word]
+	if word in ("a", "an") and noun.endswith("s"):
+		return MAX_RECOMMENDATIONS
+	return max(1, min(MAX_RECOMMENDATIONS, n))
+
+
+def _lookup_candidate(raw: str) -> str:
+	raw = raw.strip()
+	text = _normalize_text(raw)
+	if raw[:1] not in _QUOTE_CHARS and text.split(" ", 1)[0] in _DESCRIPTION_START:
+		return ""
+	return text
+
+
+class QueryPlanner:
+	__slots__ = ("geo", "_cache", "_lock")
+
+	def __init__(self, geo: GeoMatcher):
+		self.geo = geo
+		self._cache: "OrderedDict[str, QueryPlan]" = OrderedDict()
+		self._lock = threading.Lock()
+
+	def plan(self, user_text: str) -> QueryPlan:
+		key = " ".join(str(user_text or "").lower().split())
+		with self._lock:
+			plan = self._cache.get(key)
+			if plan is not None:
+				self._cache.move_to_end(key)
+				return plan
+		plan = self._build(key)
+		with self._lock:
+			self._cache[key] = plan
+			while len(self._cache) > ATLAS_CHAT_PLAN_CACHE:
+				self._cache.popitem(last=False)
+		return plan
+
+	def _build(self, lowered: str) -> QueryPlan:
+		raw_tokens = _tokenize_query(lowered)
+		expanded_tokens = _expand_theme_tokens(raw_tokens)
+		geo = self.geo.match(lowered)
+		titles = tuple(t for t in (_normalize_text(m) for m in _QUOTED_TITLE.findall(lowered)) if t)
+		authors = tuple(
+			" ".join(parts[:4])
+			for parts in (_normalize_text(m).split() for m in _AUTHOR_MENTION.findall(lowered))
+			if parts and parts[0] not in _QUERY_STOPWORDS
+		)
+		# Lookup candidates come from lookup phrasing ("do you have X", "is X in stock") or a message
+		# that is nothing but the name (minus any "by ..." tail) and more than one word: a bare
+		# "memoirs" is a theme, not a title. Quoted titles elsewhere in a request stay context.
+		# A bare message may still name an author, but only counts as a title when it is phrased
+		# as a lookup (quoted, "do you have ...", "... by X"): "queer romance" is a request even
+		# when some book carries that title.
+		text = _normalize_text(lowered)
+		similar = bool(_SIMILAR_PHRASE.search(lowered))
+		phrase = _LOOKUP_PHRASE.match(lowered) or _LOOKUP_SUFFIX.match(lowered)
+		phrased = bool(phrase or titles or authors)
+		lookups: Tuple[str, ...] = ()
+		if not similar:
+			if phrase:
+				candidate = _lookup_candidate(phrase.group(1))
+			elif len(raw_tokens) >= 2:
+				candidate = _lookup_candidate(lowered.split(" by ", 1)[0])
+			else:
+				candidate = ""
+			lookups = (candidate,) if candidate else ()
+		return QueryPlan(
+			text=text,
+			raw_tokens=tuple(raw_tokens),
+			expanded_tokens=tuple(expanded_tokens),
+			theme_tokens=tuple(_theme_tokens_from_query(raw_tokens, expanded_tokens, geo.terms)),
+			geo_iso2=geo.iso2,
+			geo_terms=geo.terms,
+			titles=titles,
+			authors=authors,
+			lookups=lookups,
+			similar=similar,
+			phrased=phrased,
+			count=_requested_count(lowered),
+		)
+
+
+# ─────────── Title / author lookups ───────────
+# "do you have Giovanni's Room" or "anything by Abdellah Taïa" is answered from trigram indexes
+# over the snapshot's folded titles and authors, without calling the model, when the best match
+# scores at least ATLAS_CHAT_LOOKUP_MIN (Dice over character trigrams; above 1 disables it).
+ATLAS_CHAT_LOOKUP_MIN = float(os.environ.get("ATLAS_CHAT_LOOKUP_MIN") or 0.85)
+
+
+def _lookup_key(folded: str) -> str:
+	# Spaces dropped so "giovannis room" and "giovanni s room" (from "Giovanni's") compare equal.
+	return folded.replace(" ", "")
+
+
+class LookupIndex:
+	__slots__ = ("titles", "authors", "by_title", "by_author")
+
+	def __init__(self, books: Sequence[Dict[str, Any]]):
+		self.by_title: Dict[str, List[int]] = {}
+		self.by_author: Dict[str, List[int]] = {}
+		for i, b in enumerate(books):
+			title = b.get("_title_norm")
+			author = b.get("_author_norm")
+			if title is None:
+				title = _normalize_text(b.get("title"))
+			if author is None:
+				author = _normalize_text(b.get("author"))
+			if title:
+				self.by_title.setdefault(_lookup_key(title), []).append(i)
+			if author:
+				self.by_author.setdefault(_lookup_key(author), []).append(i)
+		self.titles = TrigramIndex(self.by_title)
+		self.authors = TrigramIndex(self.by_author)
+
+	def best(self, index: TrigramIndex, texts: Sequence[str], min_score: float) -> Optional[Tuple[str, float]]:
+		best: Optional[Tuple[str, float]] = None
+		for text in texts:
+			for key, score in index.search(_lookup_key(text), 1, min_score):
+				if best is None or score > best[1]:
+					best = (key, score)
+		return best
+
+
+def _lookup_recommendations(
+	books: Sequence[Dict[str, Any]],
+	lookup: LookupIndex,
+	plan: QueryPlan
+) -> Optional[Dict[str, Any]]:
+	# A parsed-model-shaped payload for _validate_payload, or None to fall through to the model.
+	if ATLAS_CHAT_LOOKUP_MIN > 1 or plan.similar:
+		return None
+	authors = lookup.best(lookup.authors, plan.authors, ATLAS_CHAT_LOOKUP_MIN) if plan.authors else None
+	title = lookup.best(lookup.titles, plan.lookups, ATLAS_CHAT_LOOKUP_MIN) if plan.lookups and plan.phrased else None
+	if title is not None:
+		hits = lookup.by_title[title[0]]
+		if authors is not None:
+			hits = [i for i in hits if _lookup_key(str(books[i].get("_author_norm") or "")) == authors[0]]
+		if not hits:
+			# The title and author named different books; let the model sort it out.
+			return None
+		return {
+			"assistant_markdown": "",
+			"recommendations": [{"book_id": str(books[hits[0]].get("id")), "reason": "It's in the Atlas catalog."}],
+			"lookup": {"kind": "title", "key": title[0], "score": round(title[1], 3)},
+		}
+	if plan.geo_iso2:
+		return None
+	if authors is None and plan.lookups and len(plan.raw_tokens) <= 4:
+		authors = lookup.best(lookup.authors, plan.lookups, ATLAS_CHAT_LOOKUP_MIN)
+	if authors is None:
+		return None
+	hits = sorted(lookup.by_author[authors[0]], key=lambda i: (books[i].get("stamp") is not True, str(books[i].get("title") or "")))
+	return {
+		"assistant_markdown": "",
+		"recommendations": [
+			{"book_id": str(books[i].get("id")), "reason": f"By {books[i].get('author')}."} for i in hits[:plan.count]
+		],
+		"lookup": {"kind": "author", "key": authors[0], "score": round(authors[1], 3)},
+	}
+
+
+# ─────────── Typeahead ───────────
+# atlasSearch matches every query word as a word prefix in a book's title, author, tags or
+# country names (all words must match somewhere) and scores by the best field per word. A word
+# that completes nothing is first corrected to the nearest indexed word by trigram similarity
+# (at least ATLAS_SEARCH_FUZZY_MIN). At most ATLAS_SEARCH_CANDIDATES books are scored per
+# query, best-ranked first, so one- and two-letter prefixes stay cheap.
+ATLAS_SEARCH_CANDIDATES = int(os.environ.get("ATLAS_SEARCH_CANDIDATES") or 1000)
+ATLAS_SEARCH_FUZZY_MIN = float(os.environ.get("ATLAS_SEARCH_FUZZY_MIN") or 0.5)
+ATLAS_SEARCH_MAX_K = 50
+
+_TYPEAHEAD_FIELDS = ("title", "author", "tags", "countries")
+_TYPEAHEAD_WEIGHTS = (3.0, 2.5, 1.5, 1.0)
+
+
+def _typeahead_fields(b: Dict[str, Any]) -> Tuple[str, ...]:
+	# Space-padded folded text per field, so " " + word tests a word prefix with `in`.
+	tags = b.get("tags") or ()
+	countries = sorted(_book_geo_iso2(b))
+	return (
+		f" {b.get('_title_norm') or _normalize_text(b.get('title'))} ",
+		f" {b.get('_author_norm') or _normalize_text(b.get('author'))} ",
+		f" {' '.join(_fold_term_list(tuple(tags))) if isinstance(tags, (list, tuple)) else ''} ",
+		f" {' '.join(_fold_name(_iso2_to_country_name(iso2) or iso2) for iso2 in countries)} ",
+	)
+
+
+class TypeaheadIndex:
+	# Books are stored in rank order (Editor's Picks, then title), so posting lists are already
+	# sorted best-first and the candidate cap keeps the best-ranked matches.
+	__slots__ = ("order", "fields", "words", "vocab")
+
+	def __init__(self, books: Sequence[Dict[str, Any]]):
+		fields = [_typeahead_fields(b) for b in books]
+		self.order = sorted(range(len(books)), key=lambda i: (books[i].get("stamp") is not True, fields[i][0], str(books[i].get("id") or "")))
+		self.fields = [fields[i] for i in self.order]
+		self.words = InvertedIndex(" ".join(f).split() for f in self.fields)
+		self.vocab = TrigramIndex(self.words.postings)
+
+	def _postings(self, token: str) -> List[Sequence[int]]:
+		return [self.words.postings[t] for t in self.words.terms_with_prefix(token)]
+
+	def correct(self, tokens: Sequence[str]) -> List[str]:
+		# Words that complete nothing are swapped for the closest vocabulary word ("mothr" -> "mother").
+		out: List[str] = []
+		for tok in tokens:
+			if len(tok) >= 3 and not self.words.terms_with_prefix(tok):
+				best = self.vocab.search(tok, 1, ATLAS_SEARCH_FUZZY_MIN)
+				if best:
+					tok = best[0][0]
+			out.append(tok)
+		return out
+
+	def score(self, pos: int, tokens: Sequence[str]) -> float:
+		fields = self.fields[pos]
+		total = 0.0
+		for tok in tokens:
+			best = 0.0
+			for field, weight in zip(fields, _TYPEAHEAD_WEIGHTS):
+				if f" {tok}" in field:
+					# Whole words beat completions ("room" over "roommates").
+					best = max(best, weight if f" {tok} " in field else weight * 0.8)
+			if not best:
+				return 0.0
+			total += best
+		phrase = f" {' '.join(tokens)}"
+		if phrase in fields[0]:
+			total += 1.0 if fields[0].startswith(phrase) else 0.5
+		return total
+
+	def search(self, tokens: Sequence[str], k: int) -> List[Tuple[int, float]]:
+		# (book ordinal, score) pairs, best first; ties keep rank order. Candidates come from the
+		# query word with the fewest postings, walked best-ranked first and filtered by the other
+		# words' postings where those are small enough to hash, until ATLAS_SEARCH_CANDIDATES books
+		# have matched every word.
+		if not tokens:
+			return []
+		cap = ATLAS_SEARCH_CANDIDATES
+		lists = sorted(
+			((sum(len(p) for p in ls), ls) for ls in map(self._postings, set(tokens))),
+			key=lambda item: item[0],
+		)
+		_, first = lists[0]
+		walk = first[0] if len(first) == 1 else (pos for pos, _ in groupby(heapq.merge(*first)))
+		filters = [set().union(*ls) for size, ls in lists[1:] if size <= 10 * cap]
+		hits = []
+		scored = 0
+		for pos in walk:
+			if len(hits) >= cap or scored >= 10 * cap:
+				break
+			if all(pos in f for f in filters):
+				scored += 1
+				score = self.score(pos, tokens)
+				if score:
+					hits.append((-score, pos))
+		return [(self.order[pos], -neg) for neg, pos in heapq.nsmallest(k, hits)]
+
+
+def _highlight_spans(text: Any, tokens: Sequence[str]) -> List[List[int]]:
+	# [start, end) offsets into the original string for each word that starts with a token.
+	folded, origin = _fold_spans(text)
+	spans: List[List[int]] = []
+	for m in re.finditer(r"\S+", folded):
+		word = m.group(0)
+		match = max((tok for tok in tokens if word.startswith(tok)), key=len, default=None)
+		if match:
+			start = m.start()
+			spans.append([origin[start], origin[start + len(match) - 1] + 1])
+	return spans
+
+
+def _typeahead_results(catalog: "CatalogSnapshot", query: str, k: int, fields: str) -> List[Dict[str, Any]]:
+	index = catalog.typeahead_index()
+	tokens = index.correct(_normalize_text(query).split())
+	books = catalog.books
+	hits = index.search(tokens, k)
+
+	results: List[Dict[str, Any]] = []
+	for i, score in hits:
+		b = books[i]
+		tags = b.get("tags") or ()
+		highlights: Dict[str, Any] = {
+			"title": _highlight_spans(b.get("title"), tokens),
+			"author": _highlight_spans(b.get("author"), tokens),
+			"tags": [[n, *span] for n, tag in enumerate(tags) for span in _highlight_spans(tag, tokens)],
+		}
+		results.append({"book": _CLIENT_PROJECTIONS[fields](b), "score": round(score, 3), "highlights": highlights})
+	return results
+
+
 def _book_geo_iso2(b: Dict[str, Any]) -> set:
 	sets = b.get("_iso2_sets") or {}
 	if not isinstance(sets, dict):
 		return set()
 	any_set = sets.get("any") or set()
-	return set(any_set) if isinstance(any_set, set) else set()
+	return any_set if isinstance(any_set, (set, frozenset)) else set()
 
 
 def _book_matches_geo(b: Dict[str, Any], geo_iso2: Optional[set]) -> bool:
@@ -456,104 +1708,303 @@ def _book_matches_geo(b: Dict[str, Any], geo_iso2: Optional[set]) -> bool:
 	return bool(_book_geo_iso2(b) & geo_iso2)
 
 
-def _book_matches_theme(b: Dict[str, Any], theme_tokens: List[str]) -> bool:
-	if not theme_tokens:
-		return True
-	blob = str(b.get("_blob") or "")
-	return any(tok in blob for tok in theme_tokens)
+def _prefix_match(tok: str) -> bool:
+	return 0 < ATLAS_CHAT_PREFIX_MIN <= len(tok)
 
 
-def _score_book_for_query(
-	b: Dict[str, Any],
-	query_tokens: List[str],
-	selected_iso2: Optional[str],
-	geo_iso2: Optional[set] = None,
-	theme_tokens: Optional[List[str]] = None
-) -> float:
-	score = 0.0
-	blob = str(b.get("_blob") or "")
-	themes = theme_tokens if theme_tokens else query_tokens
-	if themes and blob:
-		for tok in themes:
-			if tok in blob:
-				score += 1.0
-	if geo_iso2 and (_book_geo_iso2(b) & geo_iso2):
-		score += 3.0
+@lru_cache(maxsize=8192)
+def _fold_term_list(values: Tuple[Any, ...]) -> Tuple[str, ...]:
+	# Tag and category tuples are shared across books (see _Vocabulary.combo); fold each once.
+	return tuple(t for v in values for t in _fold_name(str(v)).split())
+
+
+def _search_fields(b: Dict[str, Any]) -> Dict[str, Sequence[str]]:
+	# A book's folded searchable text, split per BM25F field.
+	summary = str(b.get("summary") or "")
+	description = str(b.get("description") or "")
+	if description and description != summary:
+		summary = f"{summary} {description}"
+	places: List[str] = []
+	for entries in (b.get("_places") or {}).values():
+		for entry in entries if isinstance(entries, list) else ():
+			places.append(str(entry.get("iso2") or "").lower())
+			places.extend(_fold_name(str(entry.get("name") or "")).split())
+	tags = b.get("tags") or ()
+	categories = b.get("categories") or ()
+	return {
+		"title": str(b.get("_title_norm") or _normalize_text(b.get("title"))).split(),
+		"author": str(b.get("_author_norm") or _normalize_text(b.get("author"))).split(),
+		"tags": _fold_term_list(tuple(tags)) if isinstance(tags, (list, tuple)) else (),
+		"places": places,
+		"categories": _fold_term_list(tuple(categories)) if isinstance(categories, (list, tuple)) else (),
+		"summary": _fold_terms(summary),
+		"year": _fold_terms(b.get("year")),
+	}
+
+
+@lru_cache(maxsize=8192)
+def _lower_list(values: Tuple[Any, ...]) -> Tuple[str, ...]:
+	return tuple(str(v).lower() for v in values)
+
+
+def _book_facets(b: Dict[str, Any]) -> Dict[str, Sequence[str]]:
+	# Facet values as the list view filters them: ISO2 per place kind, lowercased tags and
+	# categories, and the stamp / read flags.
+	sets = b.get("_iso2_sets") or {}
+	if not isinstance(sets, dict):
+		sets = {}
+	tags = b.get("tags") or ()
+	categories = b.get("categories") or ()
+	return {
+		"override": sets.get("override") or (),
+		"setting": sets.get("setting") or (),
+		"author": sets.get("author") or (),
+		"any": sets.get("any") or (),
+		"tag": _lower_list(tuple(tags)) if isinstance(tags, (list, tuple)) else (),
+		"category": _lower_list(tuple(categories)) if isinstance(categories, (list, tuple)) else (),
+		"flag": [flag for flag in ("stamp", "read") if b.get(flag) is True],
+	}
+
+
+def _facet_bitmaps(books: Sequence[Dict[str, Any]]) -> FacetBitmaps:
+	return FacetBitmaps(_book_facets(b) for b in books)
+
+
+class CatalogSearchIndex:
+	# Term and country posting lists over one snapshot's books, so ranking only touches books
+	# that share a term or a country with the query instead of scanning every book. The term
+	# lists carry BM25F weights computed from this snapshot's field lengths. Facet bitmaps
+	# (shared with the snapshot's filter API) answer the geo side of tier-1 pinning.
+	__slots__ = ("text", "geo", "facets", "id_rank", "id_order", "index_rows", "_matrix", "_semantic", "_lock")
+
+	def __init__(self, books: Sequence[Dict[str, Any]], facets: Optional[FacetBitmaps] = None):
+		self.facets = facets if facets is not None else _facet_bitmaps(books)
+		self.text = BM25FIndex(
+			(_search_fields(b) for b in books), _BM25F_FIELD_WEIGHTS, k1=_BM25F_K1, b=_BM25F_B, min_len=2
+		)
+		self.geo = InvertedIndex(_book_geo_iso2(b) for b in books)
+		self.id_order = tuple(sorted(range(len(books)), key=lambda i: str(books[i].get("id") or "")))
+		rank = [0] * len(books)
+		for pos, i in enumerate(self.id_order):
+			rank[i] = pos
+		self.id_rank = rank
+		# CANDIDATES_INDEX rows are the same for every query; build each once, on first use.
+		self.index_rows: List[Optional[Dict[str, Any]]] = [None] * len(books)
+		self._matrix = None
+		self._semantic = None
+		self._lock = threading.Lock()
+
+	def lookup(self, tok: str) -> Sequence[int]:
+		return self.text.lookup(tok, prefix=_prefix_match(tok))
+
+	def has_term(self, ordinal: int, tok: str) -> bool:
+		postings = self.lookup(tok)
+		pos = bisect_left(postings, ordinal)
+		return pos < len(postings) and postings[pos] == ordinal
+
+	def matches_theme(self, ordinal: int, theme_tokens: Sequence[str]) -> bool:
+		return not theme_tokens or any(self.has_term(ordinal, tok) for tok in theme_tokens)
+
+	def count_score(
+		self,
+		ordinal: int,
+		query_tokens: Sequence[str],
+		selected_iso2: Optional[str],
+		geo_iso2: Optional[set] = None,
+		theme_tokens: Optional[Sequence[str]] = None
+	) -> float:
+		# Per-book form of the ATLAS_CHAT_RANKER=count scoring in _rank_ordinals.
+		score = float(sum(self.has_term(ordinal, tok) for tok in (theme_tokens or query_tokens)))
+		if geo_iso2 and (self.geo_bits(geo_iso2) >> ordinal) & 1:
+			score += _GEO_MATCH_BOOST
+		if selected_iso2 and (self.facets.get("any", selected_iso2) >> ordinal) & 1:
+			score += _SELECTED_COUNTRY_BOOST
+		return score
+
+	def term_bits(self, toks: Sequence[str]) -> int:
+		bits = 0
+		for tok in toks:
+			bits |= _ordinals_to_bits(self.lookup(tok), self.text.size)
+		return bits
+
+	def geo_bits(self, iso2s) -> int:
+		return self.facets.any_of("any", iso2s)
+
+	def geo_hits(self, iso2s) -> List[int]:
+		return _bits_to_ordinals(self.geo_bits(iso2s))
+
+	def term_group(self, tok: str) -> List[str]:
+		if _prefix_match(tok):
+			return self.text.terms_with_prefix(tok)
+		return [tok] if tok in self.text else []
+
+	def ranking_matrix(self) -> Any:
+		if self._matrix is None:
+			with self._lock:
+				if self._matrix is None:
+					from atlas_numpy import RankingMatrix
+
+					self._matrix = RankingMatrix(self.text, self.geo, self.id_rank, self.id_order)
+		return self._matrix
+
+	def semantic_index(self) -> Any:
+		if self._semantic is None:
+			matrix = self.ranking_matrix()
+			with self._lock:
+				if self._semantic is None:
+					from atlas_numpy import SemanticIndex
+
+					self._semantic = SemanticIndex(matrix, dim=ATLAS_CHAT_SEMANTIC_DIM)
+		return self._semantic
+
+
+_NUMPY_AVAILABLE: Optional[bool] = None
+
+
+def _numpy_available() -> bool:
+	global _NUMPY_AVAILABLE
+	if _NUMPY_AVAILABLE is None:
+		try:
+			import numpy  # noqa: F401
+			_NUMPY_AVAILABLE = True
+		except ImportError:
+			_NUMPY_AVAILABLE = False
+			logger.warning("[atlasChat] NumPy is not installed; using the python engine without semantic candidates")
+	return _NUMPY_AVAILABLE
+
+
+def _numpy_engine_enabled() -> bool:
+	return ATLAS_CHAT_ENGINE == "numpy" and _numpy_available()
+
+
+def _semantic_enabled() -> bool:
+	return ATLAS_CHAT_SEMANTIC_K > 0 and _numpy_available()
+
+
+def _semantic_candidates(index: CatalogSearchIndex, tokens: Sequence[str]) -> List[int]:
+	if not tokens or not _semantic_enabled():
+		return []
+	# Over-fetch: the nearest vectors are often keyword matches tier 1 already holds.
+	hits = index.semantic_index().search(tokens, ATLAS_CHAT_SEMANTIC_K + TIER1_DETAIL_COUNT, ATLAS_CHAT_SEMANTIC_MIN)
+	return [i for i, _ in hits]
+
+
+def _rank_ordinals(
+	index: CatalogSearchIndex,
+	tokens: Sequence[str],
+	geo_iso2: Optional[set],
+	geo_hits: Sequence[int],
+	selected_iso2: Optional[str]
+) -> List[int]:
+	if _numpy_engine_enabled():
+		matrix = index.ranking_matrix()
+		scores = matrix.scores(
+			[g for g in (index.term_group(tok) for tok in tokens) if g],
+			geo_iso2, selected_iso2, _GEO_MATCH_BOOST, _SELECTED_COUNTRY_BOOST,
+			weighted=ATLAS_CHAT_RANKER != "count",
+		)
+		return matrix.rank(scores)
+
+	# Scores accumulate from posting lists; books outside every list score 0 and keep their
+	# id order behind the matches.
+	scores: Dict[int, float] = {}
+	for tok in tokens:
+		if ATLAS_CHAT_RANKER == "count":
+			for i in index.lookup(tok):
+				scores[i] = scores.get(i, 0.0) + 1.0
+		else:
+			index.text.score_into(scores, tok, prefix=_prefix_match(tok))
+	for i in geo_hits:
+		scores[i] = scores.get(i, 0.0) + _GEO_MATCH_BOOST
 	if selected_iso2:
-		sets = b.get("_iso2_sets") or {}
-		if isinstance(sets, dict):
-			any_set = sets.get("any") or set()
-			if selected_iso2 in any_set:
-				score += 0.5
-	return score
+		for i in index.geo.lookup(selected_iso2):
+			scores[i] = scores.get(i, 0.0) + _SELECTED_COUNTRY_BOOST
+
+	id_rank = index.id_rank
+	ranked = sorted(scores, key=lambda i: (-scores[i], id_rank[i]))
+	ranked.extend(i for i in index.id_order if i not in scores)
+	return ranked
+
+
+def _index_candidate_row(b: Dict[str, Any]) -> Dict[str, Any]:
+	places = b.get("_places") or {}
+	if not isinstance(places, dict):
+		places = {}
+	return {
+		"id": b.get("id"),
+		"title": b.get("title"),
+		"author": b.get("author"),
+		"tags": list(b.get("tags")[:12]) if isinstance(b.get("tags"), (list, tuple)) else [],
+		"categories": list(b.get("categories")[:8]) if isinstance(b.get("categories"), (list, tuple)) else [],
+		"places": places
+	}
 
 
 def _build_tiered_candidates(
-	all_books: List[Dict[str, Any]],
+	all_books: Sequence[Dict[str, Any]],
 	user_text: str,
 	selected_iso2: Optional[str],
-	available_countries: Optional[List[Dict[str, str]]] = None
+	available_countries: Optional[List[Dict[str, str]]] = None,
+	index: Optional[CatalogSearchIndex] = None,
+	plan: Optional[QueryPlan] = None
 ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], Dict[str, int]]:
 	if not all_books:
 		return [], [], {"tier1": 0, "tier2": 0, "total": 0}
+	if index is None:
+		index = CatalogSearchIndex(all_books)
+	if plan is None:
+		plan = QueryPlanner(_geo_matcher(available_countries or [])).plan(user_text)
 
-	raw_tokens = _tokenize_query(user_text)
-	expanded_tokens = _expand_theme_tokens(raw_tokens)
-	geo_iso2 = _infer_geo_iso2_from_query(user_text, available_countries or [])
-	theme_tokens = _theme_tokens_from_query(raw_tokens, expanded_tokens, geo_iso2, available_countries or [])
+	raw_tokens, expanded_tokens, theme_tokens = plan.raw_tokens, plan.expanded_tokens, plan.theme_tokens
+	geo_iso2 = set(plan.geo_iso2) if plan.geo_iso2 else None
 
-	scored: List[Tuple[float, str, Dict[str, Any]]] = []
-	for b in all_books:
-		bid = str(b.get("id") or "")
-		scored.append((
-			_score_book_for_query(b, expanded_tokens, selected_iso2, geo_iso2, theme_tokens),
-			bid,
-			b
-		))
-
-	scored.sort(key=lambda x: (-x[0], x[1]))
+	geo_bits = index.geo_bits(geo_iso2) if geo_iso2 else 0
+	geo_hits = _bits_to_ordinals(geo_bits)
+	ranked = _rank_ordinals(index, theme_tokens or expanded_tokens, geo_iso2, geo_hits, selected_iso2)
+	semantic = _semantic_candidates(index, raw_tokens)
 
 	tier1: List[Dict[str, Any]] = []
 	tier1_ids: set = set()
 
-	# Pin geo+theme matches so regional themed queries stay in the detailed tier.
-	if geo_iso2 and theme_tokens:
-		for b in all_books:
-			if not _book_matches_geo(b, geo_iso2) or not _book_matches_theme(b, theme_tokens):
-				continue
-			bid = str(b.get("id") or "")
-			if not bid or bid in tier1_ids:
-				continue
-			tier1.append(b)
-			tier1_ids.add(bid)
-
-	for _, _, b in scored:
-		if len(tier1) >= TIER1_DETAIL_COUNT:
-			break
+	def add_tier1(i: int) -> bool:
+		b = all_books[i]
 		bid = str(b.get("id") or "")
 		if not bid or bid in tier1_ids:
-			continue
+			return False
 		tier1.append(b)
 		tier1_ids.add(bid)
+		return True
 
-	tier2: List[Dict[str, Any]] = []
-	for _, _, b in scored:
-		bid = str(b.get("id") or "")
-		if not bid or bid in tier1_ids:
-			continue
-		places = b.get("_places") or {}
-		if not isinstance(places, dict):
-			places = {}
-		tier2.append({
-			"id": b.get("id"),
-			"title": b.get("title"),
-			"author": b.get("author"),
-			"tags": b.get("tags")[:12] if isinstance(b.get("tags"), list) else [],
-			"categories": b.get("categories")[:8] if isinstance(b.get("categories"), list) else [],
-			"places": places
-		})
+	# Pin geo+theme matches so regional themed queries stay in the detailed tier.
+	if geo_bits and theme_tokens:
+		for i in _bits_to_ordinals(geo_bits & index.term_bits(theme_tokens)):
+			add_tier1(i)
+
+	# Keyword matches first, leaving the last slots to semantic neighbours they missed.
+	keyword_slots = TIER1_DETAIL_COUNT - min(len(semantic), ATLAS_CHAT_SEMANTIC_K)
+	pos = 0
+	while pos < len(ranked) and len(tier1) < keyword_slots:
+		add_tier1(ranked[pos])
+		pos += 1
+	semantic_added = 0
+	for i in semantic:
+		if len(tier1) >= TIER1_DETAIL_COUNT or semantic_added >= ATLAS_CHAT_SEMANTIC_K:
+			break
+		semantic_added += add_tier1(i)
+	while pos < len(ranked) and len(tier1) < TIER1_DETAIL_COUNT:
+		add_tier1(ranked[pos])
+		pos += 1
 
-	stats = {"tier1": len(tier1), "tier2": len(tier2), "total": len(all_books)}
+	tier2: List[Dict[str, Any]] = []
+	rows = index.index_rows
+	for i in ranked:
+		row = rows[i]
+		if row is None:
+			row = rows[i] = _index_candidate_row(all_books[i])
+		if row["id"] and str(row["id"]) not in tier1_ids:
+			tier2.append(row)
+
+	stats = {"tier1": len(tier1), "tier2": len(tier2), "total": len(all_books), "semantic": semantic_added}
 	return tier1, tier2, stats
 
 
@@ -569,8 +2020,8 @@ def _compact_detail_candidates(candidates: List[Dict[str, Any]]) -> List[Dict[st
 			"author": b.get("author"),
 			"year": b.get("year"),
 			"page_count": b.get("page_count"),
-			"tags": b.get("tags")[:16] if isinstance(b.get("tags"), list) else [],
-			"categories": b.get("categories")[:16] if isinstance(b.get("categories"), list) else [],
+			"tags": list(b.get("tags")[:16]) if isinstance(b.get("tags"), (list, tuple)) else [],
+			"categories": list(b.get("categories")[:16]) if isinstance(b.get("categories"), (list, tuple)) else [],
 			"places": places,
 			"summary": (b.get("summary") or b.get("description") or "")[:650]
 		})
@@ -750,7 +2201,12 @@ def _build_synced_markdown(by_id: Dict[str, Dict[str, Any]], clean_recs: List[Di
 	return ""
 
 
-def _validate_payload(parsed: Dict[str, Any], by_id: Dict[str, Dict[str, Any]], user_text: str) -> Dict[str, Any]:
+def _validate_payload(
+	parsed: Dict[str, Any],
+	by_id: Dict[str, Dict[str, Any]],
+	user_text: str,
+	limit: int = MAX_RECOMMENDATIONS
+) -> Dict[str, Any]:
 	assistant_markdown = _sanitize_assistant_markdown(parsed.get("assistant_markdown") if isinstance(parsed, dict) else "")
 	recs = parsed.get("recommendations") if isinstance(parsed, dict) and isinstance(parsed.get("recommendations"), list) else []
 	fups = parsed.get("follow_up_questions") if isinstance(parsed, dict) and isinstance(parsed.get("follow_up_questions"), list) else []
@@ -766,8 +2222,8 @@ def _validate_payload(parsed: Dict[str, Any], by_id: Dict[str, Dict[str, Any]],
 			seen_ids.add(bid)
 			clean_recs.append({"book_id": bid, "reason": str(reason or "").strip()[:240]})
 
-	if len(clean_recs) > 3:
-		clean_recs = clean_recs[:3]
+	if len(clean_recs) > limit:
+		clean_recs = clean_recs[:limit]
 
 	clean_fups: List[str] = []
 	for q in fups[:2]:
@@ -790,8 +2246,10 @@ def _validate_payload(parsed: Dict[str, Any], by_id: Dict[str, Dict[str, Any]],
 		all_ok = True
 		for r in clean_recs:
 			b = by_id.get(r["book_id"]) or {}
-			title = str(b.get("title") or "").strip()
-			if title and _normalize_text(title) not in md_norm:
+			title = b.get("_title_norm")
+			if title is None:
+				title = _normalize_text(b.get("title"))
+			if title and title not in md_norm:
 				all_ok = False
 				break
 		if not all_ok:
@@ -876,18 +2334,209 @@ def _book_record_for_client(rec: Dict[str, Any]) -> Dict[str, Any]:
 		"description": str(rec.get("description") or "").strip(),
 		"google_books_url": _google_books_url_for_rec(rec),
 		"bookshop_url": str(rec.get("bookshop_url") or "").strip(),
-		"tags": rec.get("tags") if isinstance(rec.get("tags"), list) else [],
+		"tags": list(rec.get("tags")) if isinstance(rec.get("tags"), (list, tuple)) else [],
 		"read": rec.get("read") is True,
 		"stamp": rec.get("stamp") is True,
 		"country_override": rec.get("country_override") if rec.get("country_override") is not None else "",
-		"setting_country": rec.get("setting_country") if isinstance(rec.get("setting_country"), list) else [],
-		"author_country": rec.get("author_country") if isinstance(rec.get("author_country"), list) else [],
-		"author_origin": rec.get("author_origin") if isinstance(rec.get("author_origin"), list) else [],
+		"setting_country": list(rec.get("setting_country")) if isinstance(rec.get("setting_country"), (list, tuple)) else [],
+		"author_country": list(rec.get("author_country")) if isinstance(rec.get("author_country"), (list, tuple)) else [],
+		"author_origin": list(rec.get("author_origin")) if isinstance(rec.get("author_origin"), (list, tuple)) else [],
 	}
 
 
+def _book_record_for_client_lite(rec: Dict[str, Any]) -> Dict[str, Any]:
+	out = _book_record_for_client(rec)
+	summary = out.pop("summary")
+	description = out.pop("description")
+	out["has_blurb"] = bool(summary or description)
+	return out
+
+
+_CLIENT_PROJECTIONS = {
+	"full": _book_record_for_client,
+	"lite": _book_record_for_client_lite,
+}
+
+
+def _group_country_books(items: List[Dict[str, Any]]) -> Dict[str, Tuple[Dict[str, Any], ...]]:
+	grouped: Dict[str, List[Dict[str, Any]]] = {}
+	for b in items:
+		for iso2 in _book_geo_iso2(b):
+			grouped.setdefault(iso2, []).append(b)
+	return {
+		iso2: tuple(sorted(books, key=lambda b: (str(b.get("title") or "").casefold(), str(b.get("id") or ""))))
+		for iso2, books in grouped.items()
+	}
+
+
+def _parse_fields_param(val: Any) -> Optional[str]:
+	fields = str(val or "full").strip().lower()
+	return fields if fields in _CLIENT_PROJECTIONS else None
+
+
+def _parse_iso2_param(val: Any) -> Optional[str]:
+	code = str(val or "").strip().upper()
+	return code if len(code) == 2 and code.isalpha() else None
+
+
+def _parse_tags_param(val: Any) -> List[str]:
+	tags = [t.strip().lower() for t in str(val or "").split(",")]
+	return [t for t in dict.fromkeys(tags) if t][:32]
+
+
+def _parse_flag_param(val: Any) -> bool:
+	return str(val or "").strip().lower() in ("1", "true", "yes")
+
+
+def _list_filter_bits(facets: FacetBitmaps, country: Optional[str], tags: List[str], editors_pick: bool) -> int:
+	# The list view's filters (app.js applyListFilters): books placed by an override, in the
+	# override country, carrying any of the tags, stamped when editors_pick is set.
+	bits = facets.present("override")
+	if country:
+		bits &= facets.get("override", country)
+	if editors_pick:
+		bits &= facets.get("flag", "stamp")
+	if tags:
+		bits &= facets.any_of("tag", tags)
+	return bits
+
+
+def _parse_catalog_version(val: Any) -> Optional[int]:
+	try:
+		version = int(str(val or "").strip())
+	except ValueError:
+		return None
+	return version if version >= 0 else None
+
+
+def _catalog_delta_since(since: int, snapshot: CatalogSnapshot, fields: str = "full") -> Optional[Dict[str, Any]]:
+	# None means this instance cannot answer exactly; the caller sends a full snapshot.
+	if since < snapshot.history_floor or since > snapshot.version:
+		return None
+
+	items = snapshot.books
+	changed = [b for b in items if int(b.get("_updated_ms") or 0) > since]
+	if len(changed) > len(items) * ATLAS_CATALOG_DELTA_MAX_FRACTION:
+		return None
+
+	deletes = sorted(bid for bid, ms in snapshot.tombstones.items() if ms > since)
+	return {
+		"delta": True,
+		"since": since,
+		"version": snapshot.version,
+		"upserts": [_CLIENT_PROJECTIONS[fields](b) for b in changed],
+		"deletes": deletes,
+		"count": len(items),
+	}
+
+
+# ─────────── Instance warmup ───────────
+# Builds everything a first request would otherwise pay for: the Firestore client, the
+# catalog snapshot and its encoded bodies. With ATLAS_WARMUP_ON_IMPORT=1 main.py starts it
+# on a background thread as the instance boots; atlasWarm runs it on demand and reports
+# per-step timings so a scheduler ping doubles as a cold-start probe. Later indexes register
+# their build step in _WARMUP_STEPS.
+ATLAS_WARMUP_ON_IMPORT = (os.environ.get("ATLAS_WARMUP_ON_IMPORT") or "").strip().lower() in ("1", "true", "yes")
+# How long atlasWarm waits for a boot-time warmup that is still running before warming itself.
+ATLAS_WARMUP_WAIT_SEC = float(os.environ.get("ATLAS_WARMUP_WAIT_SEC") or 60)
+# Non-HTTP functions (the aggregate trigger) never read the catalog, so they skip boot warmup.
+_WARMUP_SKIP_TARGETS = frozenset({"atlasCatalogAggregate"})
+
+_WARMUP_STEPS: List[Tuple[str, Any]] = [
+	("catalog_body_full", lambda catalog: len(catalog.encoded_catalog("full")["identity"])),
+	("catalog_body_lite", lambda catalog: len(catalog.encoded_catalog("lite")["identity"])),
+	# The map requests ?iso2= buckets with fields=lite; full buckets stay encoded on demand.
+	("country_buckets", lambda catalog: sum(len(catalog.encoded_bucket("lite", iso2)["identity"]) for iso2 in catalog.country_buckets)),
+	("facet_bitmaps", lambda catalog: len(catalog.facet_bitmaps().facets)),
+	("search_index", lambda catalog: len(catalog.search_index().text)),
+	("query_planner", lambda catalog: catalog.query_planner().plan("warmup").count),
+	("lookup_index", lambda catalog: len(catalog.lookup_index().titles.keys)),
+	("typeahead_index", lambda catalog: len(catalog.typeahead_index().words)),
+	("geo_matcher", lambda catalog: len(catalog.geo_matcher().available)),
+	("ranking_matrix", lambda catalog: catalog.search_index().ranking_matrix().size if _numpy_engine_enabled() else 0),
+	("semantic_index", lambda catalog: len(catalog.search_index().semantic_index().vectors) if _semantic_enabled() else 0),
+]
+
+_ATLAS_WARMUP_LOCK = threading.Lock()
+_ATLAS_WARMUP_GUARD = threading.Lock()
+_ATLAS_WARMUP_THREAD: Optional[threading.Thread] = None
+_ATLAS_WARMUP_REPORT: Dict[str, Any] = {}
+_ATLAS_INSTANCE_STARTED = time.time()
+
+
+def _timed_step(steps: List[Dict[str, Any]], name: str, fn) -> Any:
+	started = time.perf_counter()
+	try:
+		result = fn()
+		steps.append({"step": name, "ok": True, "ms": round((time.perf_counter() - started) * 1000, 1)})
+		return result
+	except Exception as e:
+		steps.append({"step": name, "ok": False, "ms": round((time.perf_counter() - started) * 1000, 1), "error": str(e)[:300]})
+		logger.error(f"[atlasWarm] {name} failed: {e}")
+		return None
+
+
+def _prebuild_catalog(catalog: CatalogSnapshot, steps: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+	steps = [] if steps is None else steps
+	started = time.perf_counter()
+	for name, build in _WARMUP_STEPS:
+		_timed_step(steps, name, lambda build=build: build(catalog))
+	logger.info(
+		f"[atlasChat] prebuilt catalog indexes version={catalog.version} "
+		f"ms={int((time.perf_counter() - started) * 1000)} build={ATLAS_CHAT_BUILD}"
+	)
+	return steps
+
+
+def _warm_atlas_instance() -> Dict[str, Any]:
+	global _ATLAS_WARMUP_REPORT
+
+	with _ATLAS_WARMUP_LOCK:
+		started = time.perf_counter()
+		steps: List[Dict[str, Any]] = []
+		if isinstance(_get_catalog_source(), FirestoreCatalogSource):
+			_timed_step(steps, "firestore_client", _get_db)
+		catalog = _timed_step(steps, "catalog", _load_atlas_catalog)
+		if catalog is not None and catalog.books:
+			_prebuild_catalog(catalog, steps)
+
+		report = {
+			"ok": all(step["ok"] for step in steps) and bool(catalog is not None and catalog.books),
+			"steps": steps,
+			"ms": round((time.perf_counter() - started) * 1000, 1),
+			"books": len(catalog) if catalog is not None else 0,
+			"version": catalog.version if catalog is not None else 0,
+			"instance_age_sec": round(time.time() - _ATLAS_INSTANCE_STARTED, 1),
+			"build": ATLAS_CHAT_BUILD,
+		}
+		_ATLAS_WARMUP_REPORT = report
+
+	logger.info(f"[atlasWarm] ok={report['ok']} books={report['books']} ms={report['ms']} build={ATLAS_CHAT_BUILD}")
+	return report
+
+
+def _start_instance_warmup() -> bool:
+	global _ATLAS_WARMUP_THREAD
+
+	with _ATLAS_WARMUP_GUARD:
+		if _ATLAS_WARMUP_THREAD is not None:
+			return False
+		_ATLAS_WARMUP_THREAD = threading.Thread(target=_warm_atlas_instance, name="atlas-warmup", daemon=True)
+		_ATLAS_WARMUP_THREAD.start()
+	return True
+
+
+def warm_on_import() -> bool:
+	# Only inside a serving container (Cloud Run or the emulator), never while the
+	# Firebase CLI imports main.py to discover functions at deploy time.
+	serving = bool(os.environ.get("K_SERVICE") or os.environ.get("FUNCTIONS_EMULATOR"))
+	if os.environ.get("FUNCTION_TARGET", "") in _WARMUP_SKIP_TARGETS:
+		return False
+	return ATLAS_WARMUP_ON_IMPORT and serving and _start_instance_warmup()
+
+
 # ─────────── HTTP Functions ───────────
-@https_fn.on_request()
+@https_fn.on_request(**_CONCURRENCY_OPTIONS)
 def atlasCatalog(req: https_fn.Request) -> https_fn.Response:
 	cors_methods = "GET, OPTIONS"
 	if req.method == "OPTIONS":
@@ -897,15 +2546,107 @@ def atlasCatalog(req: https_fn.Request) -> https_fn.Response:
 		return _json_response({"error": "method_not_allowed"}, status=405, methods=cors_methods)
 
 	try:
-		items, _, _ = _load_atlas_books_cached()
-		books = [_book_record_for_client(rec) for rec in items]
-		return _json_response({"books": books, "count": len(books)}, methods=cors_methods)
+		fields = _parse_fields_param(req.args.get("fields"))
+		if not fields:
+			return _json_response({"error": "invalid_fields"}, status=400, methods=cors_methods)
+
+		catalog = _load_atlas_catalog()
+		# Until a read has published a snapshot there is no catalog to serve; an empty one must
+		# never reach the CDN or the client's stored copy.
+		if not catalog.loaded_at:
+			return _json_response(
+				{"error": "catalog_loading"}, status=503, methods=cors_methods, cache_control="no-store",
+			)
+		cache_control = ATLAS_CATALOG_CACHE_CONTROL if catalog.books else "no-store"
+
+		if any(k in req.args for k in ("country", "tags", "pick")):
+			country = _parse_iso2_param(req.args.get("country")) if "country" in req.args else None
+			if "country" in req.args and not country:
+				return _json_response({"error": "invalid_country"}, status=400, methods=cors_methods)
+			tags = _parse_tags_param(req.args.get("tags"))
+			pick = _parse_flag_param(req.args.get("pick"))
+			encoded = catalog.encoded_filtered(fields, country, tags, pick)
+			if encoded is None:
+				return _json_response(catalog.filtered_body(fields, country, sorted(tags), pick), methods=cors_methods)
+			return _encoded_json_response(req, encoded, methods=cors_methods, cache_control=cache_control)
+
+		if "iso2" in req.args:
+			iso2 = _parse_iso2_param(req.args.get("iso2"))
+			if not iso2:
+				return _json_response({"error": "invalid_iso2"}, status=400, methods=cors_methods)
+			bucket = catalog.encoded_bucket(fields, iso2)
+			if bucket is None:
+				return _json_response({"iso2": iso2, "books": [], "count": 0, "version": catalog.version}, methods=cors_methods)
+			return _encoded_json_response(req, bucket, methods=cors_methods, cache_control=cache_control)
+
+		since = _parse_catalog_version(req.args.get("since"))
+		if since is not None:
+			delta = _catalog_delta_since(since, catalog, fields)
+			if delta is not None:
+				return _json_response(delta, methods=cors_methods)
+
+		return _encoded_json_response(req, catalog.encoded_catalog(fields), methods=cors_methods, cache_control=cache_control)
 	except Exception as e:
 		logger.error(f"[atlasCatalog] failed: {e}\n{traceback.format_exc()}")
 		return _json_response({"error": "catalog_unavailable"}, status=500, methods=cors_methods)
 
 
-@https_fn.on_request(secrets=["OPENAI_API_KEY"])
+@https_fn.on_request(**_CONCURRENCY_OPTIONS)
+def atlasBook(req: https_fn.Request) -> https_fn.Response:
+	cors_methods = "GET, OPTIONS"
+	if req.method == "OPTIONS":
+		return _json_response({"ok": True}, status=204, methods=cors_methods)
+
+	if req.method != "GET":
+		return _json_response({"error": "method_not_allowed"}, status=405, methods=cors_methods)
+
+	book_id = str(req.args.get("id") or "").strip()
+	if not book_id:
+		return _json_response({"error": "missing_id"}, status=400, methods=cors_methods)
+
+	try:
+		encoded = _load_atlas_catalog().encoded_book(book_id)
+		if encoded is None:
+			return _json_response({"error": "not_found"}, status=404, methods=cors_methods)
+		return _encoded_json_response(req, encoded, methods=cors_methods)
+	except Exception as e:
+		logger.error(f"[atlasBook] failed: {e}\n{traceback.format_exc()}")
+		return _json_response({"error": "catalog_unavailable"}, status=500, methods=cors_methods)
+
+
+@https_fn.on_request(**_CONCURRENCY_OPTIONS)
+def atlasSearch(req: https_fn.Request) -> https_fn.Response:
+	cors_methods = "GET, OPTIONS"
+	if req.method == "OPTIONS":
+		return _json_response({"ok": True}, status=204, methods=cors_methods)
+
+	if req.method != "GET":
+		return _json_response({"error": "method_not_allowed"}, status=405, methods=cors_methods)
+
+	query = str(req.args.get("q") or "").strip()[:120]
+	fields = _parse_fields_param(req.args.get("fields") or "lite")
+	if not fields:
+		return _json_response({"error": "invalid_fields"}, status=400, methods=cors_methods)
+	try:
+		k = max(1, min(ATLAS_SEARCH_MAX_K, int(req.args.get("k") or 10)))
+	except ValueError:
+		return _json_response({"error": "invalid_k"}, status=400, methods=cors_methods)
+
+	try:
+		started = time.perf_counter()
+		catalog = _load_atlas_catalog()
+		results = _typeahead_results(catalog, query, k, fields) if len(_normalize_text(query)) >= 2 else []
+		body = {
+			"q": query, "results": results, "count": len(results), "version": catalog.version,
+			"ms": round((time.perf_counter() - started) * 1000, 2),
+		}
+		return _json_response(body, methods=cors_methods)
+	except Exception as e:
+		logger.error(f"[atlasSearch] failed: {e}\n{traceback.format_exc()}")
+		return _json_response({"error": "catalog_unavailable"}, status=500, methods=cors_methods)
+
+
+@https_fn.on_request(secrets=["OPENAI_API_KEY"], **_CONCURRENCY_OPTIONS)
 def atlasChat(req: https_fn.Request) -> https_fn.Response:
 	if req.method == "OPTIONS":
 		return _json_response({"ok": True}, status=204)
@@ -950,7 +2691,9 @@ def atlasChat(req: https_fn.Request) -> https_fn.Response:
 			"build": ATLAS_CHAT_BUILD
 		}, status=200)
 
-	all_books, by_id, available_countries = _load_atlas_books_cached()
+	# Pin one snapshot so ranking, validation and the retry pass all see the same catalog.
+	catalog = _load_atlas_catalog()
+	all_books, by_id, available_countries = catalog.books, catalog.by_id, catalog.available_countries
 	if not all_books:
 		out = {"error": "catalog_unavailable", "build": ATLAS_CHAT_BUILD}
 		if debug:
@@ -962,12 +2705,6 @@ def atlasChat(req: https_fn.Request) -> https_fn.Response:
 		return _json_response(out, status=500)
 
 	api_key = os.environ.get("OPENAI_API_KEY") or ""
-	if not api_key:
-		out = {"error": "missing_openai_api_key", "build": ATLAS_CHAT_BUILD}
-		if debug:
-			out["debug"] = {"build": ATLAS_CHAT_BUILD}
-		return _json_response(out, status=500)
-
 	history: List[Dict[str, str]] = []
 	for m in messages[-12:]:
 		if not isinstance(m, dict):
@@ -978,8 +2715,32 @@ def atlasChat(req: https_fn.Request) -> https_fn.Response:
 			history.append({"role": role, "content": content.strip()})
 
 	try:
+		# The first plan on a snapshot also builds its planner and geo matcher.
+		plan = catalog.query_planner().plan(last_user_text)
+		if debug:
+			logger.info(f"[atlasChat] plan={json.dumps(plan.as_log(), ensure_ascii=False)}")
+
+		# Title and author lookups answer from the snapshot alone: no model call, no API key needed.
+		lookup = _lookup_recommendations(all_books, catalog.lookup_index(), plan)
+		if lookup is not None:
+			clean = _validate_payload(lookup, by_id, last_user_text, plan.count)
+			if debug:
+				clean["debug"] = {
+					"candidate_pass": "lookup",
+					"lookup": lookup["lookup"],
+					"plan": plan.as_log(),
+					"build": ATLAS_CHAT_BUILD
+				}
+			return _json_response(clean, status=200)
+
+		if not api_key:
+			out = {"error": "missing_openai_api_key", "build": ATLAS_CHAT_BUILD}
+			if debug:
+				out["debug"] = {"build": ATLAS_CHAT_BUILD}
+			return _json_response(out, status=500)
+
 		tier1, tier2, tier_stats = _build_tiered_candidates(
-			all_books, last_user_text, selected_iso2, available_countries
+			all_books, last_user_text, selected_iso2, available_countries, catalog.search_index(), plan
 		)
 
 		def _call_recommender(detail: List[Dict[str, Any]], index: List[Dict[str, Any]]) -> Dict[str, Any]:
@@ -994,12 +2755,12 @@ def atlasChat(req: https_fn.Request) -> https_fn.Response:
 			)
 
 		parsed = _call_recommender(tier1, tier2)
-		clean = _validate_payload(parsed or {}, by_id, last_user_text)
+		clean = _validate_payload(parsed or {}, by_id, last_user_text, plan.count)
 		candidate_pass = "tiered"
 
 		if _should_retry_full_catalog(parsed or {}, clean, tier_stats):
 			parsed_full = _call_recommender(all_books, [])
-			clean_full = _validate_payload(parsed_full or {}, by_id, last_user_text)
+			clean_full = _validate_payload(parsed_full or {}, by_id, last_user_text, plan.count)
 			candidate_pass = "full_catalog" if not parsed else "full_catalog_retry"
 			clean = clean_full
 
@@ -1009,6 +2770,10 @@ def atlasChat(req: https_fn.Request) -> https_fn.Response:
 				"tier2": tier_stats.get("tier2"),
 				"catalog_total": tier_stats.get("total"),
 				"candidate_pass": candidate_pass,
+				"ranker": ATLAS_CHAT_RANKER,
+				"engine": "numpy" if _numpy_engine_enabled() else "python",
+				"semantic": tier_stats.get("semantic"),
+				"plan": plan.as_log(),
 				"countries": len(available_countries or []),
 				"selected_iso2": selected_iso2,
 				"model": ATLAS_CHAT_MODEL,
@@ -1035,9 +2800,33 @@ def atlasChat(req: https_fn.Request) -> https_fn.Response:
 				"error": err_text[:1800],
 				"trace": tb[-3000:],
 				"model": ATLAS_CHAT_MODEL,
-				"has_key": True,
+				"has_key": bool(api_key),
 				"selected_iso2": selected_iso2,
 				"build": ATLAS_CHAT_BUILD
 			}
 
 		return _json_response(out, status=200)
+
+
+@https_fn.on_request(**_CONCURRENCY_OPTIONS)
+def atlasWarm(req: https_fn.Request) -> https_fn.Response:
+	cors_methods = "GET, POST, OPTIONS"
+	if req.method == "OPTIONS":
+		return _json_response({"ok": True}, status=204, methods=cors_methods)
+
+	if req.method not in ("GET", "POST"):
+		return _json_response({"error": "method_not_allowed"}, status=405, methods=cors_methods)
+
+	# A boot-time warmup may still be running; wait for it so the report reflects real work.
+	thread = _ATLAS_WARMUP_THREAD
+	booting = thread is not None and thread.is_alive()
+	if booting:
+		thread.join(timeout=ATLAS_WARMUP_WAIT_SEC)
+	previous = dict(_ATLAS_WARMUP_REPORT)
+	report = _warm_atlas_instance()
+	report["warm_start"] = bool(previous.get("ok")) and not booting
+	if previous:
+		report["previous_ms"] = previous.get("ms")
+	resp = _json_response(report, status=200 if report["ok"] else 503, methods=cors_methods)
+	resp.headers["Cache-Control"] = "no-store"
+	return resp
@@ -0,0 +1,460 @@
+"""Country-string resolution shared by the catalog index and the maintenance scripts.
+
+Every ISO 3166 country is compiled at import into one alias table (ISO2/ISO3 codes,
+short, official and common names, demonyms and older spellings seen in the catalog),
+so resolving a place field is a dict lookup behind an LRU cache. pycountry is only
+consulted for strings the table has never seen.
+"""
+
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from atlas_text import fold_text
+
+_pycountry = None
+_pycountry_loaded = False
+
+
+def _get_pycountry():
+	global _pycountry, _pycountry_loaded
+	if not _pycountry_loaded:
+		_pycountry_loaded = True
+		try:
+			import pycountry  # optional; fallback for strings outside the alias table
+			_pycountry = pycountry
+		except Exception:
+			_pycountry = None
+	return _pycountry
+
+
+# (alpha_2, alpha_3, name, official_name, common_name), generated from pycountry's ISO 3166-1 data.
+# name is what _iso2_to_country_name has always returned, so keep it verbatim.
+_ISO3166: Tuple[Tuple[str, str, str, str, str], ...] = (
+	("AD", "AND", "Andorra", "Principality of Andorra", ""),
+	("AE", "ARE", "United Arab Emirates", "", ""),
+	("AF", "AFG", "Afghanistan", "Islamic Republic of Afghanistan", ""),
+	("AG", "ATG", "Antigua and Barbuda", "", ""),
+	("AI", "AIA", "Anguilla", "", ""),
+	("AL", "ALB", "Albania", "Republic of Albania", ""),
+	("AM", "ARM", "Armenia", "Republic of Armenia", ""),
+	("AO", "AGO", "Angola", "Republic of Angola", ""),
+	("AQ", "ATA", "Antarctica", "", ""),
+	("AR", "ARG", "Argentina", "Argentine Republic", ""),
+	("AS", "ASM", "American Samoa", "", ""),
+	("AT", "AUT", "Austria", "Republic of Austria", ""),
+	("AU", "AUS", "Australia", "", ""),
+	("AW", "ABW", "Aruba", "", ""),
+	("AX", "ALA", "Åland Islands", "", ""),
+	("AZ", "AZE", "Azerbaijan", "Republic of Azerbaijan", ""),
+	("BA", "BIH", "Bosnia and Herzegovina", "Republic of Bosnia and Herzegovina", ""),
+	("BB", "BRB", "Barbados", "", ""),
+	("BD", "BGD", "Bangladesh", "People's Republic of Bangladesh", ""),
+	("BE", "BEL", "Belgium", "Kingdom of Belgium", ""),
+	("BF", "BFA", "Burkina Faso", "", ""),
+	("BG", "BGR", "Bulgaria", "Republic of Bulgaria", ""),
+	("BH", "BHR", "Bahrain", "Kingdom of Bahrain", ""),
+	("BI", "BDI", "Burundi", "Republic of Burundi", ""),
+	("BJ", "BEN", "Benin", "Republic of Benin", ""),
+	("BL", "BLM", "Saint Barthélemy", "", ""),
+	("BM", "BMU", "Bermuda", "", ""),
+	("BN", "BRN", "Brunei Darussalam", "", ""),
+	("BO", "BOL", "Bolivia, Plurinational State of", "Plurinational State of Bolivia", "Bolivia"),
+	("BQ", "BES", "Bonaire, Sint Eustatius and Saba", "Bonaire, Sint Eustatius and Saba", ""),
+	("BR", "BRA", "Brazil", "Federative Republic of Brazil", ""),
+	("BS", "BHS", "Bahamas", "Commonwealth of the Bahamas", ""),
+	("BT", "BTN", "Bhutan", "Kingdom of Bhutan", ""),
+	("BV", "BVT", "Bouvet Island", "", ""),
+	("BW", "BWA", "Botswana", "Republic of Botswana", ""),
+	("BY", "BLR", "Belarus", "Republic of Belarus", ""),
+	("BZ", "BLZ", "Belize", "", ""),
+	("CA", "CAN", "Canada", "", ""),
+	("CC", "CCK", "Cocos (Keeling) Islands", "", ""),
+	("CD", "COD", "Congo, The Democratic Republic of the", "", ""),
+	("CF", "CAF", "Central African Republic", "", ""),
+	("CG", "COG", "Congo", "Republic of the Congo", ""),
+	("CH", "CHE", "Switzerland", "Swiss Confederation", ""),
+	("CI", "CIV", "Côte d'Ivoire", "Republic of Côte d'Ivoire", ""),
+	("CK", "COK", "Cook Islands", "", ""),
+	("CL", "CHL", "Chile", "Republic of Chile", ""),
+	("CM", "CMR", "Cameroon", "Republic of Cameroon", ""),
+	("CN", "CHN", "China", "People's Republic of China", ""),
+	("CO", "COL", "Colombia", "Republic of Colombia", ""),
+	("CR", "CRI", "Costa Rica", "Republic of Costa Rica", ""),
+	("CU", "CUB", "Cuba", "Republic of Cuba", ""),
+	("CV", "CPV", "Cabo Verde", "Republic of Cabo Verde", ""),
+	("CW", "CUW", "Curaçao", "Curaçao", ""),
+	("CX", "CXR", "Christmas Island", "", ""),
+	("CY", "CYP", "Cyprus", "Republic of Cyprus", ""),
+	("CZ", "CZE", "Czechia", "Czech Republic", ""),
+	("DE", "DEU", "Germany", "Federal Republic of Germany", ""),
+	("DJ", "DJI", "Djibouti", "Republic of Djibouti", ""),
+	("DK", "DNK", "Denmark", "Kingdom of Denmark", ""),
+	("DM", "DMA", "Dominica", "Commonwealth of Dominica", ""),
+	("DO", "DOM", "Dominican Republic", "", ""),
+	("DZ", "DZA", "Algeria", "People's Democratic Republic of Algeria", ""),
+	("EC", "ECU", "Ecuador", "Republic of Ecuador", ""),
+	("EE", "EST", "Estonia", "Republic of Estonia", ""),
+	("EG", "EGY", "Egypt", "Arab Republic of Egypt", ""),
+	("EH", "ESH", "Western Sahara", "", ""),
+	("ER", "ERI", "Eritrea", "the State of Eritrea", ""),
+	("ES", "ESP", "Spain", "Kingdom of Spain", ""),
+	("ET", "ETH", "Ethiopia", "Federal Democratic Republic of Ethiopia", ""),
+	("FI", "FIN", "Finland", "Republic of Finland", ""),
+	("FJ", "FJI", "Fiji", "Republic of Fiji", ""),
+	("FK", "FLK", "Falkland Islands (Malvinas)", "", ""),
+	("FM", "FSM", "Micronesia, Federated States of", "Federated States of Micronesia", ""),
+	("FO", "FRO", "Faroe Islands", "", ""),
+	("FR", "FRA", "France", "French Republic", ""),
+	("GA", "GAB", "Gabon", "Gabonese Republic", ""),
+	("GB", "GBR", "United Kingdom", "United Kingdom of Great Britain and Northern Ireland", ""),
+	("GD", "GRD", "Grenada", "", ""),
+	("GE", "GEO", "Georgia", "", ""),
+	("GF", "GUF", "French Guiana", "", ""),
+	("GG", "GGY", "Guernsey", "", ""),
+	("GH", "GHA", "Ghana", "Republic of Ghana", ""),
+	("GI", "GIB", "Gibraltar", "", ""),
+	("GL", "GRL", "Greenland", "", ""),
+	("GM", "GMB", "Gambia", "Republic of the Gambia", ""),
+	("GN", "GIN", "Guinea", "Republic of Guinea", ""),
+	("GP", "GLP", "Guadeloupe", "", ""),
+	("GQ", "GNQ", "Equatorial Guinea", "Republic of Equatorial Guinea", ""),
+	("GR", "GRC", "Greece", "Hellenic Republic", ""),
+	("GS", "SGS", "South Georgia and the South Sandwich Islands", "", ""),
+	("GT", "GTM", "Guatemala", "Republic of Guatemala", ""),
+	("GU", "GUM", "Guam", "", ""),
+	("GW", "GNB", "Guinea-Bissau", "Republic of Guinea-Bissau", ""),
+	("GY", "GUY", "Guyana", "Republic of Guyana", ""),
+	("HK", "HKG", "Hong Kong", "Hong Kong Special Administrative Region of China", ""),
+	("HM", "HMD", "Heard Island and McDonald Islands", "", ""),
+	("HN", "HND", "Honduras", "Republic of Honduras", ""),
+	("HR", "HRV", "Croatia", "Republic of Croatia", ""),
+	("HT", "HTI", "Haiti", "Republic of Haiti", ""),
+	("HU", "HUN", "Hungary", "Hungary", ""),
+	("ID", "IDN", "Indonesia", "Republic of Indonesia", ""),
+	("IE", "IRL", "Ireland", "", ""),
+	("IL", "ISR", "Israel", "State of Israel", ""),
+	("IM", "IMN", "Isle of Man", "", ""),
+	("IN", "IND", "India", "Republic of India", ""),
+	("IO", "IOT", "British Indian Ocean Territory", "", ""),
+	("IQ", "IRQ", "Iraq", "Republic of Iraq", ""),
+	("IR", "IRN", "Iran, Islamic Republic of", "Islamic Republic of Iran", "Iran"),
+	("IS", "ISL", "Iceland", "Republic of Iceland", ""),
+	("IT", "ITA", "Italy", "Italian Republic", ""),
+	("JE", "JEY", "Jersey", "", ""),
+	("JM", "JAM", "Jamaica", "", ""),
+	("JO", "JOR", "Jordan", "Hashemite Kingdom of Jordan", ""),
+	("JP", "JPN", "Japan", "", ""),
+	("KE", "KEN", "Kenya", "Republic of Kenya", ""),
+	("KG", "KGZ", "Kyrgyzstan", "Kyrgyz Republic", ""),
+	("KH", "KHM", "Cambodia", "Kingdom of Cambodia", ""),
+	("KI", "KIR", "Kiribati", "Republic of Kiribati", ""),
+	("KM", "COM", "Comoros", "Union of the Comoros", ""),
+	("KN", "KNA", "Saint Kitts and Nevis", "", ""),
+	("KP", "PRK", "Korea, Democratic People's Republic of", "Democratic People's Republic of Korea", "North Korea"),
+	("KR", "KOR", "Korea, Republic of", "", "South Korea"),
+	("KW", "KWT", "Kuwait", "State of Kuwait", ""),
+	("KY", "CYM", "Cayman Islands", "", ""),
+	("KZ", "KAZ", "Kazakhstan", "Republic of Kazakhstan", ""),
+	("LA", "LAO", "Lao People's Democratic Republic", "", "Laos"),
+	("LB", "LBN", "Lebanon", "Lebanese Republic", ""),
+	("LC", "LCA", "Saint Lucia", "", ""),
+	("LI", "LIE", "Liechtenstein", "Principality of Liechtenstein", ""),
+	("LK", "LKA", "Sri Lanka", "Democratic Socialist Republic of Sri Lanka", ""),
+	("LR", "LBR", "Liberia", "Republic of Liberia", ""),
+	("LS", "LSO", "Lesotho", "Kingdom of Lesotho", ""),
+	("LT", "LTU", "Lithuania", "Republic of Lithuania", ""),
+	("LU", "LUX", "Luxembourg", "Grand Duchy of Luxembourg", ""),
+	("LV", "LVA", "Latvia", "Republic of Latvia", ""),
+	("LY", "LBY", "Libya", "Libya", ""),
+	("MA", "MAR", "Morocco", "Kingdom of Morocco", ""),
+	("MC", "MCO", "Monaco", "Principality of Monaco", ""),
+	("MD", "MDA", "Moldova, Republic of", "Republic of Moldova", "Moldova"),
+	("ME", "MNE", "Montenegro", "Montenegro", ""),
+	("MF", "MAF", "Saint Martin (French part)", "", ""),
+	("MG", "MDG", "Madagascar", "Republic of Madagascar", ""),
+	("MH", "MHL", "Marshall Islands", "Republic of the Marshall Islands", ""),
+	("MK", "MKD", "North Macedonia", "Republic of North Macedonia", ""),
+	("ML", "MLI", "Mali", "Republic of Mali", ""),
+	("MM", "MMR", "Myanmar", "Republic of Myanmar", ""),
+	("MN", "MNG", "Mongolia", "", ""),
+	("MO", "MAC", "Macao", "Macao Special Administrative Region of China", ""),
+	("MP", "MNP", "Northern Mariana Islands", "Commonwealth of the Northern Mariana Islands", ""),
+	("MQ", "MTQ", "Martinique", "", ""),
+	("MR", "MRT", "Mauritania", "Islamic Republic of Mauritania", ""),
+	("MS", "MSR", "Montserrat", "", ""),
+	("MT", "MLT", "Malta", "Republic of Malta", ""),
+	("MU", "MUS", "Mauritius", "Republic of Mauritius", ""),
+	("MV", "MDV", "Maldives", "Republic of Maldives", ""),
+	("MW", "MWI", "Malawi", "Republic of Malawi", ""),
+	("MX", "MEX", "Mexico", "United Mexican States", ""),
+	("MY", "MYS", "Malaysia", "", ""),
+	("MZ", "MOZ", "Mozambique", "Republic of Mozambique", ""),
+	("NA", "NAM", "Namibia", "Republic of Namibia", ""),
+	("NC", "NCL", "New Caledonia", "", ""),
+	("NE", "NER", "Niger", "Republic of the Niger", ""),
+	("NF", "NFK", "Norfolk Island", "", ""),
+	("NG", "NGA", "Nigeria", "Federal Republic of Nigeria", ""),
+	("NI", "NIC", "Nicaragua", "Republic of Nicaragua", ""),
+	("NL", "NLD", "Netherlands", "Kingdom of the Netherlands", ""),
+	("NO", "NOR", "Norway", "Kingdom of Norway", ""),
+	("NP", "NPL", "Nepal", "Federal Democratic Republic of Nepal", ""),
+	("NR", "NRU", "Nauru", "Republic of Nauru", ""),
+	("NU", "NIU", "Niue", "Niue", ""),
+	("NZ", "NZL", "New Zealand", "", ""),
+	("OM", "OMN", "Oman", "Sultanate of Oman", ""),
+	("PA", "PAN", "Panama", "Republic of Panama", ""),
+	("PE", "PER", "Peru", "Republic of Peru", ""),
+	("PF", "PYF", "French Polynesia", "", ""),
+	("PG", "PNG", "Papua New Guinea", "Independent State of Papua New Guinea", ""),
+	("PH", "PHL", "Philippines", "Republic of the Philippines", ""),
+	("PK", "PAK", "Pakistan", "Islamic Republic of Pakistan", ""),
+	("PL", "POL", "Poland", "Republic of Poland", ""),
+	("PM", "SPM", "Saint Pierre and Miquelon", "", ""),
+	("PN", "PCN", "Pitcairn", "", ""),
+	("PR", "PRI", "Puerto Rico", "", ""),
+	("PS", "PSE", "Palestine, State of", "the State of Palestine", ""),
+	("PT", "PRT", "Portugal", "Portuguese Republic", ""),
+	("PW", "PLW", "Palau", "Republic of Palau", ""),
+	("PY", "PRY", "Paraguay", "Republic of Paraguay", ""),
+	("QA", "QAT", "Qatar", "State of Qatar", ""),
+	("RE", "REU", "Réunion", "", ""),
+	("RO", "ROU", "Romania", "", ""),
+	("RS", "SRB", "Serbia", "Republic of Serbia", ""),
+	("RU", "RUS", "Russian Federation", "", ""),
+	("RW", "RWA", "Rwanda", "Rwandese Republic", ""),
+	("SA", "SAU", "Saudi Arabia", "Kingdom of Saudi Arabia", ""),
+	("SB", "SLB", "Solomon Islands", "", ""),
+	("SC", "SYC", "Seychelles", "Republic of Seychelles", ""),
+	("SD", "SDN", "Sudan", "Republic of the Sudan", ""),
+	("SE", "SWE", "Sweden", "Kingdom of Sweden", ""),
+	("SG", "SGP", "Singapore", "Republic of Singapore", ""),
+	("SH", "SHN", "Saint Helena, Ascension and Tristan da Cunha", "", ""),
+	("SI", "SVN", "Slovenia", "Republic of Slovenia", ""),
+	("SJ", "SJM", "Svalbard and Jan Mayen", "", ""),
+	("SK", "SVK", "Slovakia", "Slovak Republic", ""),
+	("SL", "SLE", "Sierra Leone", "Republic of Sierra Leone", ""),
+	("SM", "SMR", "San Marino", "Republic of San Marino", ""),
+	("SN", "SEN", "Senegal", "Republic of Senegal", ""),
+	("SO", "SOM", "Somalia", "Federal Republic of Somalia", ""),
+	("SR", "SUR", "Suriname", "Republic of Suriname", ""),
+	("SS", "SSD", "South Sudan", "Republic of South Sudan", ""),
+	("ST", "STP", "Sao Tome and Principe", "Democratic Republic of Sao Tome and Principe", ""),
+	("SV", "SLV", "El Salvador", "Republic of El Salvador", ""),
+	("SX", "SXM", "Sint Maarten (Dutch part)", "Sint Maarten (Dutch part)", ""),
+	("SY", "SYR", "Syrian Arab Republic", "", "Syria"),
+	("SZ", "SWZ", "Eswatini", "Kingdom of Eswatini", ""),
+	("TC", "TCA", "Turks and Caicos Islands", "", ""),
+	("TD", "TCD", "Chad", "Republic of Chad", ""),
+	("TF", "ATF", "French Southern Territories", "", ""),
+	("TG", "TGO", "Togo", "Togolese Republic", ""),
+	("TH", "THA", "Thailand", "Kingdom of Thailand", ""),
+	("TJ", "TJK", "Tajikistan", "Republic of Tajikistan", ""),
+	("TK", "TKL", "Tokelau", "", ""),
+	("TL", "TLS", "Timor-Leste", "Democratic Republic of Timor-Leste", ""),
+	("TM", "TKM", "Turkmenistan", "", ""),
+	("TN", "TUN", "Tunisia", "Republic of Tunisia", ""),
+	("TO", "TON", "Tonga", "Kingdom of Tonga", ""),
+	("TR", "TUR", "Türkiye", "Republic of Türkiye", ""),
+	("TT", "TTO", "Trinidad and Tobago", "Republic of Trinidad and Tobago", ""),
+	("TV", "TUV", "Tuvalu", "", ""),
+	("TW", "TWN", "Taiwan, Province of China", "Taiwan, Province of China", "Taiwan"),
+	("TZ", "TZA", "Tanzania, United Republic of", "United Republic of Tanzania", "Tanzania"),
+	("UA", "UKR", "Ukraine", "", ""),
+	("UG", "UGA", "Uganda", "Republic of Uganda", ""),
+	("UM", "UMI", "United States Minor Outlying Islands", "", ""),
+	("US", "USA", "United States", "United States of America", ""),
+	("UY", "URY", "Uruguay", "Eastern Republic of Uruguay", ""),
+	("UZ", "UZB", "Uzbekistan", "Republic of Uzbekistan", ""),
+	("VA", "VAT", "Holy See (Vatican City State)", "", ""),
+	("VC", "VCT", "Saint Vincent and the Grenadines", "", ""),
+	("VE", "VEN", "Venezuela, Bolivarian Republic of", "Bolivarian Republic of Venezuela", "Venezuela"),
+	("VG", "VGB", "Virgin Islands, British", "British Virgin Islands", ""),
+	("VI", "VIR", "Virgin Islands, U.S.", "Virgin Islands of the United States", ""),
+	("VN", "VNM", "Viet Nam", "Socialist Republic of Viet Nam", "Vietnam"),
+	("VU", "VUT", "Vanuatu", "Republic of Vanuatu", ""),
+	("WF", "WLF", "Wallis and Futuna", "", ""),
+	("WS", "WSM", "Samoa", "Independent State of Samoa", ""),
+	("YE", "YEM", "Yemen", "Republic of Yemen", ""),
+	("YT", "MYT", "Mayotte", "", ""),
+	("ZA", "ZAF", "South Africa", "Republic of South Africa", ""),
+	("ZM", "ZMB", "Zambia", "Republic of Zambia", ""),
+	("ZW", "ZWE", "Zimbabwe", "Republic of Zimbabwe", ""),
+)
+
+# Everyday names, demonyms and historical spellings -> ISO2. Ambiguous demonyms
+# (Congolese, Guinean, Korean, ...) are left out on purpose.
+_EXTRA_ALIASES: Dict[str, str] = {
+	# Common names and abbreviations
+	"america": "US", "usa": "US", "u s": "US", "u s a": "US", "united states of america": "US",
+	"uk": "GB", "u k": "GB", "britain": "GB", "great britain": "GB", "england": "GB",
+	"scotland": "GB", "wales": "GB", "northern ireland": "GB",
+	"russia": "RU", "south korea": "KR", "north korea": "KP", "laos": "LA", "syria": "SY",
+	"iran": "IR", "vietnam": "VN", "bolivia": "BO", "venezuela": "VE", "tanzania": "TZ",
+	"moldova": "MD", "taiwan": "TW", "palestine": "PS", "vatican": "VA", "vatican city": "VA",
+	"czech republic": "CZ", "czechia": "CZ", "turkey": "TR", "turkiye": "TR",
+	"ivory coast": "CI", "cote d ivoire": "CI", "cape verde": "CV", "east timor": "TL",
+	"macedonia": "MK", "north macedonia": "MK", "brunei": "BN", "micronesia": "FM",
+	"democratic republic of the congo": "CD", "dr congo": "CD", "drc": "CD", "congo kinshasa": "CD",
+	"republic of the congo": "CG", "congo brazzaville": "CG", "the netherlands": "NL",
+	"holland": "NL", "the gambia": "GM", "the bahamas": "BS", "hong kong": "HK", "macau": "MO",
+	"eswatini": "SZ", "st lucia": "LC", "st kitts and nevis": "KN",
+	"st vincent and the grenadines": "VC", "trinidad": "TT", "tobago": "TT", "kosovo": "XK",
+	"puerto rico": "PR", "greenland": "GL",
+	# Historical spellings
+	"burma": "MM", "persia": "IR", "siam": "TH", "ceylon": "LK", "zaire": "CD",
+	"rhodesia": "ZW", "swaziland": "SZ", "formosa": "TW", "dahomey": "BJ", "upper volta": "BF",
+	"kampuchea": "KH", "gold coast": "GH", "abyssinia": "ET", "bohemia": "CZ",
+	"ussr": "RU", "soviet union": "RU", "yugoslavia": "RS", "czechoslovakia": "CZ",
+	"east germany": "DE", "west germany": "DE", "prussia": "DE", "bechuanaland": "BW",
+	"basutoland": "LS", "nyasaland": "MW", "tanganyika": "TZ", "east pakistan": "BD",
+	"british honduras": "BZ", "dutch guiana": "SR", "british guiana": "GY",
+	"new hebrides": "VU", "western samoa": "WS", "ottoman empire": "TR",
+	# Demonyms
+	"afghan": "AF", "albanian": "AL", "algerian": "DZ", "american": "US", "angolan": "AO",
+	"argentine": "AR", "argentinian": "AR", "armenian": "AM", "australian": "AU",
+	"austrian": "AT", "azerbaijani": "AZ", "bahamian": "BS", "bangladeshi": "BD",
+	"barbadian": "BB", "belarusian": "BY", "belgian": "BE", "belizean": "BZ", "beninese": "BJ",
+	"bolivian": "BO", "bosnian": "BA", "botswanan": "BW", "brazilian": "BR", "british": "GB",
+	"english": "GB", "scottish": "GB", "welsh": "GB", "bulgarian": "BG", "burkinabe": "BF",
+	"burmese": "MM", "burundian": "BI", "cambodian": "KH", "cameroonian": "CM",
+	"canadian": "CA", "chadian": "TD", "chilean": "CL", "chinese": "CN", "colombian": "CO",
+	"costa rican": "CR", "croatian": "HR", "cuban": "CU", "cypriot": "CY", "czech": "CZ",
+	"danish": "DK", "dutch": "NL", "ecuadorian": "EC", "egyptian": "EG", "salvadoran": "SV",
+	"eritrean": "ER", "estonian": "EE", "ethiopian": "ET", "fijian": "FJ", "filipino": "PH",
+	"finnish": "FI", "french": "FR", "gabonese": "GA", "gambian": "GM", "georgian": "GE",
+	"german": "DE", "ghanaian": "GH", "greek": "GR", "guatemalan": "GT", "guyanese": "GY",
+	"haitian": "HT", "honduran": "HN", "hungarian": "HU", "icelandic": "IS", "indian": "IN",
+	"indonesian": "ID", "iranian": "IR", "iraqi": "IQ", "irish": "IE", "israeli": "IL",
+	"italian": "IT", "ivorian": "CI", "jamaican": "JM", "japanese": "JP", "jordanian": "JO",
+	"kazakh": "KZ", "kazakhstani": "KZ", "kenyan": "KE", "kuwaiti": "KW", "kyrgyz": "KG",
+	"lao": "LA", "laotian": "LA", "latvian": "LV", "lebanese": "LB", "liberian": "LR",
+	"libyan": "LY", "lithuanian": "LT", "luxembourgish": "LU", "malagasy": "MG",
+	"malawian": "MW", "malaysian": "MY", "maldivian": "MV", "malian": "ML", "maltese": "MT",
+	"mauritanian": "MR", "mauritian": "MU", "mexican": "MX", "moldovan": "MD",
+	"mongolian": "MN", "montenegrin": "ME", "moroccan": "MA", "mozambican": "MZ",
+	"namibian": "NA", "nepalese": "NP", "nepali": "NP", "new zealander": "NZ",
+	"nicaraguan": "NI", "nigerien": "NE", "nigerian": "NG", "norwegian": "NO", "omani": "OM",
+	"pakistani": "PK", "palestinian": "PS", "panamanian": "PA", "paraguayan": "PY",
+	"persian": "IR", "peruvian": "PE", "polish": "PL", "portuguese": "PT",
+	"puerto rican": "PR", "qatari": "QA", "romanian": "RO", "russian": "RU", "rwandan": "RW",
+	"samoan": "WS", "saudi": "SA", "saudi arabian": "SA", "senegalese": "SN", "serbian": "RS",
+	"sierra leonean": "SL", "singaporean": "SG", "slovak": "SK", "slovenian": "SI",
+	"somali": "SO", "south african": "ZA", "south korean": "KR", "south sudanese": "SS",
+	"spanish": "ES", "sri lankan": "LK", "sudanese": "SD", "surinamese": "SR",
+	"swedish": "SE", "swiss": "CH", "syrian": "SY", "taiwanese": "TW", "tajik": "TJ",
+	"tanzanian": "TZ", "thai": "TH", "togolese": "TG", "tongan": "TO", "trinidadian": "TT",
+	"tunisian": "TN", "turkish": "TR", "turkmen": "TM", "ugandan": "UG", "ukrainian": "UA",
+	"emirati": "AE", "uruguayan": "UY", "uzbek": "UZ", "venezuelan": "VE",
+	"vietnamese": "VN", "yemeni": "YE", "zambian": "ZM", "zimbabwean": "ZW",
+}
+
+
+def alias_key(text: Any) -> str:
+	"""Fold a country string to the form used as an alias-table key."""
+	return fold_text(text)
+
+
+def _compile_aliases() -> Tuple[Dict[str, str], Dict[str, str]]:
+	aliases: Dict[str, str] = {}
+	names: Dict[str, str] = {}
+	for iso2, iso3, name, official, common in _ISO3166:
+		names[iso2] = name
+		for val in (iso3, name, official, common):
+			key = alias_key(val)
+			if key:
+				aliases.setdefault(key, iso2)
+	for key, iso2 in _EXTRA_ALIASES.items():
+		aliases.setdefault(alias_key(key), iso2)
+	return aliases, names
+
+
+_ALIASES, _NAMES = _compile_aliases()
+
+
+def country_aliases() -> Dict[str, str]:
+	"""Folded alias -> ISO2 for every name, code, demonym and spelling the resolver knows."""
+	return dict(_ALIASES)
+
+
+def _pycountry_iso2(raw: str) -> Optional[str]:
+	pycountry = _get_pycountry()
+	if pycountry is None:
+		return None
+	try:
+		c = pycountry.countries.lookup(raw)
+		if c and getattr(c, "alpha_2", None):
+			return str(c.alpha_2).upper()
+	except Exception:
+		pass
+	return None
+
+
+@lru_cache(maxsize=4096)
+def _resolve(raw: str) -> Optional[str]:
+	t = raw.replace("_", " ").replace("-", " ").strip()
+	if len(t) == 2 and t.isalpha():
+		return t.upper()
+
+	hit = _ALIASES.get(alias_key(t))
+	if hit:
+		return hit
+
+	return _pycountry_iso2(raw)
+
+
+def country_string_to_iso2(val: Any) -> Optional[str]:
+	if val is None:
+		return None
+	try:
+		raw = str(val).strip()
+	except Exception:
+		return None
+	if not raw:
+		return None
+	return _resolve(raw)
+
+
+def extract_iso2_candidates(val: Any) -> List[str]:
+	out: List[str] = []
+
+	def _add(x: Any):
+		iso2 = country_string_to_iso2(x)
+		if iso2:
+			out.append(iso2)
+
+	if isinstance(val, dict):
+		for key in ("iso2", "code", "country", "value", "name"):
+			if key in val:
+				_add(val.get(key))
+		for v in val.values():
+			if isinstance(v, str):
+				_add(v)
+			elif isinstance(v, (list, tuple)):
+				for vv in v:
+					_add(vv)
+	elif isinstance(val, (list, tuple)):
+		for item in val:
+			_add(item)
+	elif isinstance(val, str):
+		raw = [p.strip() for p in re.split(r"[,;|/]", val) if p.strip()]
+		for item in raw:
+			_add(item)
+	else:
+		_add(val)
+
+	seen = set()
+	uniq: List[str] = []
+	for x in out:
+		if x in seen:
+			continue
+		seen.add(x)
+		uniq.append(x)
+	return uniq
+
+
+def iso2_to_country_name(iso2: str) -> str:
+	code = str(iso2 or "").strip().upper()
+	if not (len(code) == 2 and code.isalpha()):
+		return ""
+	return _NAMES.get(code) or code
@@ -0,0 +1,204 @@
+"""Geo mentions in chat queries: countries, demonyms and regions resolved in one pass.
+
+The UN M49 hierarchy (regions and subregions) plus common informal groupings ("Maghreb",
+"Middle East", "Scandinavia") are compiled with every country alias from atlas_countries into
+one phrase table, on first use. A GeoMatcher compiles that table into a PhraseAutomaton narrowed to
+the countries a catalog snapshot actually has, so detection costs one pass over the query's tokens
+however many countries or regions exist.
+"""
+
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+
+from atlas_countries import country_aliases
+from atlas_search import PhraseAutomaton
+from atlas_text import fold_text
+
+# UN M49 subregions (intermediate regions for Africa and the Americas) -> ISO2 members.
+# TW and XK are not listed by M49; they sit with their geographic neighbours.
+M49_SUBREGIONS: Dict[str, FrozenSet[str]] = {
+	"Northern Africa": frozenset({"DZ", "EG", "LY", "MA", "SD", "TN", "EH"}),
+	"Eastern Africa": frozenset({
+		"IO", "BI", "KM", "DJ", "ER", "ET", "TF", "KE", "MG", "MW", "MU", "YT", "MZ", "RE", "RW",
+		"SC", "SO", "SS", "UG", "TZ", "ZM", "ZW",
+	}),
+	"Middle Africa": frozenset({"AO", "CM", "CF", "TD", "CG", "CD", "GQ", "GA", "ST"}),
+	"Southern Africa": frozenset({"BW", "SZ", "LS", "NA", "ZA"}),
+	"Western Africa": frozenset({
+		"BJ", "BF", "CV", "CI", "GM", "GH", "GN", "GW", "LR", "ML", "MR", "NE", "NG", "SH", "SN",
+		"SL", "TG",
+	}),
+	"Caribbean": frozenset({
+		"AI", "AG", "AW", "BS", "BB", "BQ", "VG", "KY", "CU", "CW", "DM", "DO", "GD", "GP", "HT",
+		"JM", "MQ", "MS", "PR", "BL", "KN", "LC", "MF", "VC", "SX", "TT", "TC", "VI",
+	}),
+	"Central America": frozenset({"BZ", "CR", "SV", "GT", "HN", "MX", "NI", "PA"}),
+	"South America": frozenset({
+		"AR", "BO", "BV", "BR", "CL", "CO", "EC", "FK", "GF", "GY", "PY", "PE", "GS", "SR", "UY", "VE",
+	}),
+	"Northern America": frozenset({"BM", "CA", "GL", "PM", "US"}),
+	"Central Asia": frozenset({"KZ", "KG", "TJ", "TM", "UZ"}),
+	"Eastern Asia": frozenset({"CN", "HK", "MO", "KP", "JP", "MN", "KR", "TW"}),
+	"South-eastern Asia": frozenset({"BN", "KH", "ID", "LA", "MY", "MM", "PH", "SG", "TH", "TL", "VN"}),
+	"Southern Asia": frozenset({"AF", "BD", "BT", "IN", "IR", "MV", "NP", "PK", "LK"}),
+	"Western Asia": frozenset({
+		"AM", "AZ", "BH", "CY", "GE", "IQ", "IL", "JO", "KW", "LB", "OM", "QA", "SA", "PS", "SY",
+		"TR", "AE", "YE",
+	}),
+	"Eastern Europe": frozenset({"BY", "BG", "CZ", "HU", "PL", "MD", "RO", "RU", "SK", "UA"}),
+	"Northern Europe": frozenset({
+		"AX", "DK", "EE", "FO", "FI", "GG", "IS", "IE", "IM", "JE", "LV", "LT", "NO", "SJ", "SE", "GB",
+	}),
+	"Southern Europe": frozenset({
+		"AL", "AD", "BA", "HR", "GI", "GR", "VA", "IT", "MT", "ME", "MK", "PT", "SM", "RS", "SI", "ES", "XK",
+	}),
+	"Western Europe": frozenset({"AT", "BE", "FR", "DE", "LI", "LU", "MC", "NL", "CH"}),
+	"Australia and New Zealand": frozenset({"AU", "CX", "CC", "HM", "NZ", "NF"}),
+	"Melanesia": frozenset({"FJ", "NC", "PG", "SB", "VU"}),
+	"Micronesia": frozenset({"GU", "KI", "MH", "FM", "NR", "MP", "PW", "UM"}),
+	"Polynesia": frozenset({"AS", "CK", "PF", "NU", "PN", "WS", "TK", "TO", "TV", "WF"}),
+}
+
+# Parent -> children in the M49 tree (plus "Sub-Saharan Africa" and "Latin America and the Caribbean").
+M49_HIERARCHY: Dict[str, Tuple[str, ...]] = {
+	"Africa": ("Northern Africa", "Sub-Saharan Africa"),
+	"Sub-Saharan Africa": ("Eastern Africa", "Middle Africa", "Southern Africa", "Western Africa"),
+	"Americas": ("Latin America and the Caribbean", "Northern America"),
+	"Latin America and the Caribbean": ("Caribbean", "Central America", "South America"),
+	"Asia": ("Central Asia", "Eastern Asia", "South-eastern Asia", "Southern Asia", "Western Asia"),
+	"Europe": ("Eastern Europe", "Northern Europe", "Southern Europe", "Western Europe"),
+	"Oceania": ("Australia and New Zealand", "Melanesia", "Micronesia", "Polynesia"),
+}
+
+# Informal groupings people actually type, outside the M49 tree.
+INFORMAL_REGIONS: Dict[str, FrozenSet[str]] = {
+	"Maghreb": frozenset({"DZ", "LY", "MA", "MR", "TN", "EH"}),
+	"Middle East": frozenset({"BH", "CY", "EG", "IR", "IQ", "IL", "JO", "KW", "LB", "OM", "PS", "QA", "SA", "SY", "TR", "AE", "YE"}),
+	"Levant": frozenset({"CY", "IL", "JO", "LB", "PS", "SY"}),
+	"Gulf States": frozenset({"BH", "KW", "OM", "QA", "SA", "AE"}),
+	"Horn of Africa": frozenset({"DJ", "ER", "ET", "SO"}),
+	"Caucasus": frozenset({"AM", "AZ", "GE"}),
+	"Balkans": frozenset({"AL", "BA", "BG", "HR", "GR", "XK", "ME", "MK", "RS", "SI"}),
+	"Baltics": frozenset({"EE", "LV", "LT"}),
+	"Scandinavia": frozenset({"DK", "NO", "SE"}),
+	"Nordic countries": frozenset({"DK", "FI", "IS", "NO", "SE", "FO", "GL", "AX"}),
+	"Iberia": frozenset({"ES", "PT", "AD", "GI"}),
+	"British Isles": frozenset({"GB", "IE", "IM", "JE", "GG"}),
+	"Indian subcontinent": frozenset({"IN", "PK", "BD", "NP", "BT", "LK", "MV"}),
+	"Australasia": frozenset({"AU", "NZ", "PG"}),
+	"Patagonia": frozenset({"AR", "CL"}),
+}
+
+# Extra spellings and adjectives for the regions above ("african" as in "african queer fiction").
+_REGION_ALIASES: Dict[str, str] = {
+	"african": "Africa", "north africa": "Northern Africa", "north african": "Northern Africa",
+	"east africa": "Eastern Africa", "east african": "Eastern Africa",
+	"central africa": "Middle Africa", "central african": "Middle Africa",
+	"west africa": "Western Africa", "west african": "Western Africa",
+	"southern african": "Southern Africa", "sub saharan": "Sub-Saharan Africa", "subsaharan africa": "Sub-Saharan Africa",
+	"the americas": "Americas", "latin america": "Latin America and the Caribbean",
+	"latin american": "Latin America and the Caribbean", "latinx": "Latin America and the Caribbean",
+	"caribbean": "Caribbean", "west indies": "Caribbean", "west indian": "Caribbean", "antilles": "Caribbean",
+	"central american": "Central America", "south american": "South America",
+	"north america": "North America", "north american": "North America",
+	"asian": "Asia", "central asian": "Central Asia",
+	"east asia": "Eastern Asia", "east asian": "Eastern Asia", "far east": "Eastern Asia",
+	"southeast asia": "South-eastern Asia", "south east asia": "South-eastern Asia",
+	"southeast asian": "South-eastern Asia", "south east asian": "South-eastern Asia",
+	"south asia": "Southern Asia", "south asian": "Southern Asia", "desi": "Southern Asia",
+	"west asia": "Western Asia", "european": "Europe", "eastern european": "Eastern Europe",
+	"western european": "Western Europe", "southern european": "Southern Europe",
+	"northern european": "Northern Europe", "pacific islands": "Pacific Islands",
+	"pacific islander": "Pacific Islands", "oceanian": "Oceania",
+	"middle eastern": "Middle East", "mideast": "Middle East", "maghrebi": "Maghreb",
+	"levantine": "Levant", "persian gulf": "Gulf States", "gulf arab": "Gulf States",
+	"balkan": "Balkans", "baltic": "Baltics", "baltic states": "Baltics",
+	"scandinavian": "Scandinavia", "nordic": "Nordic countries", "nordics": "Nordic countries",
+	"iberian": "Iberia", "iberian peninsula": "Iberia", "subcontinent": "Indian subcontinent",
+}
+
+# Demonyms that mostly name a language in a book query ("written in English").
+_QUERY_ALIAS_SKIP = frozenset({"english"})
+
+
+def _region_members() -> Dict[str, FrozenSet[str]]:
+	members: Dict[str, FrozenSet[str]] = dict(M49_SUBREGIONS)
+
+	def resolve(name: str) -> FrozenSet[str]:
+		if name not in members:
+			out: set = set()
+			for child in M49_HIERARCHY[name]:
+				out |= resolve(child)
+			members[name] = frozenset(out)
+		return members[name]
+
+	for name in M49_HIERARCHY:
+		resolve(name)
+	members.update(INFORMAL_REGIONS)
+	members["North America"] = members["Northern America"] | members["Central America"] | members["Caribbean"]
+	members["Pacific Islands"] = members["Melanesia"] | members["Micronesia"] | members["Polynesia"]
+	return members
+
+
+REGIONS: Dict[str, FrozenSet[str]] = _region_members()
+
+
+@lru_cache(maxsize=1)
+def _phrases() -> Dict[Tuple[str, ...], FrozenSet[str]]:
+	phrases: Dict[Tuple[str, ...], FrozenSet[str]] = {}
+
+	def add(text: str, iso2s: FrozenSet[str]) -> None:
+		key = tuple(fold_text(text).split())
+		if key:
+			phrases[key] = phrases.get(key, frozenset()) | iso2s
+
+	for alias, iso2 in country_aliases().items():
+		# Bare ISO codes ("and", "can", "per") are ordinary words in a query.
+		if len(alias) < 4 and alias not in ("uk", "usa", "uae", "drc"):
+			continue
+		if alias not in _QUERY_ALIAS_SKIP:
+			add(alias, frozenset({iso2}))
+	for name, iso2s in REGIONS.items():
+		add(name, iso2s)
+	for alias, name in _REGION_ALIASES.items():
+		add(alias, REGIONS[name])
+	return phrases
+
+
+class GeoMatch(NamedTuple):
+	iso2: FrozenSet[str]
+	terms: FrozenSet[str]
+
+
+class GeoMatcher:
+	"""Every geo phrase, with its members narrowed to one catalog's countries.
+
+	Phrases whose countries are all absent stay in the automaton, so "latin american" is still
+	consumed whole (and never read as "american") in a catalog without Latin American books.
+	"""
+
+	__slots__ = ("available", "_automaton")
+
+	def __init__(self, available: Iterable[str]):
+		self.available = frozenset(str(x).upper() for x in available)
+		self._automaton = PhraseAutomaton({key: members & self.available for key, members in _phrases().items()})
+
+	def match(self, text: str) -> GeoMatch:
+		# terms are the query tokens that named an available place, so callers can drop them
+		# from the theme tokens.
+		tokens = fold_text(text).split()
+		iso2: set = set()
+		terms: set = set()
+		for start, end, members in self._automaton.find(tokens):
+			if members:
+				iso2 |= members
+				terms.update(tokens[start:end])
+		return GeoMatch(frozenset(iso2), frozenset(terms))
+
+
+def region_names() -> List[str]:
+	return sorted(REGIONS)
+
+
+def region_members(name: str) -> Optional[FrozenSet[str]]:
+	return REGIONS.get(name)
@@ -0,0 +1,331 @@
+"""Search structures built once per catalog snapshot and shared by every request pinned to it.
+
+InvertedIndex maps folded terms to posting lists: sorted array("I") of document ordinals, i.e.
+positions in the snapshot's books tuple. Lookups are exact-term by default, so "trans" no longer
+matches "translation"; prefix lookups walk a sorted term list with bisect when a caller opts in.
+
+BM25FIndex adds a parallel array("f") per term holding each document's saturated, field-weighted
+term frequency (BM25F), so a query only multiplies those by the term's idf and sums.
+
+FacetBitmaps keeps one Python-int bitset per facet value (bit i set = document ordinal i has it),
+so multi-facet filters are a handful of bitwise ANDs and ORs over the whole catalog.
+
+TrigramIndex is a fuzzy string lookup (titles, author names): keys share character-trigram
+posting lists and candidates are scored by the Dice coefficient of their trigram sets.
+
+PhraseAutomaton is an Aho-Corasick automaton over token sequences, for matching a fixed
+dictionary of multi-word phrases (place names, regions) against a query in one linear pass.
+"""
+
+import heapq
+import math
+from collections import Counter, deque
+from array import array
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple, Union
+
+_EMPTY = array("I")
+
+
+class InvertedIndex:
+	__slots__ = ("size", "postings", "_sorted_terms")
+
+	def __init__(self, docs: Iterable[Iterable[str]], min_len: int = 1):
+		lists: Dict[str, List[int]] = {}
+		size = 0
+		for ordinal, terms in enumerate(docs):
+			size = ordinal + 1
+			for term in set(terms):
+				if len(term) < min_len:
+					continue
+				hits = lists.get(term)
+				if hits is None:
+					lists[term] = [ordinal]
+				else:
+					hits.append(ordinal)
+		self.size = size
+		self.postings: Dict[str, array] = {term: array("I", hits) for term, hits in lists.items()}
+		self._sorted_terms: Optional[List[str]] = None
+
+	def __len__(self) -> int:
+		return len(self.postings)
+
+	def __contains__(self, term: str) -> bool:
+		return term in self.postings
+
+	def terms_with_prefix(self, prefix: str) -> List[str]:
+		terms = self._sorted_terms
+		if terms is None:
+			# Built on the first prefix lookup; a racing duplicate build is harmless.
+			terms = self._sorted_terms = sorted(self.postings)
+		out: List[str] = []
+		for i in range(bisect_left(terms, prefix), len(terms)):
+			if not terms[i].startswith(prefix):
+				break
+			out.append(terms[i])
+		return out
+
+	def lookup(self, term: str, prefix: bool = False) -> Sequence[int]:
+		if not prefix:
+			return self.postings.get(term, _EMPTY)
+		matched = self.terms_with_prefix(term)
+		if len(matched) == 1:
+			return self.postings[matched[0]]
+		return union(self.postings[t] for t in matched)
+
+
+class BM25FIndex(InvertedIndex):
+	__slots__ = ("weights", "idf", "avg_len")
+
+	def __init__(
+		self,
+		docs: Iterable[Mapping[str, Sequence[str]]],
+		field_weights: Mapping[str, float],
+		k1: float = 1.2,
+		b: Union[float, Mapping[str, float]] = 0.75,
+		min_len: int = 1,
+	):
+		# b is one length-normalisation strength for every field, or one per field: long prose
+		# wants ~0.75, short list fields (tags, places) ~0 so a lone tag is not penalised.
+		field_b = b if isinstance(b, Mapping) else dict.fromkeys(field_weights, b)
+		docs = list(docs)
+		totals = dict.fromkeys(field_weights, 0)
+		for fields in docs:
+			for name in field_weights:
+				totals[name] += len(fields.get(name) or ())
+		n = len(docs)
+		self.avg_len = {name: (total / n if n else 0.0) for name, total in totals.items()}
+
+		lists: Dict[str, List[int]] = {}
+		sats: Dict[str, List[float]] = {}
+		for ordinal, fields in enumerate(docs):
+			tf: Dict[str, float] = {}
+			for name, w in field_weights.items():
+				terms = fields.get(name) or ()
+				if not terms:
+					continue
+				# Each occurrence adds the field weight, damped for fields longer than average.
+				bf = field_b.get(name, 0.75)
+				weight = w / (1.0 - bf + bf * len(terms) / self.avg_len[name])
+				for term, count in Counter(terms).items():
+					tf[term] = tf.get(term, 0.0) + count * weight
+			for term, f in tf.items():
+				if len(term) < min_len:
+					continue
+				hits = lists.get(term)
+				if hits is None:
+					lists[term] = [ordinal]
+					sats[term] = [f / (k1 + f)]
+				else:
+					hits.append(ordinal)
+					sats[term].append(f / (k1 + f))
+
+		self.size = n
+		self.postings = {term: array("I", hits) for term, hits in lists.items()}
+		self.weights = {term: array("f", vals) for term, vals in sats.items()}
+		self.idf = {term: math.log(1.0 + (n - len(hits) + 0.5) / (len(hits) + 0.5)) for term, hits in lists.items()}
+		self._sorted_terms = None
+
+	def score_into(self, scores: Dict[int, float], term: str, prefix: bool = False) -> None:
+		# Adds idf * saturated tf for every document containing term. With prefix, each document
+		# counts only its best-matching expansion so one query term never scores twice.
+		matched = self.terms_with_prefix(term) if prefix else ([term] if term in self.postings else [])
+		if len(matched) == 1:
+			idf = self.idf[matched[0]]
+			for i, w in zip(self.postings[matched[0]], self.weights[matched[0]]):
+				scores[i] = scores.get(i, 0.0) + idf * w
+			return
+		best: Dict[int, float] = {}
+		for t in matched:
+			idf = self.idf[t]
+			for i, w in zip(self.postings[t], self.weights[t]):
+				if idf * w > best.get(i, 0.0):
+					best[i] = idf * w
+		for i, v in best.items():
+			scores[i] = scores.get(i, 0.0) + v
+
+
+def union(postings: Iterable[Sequence[int]]) -> array:
+	hits: set = set()
+	for p in postings:
+		hits.update(p)
+	return array("I", sorted(hits))
+
+
+# Bit positions set in each byte value, for turning a bitset back into ordinals.
+_BYTE_BITS = tuple(tuple(k for k in range(8) if value >> k & 1) for value in range(256))
+
+
+def ordinals_to_bits(ordinals: Iterable[int], size: int) -> int:
+	buf = bytearray((size + 7) // 8)
+	for i in ordinals:
+		buf[i >> 3] |= 1 << (i & 7)
+	return int.from_bytes(buf, "little")
+
+
+def bits_to_ordinals(bits: int) -> List[int]:
+	out: List[int] = []
+	if bits <= 0:
+		return out
+	for pos, byte in enumerate(bits.to_bytes((bits.bit_length() + 7) // 8, "little")):
+		if byte:
+			base = pos << 3
+			out.extend(base + k for k in _BYTE_BITS[byte])
+	return out
+
+
+class FacetBitmaps:
+	__slots__ = ("size", "all", "facets", "_present")
+
+	def __init__(self, docs: Iterable[Mapping[str, Iterable[str]]]):
+		# Each doc maps facet name -> its values for that facet ({"tag": ["memoir"], ...}).
+		lists: Dict[str, Dict[str, List[int]]] = {}
+		size = 0
+		for ordinal, facets in enumerate(docs):
+			size = ordinal + 1
+			for facet, values in facets.items():
+				by_value = lists.setdefault(facet, {})
+				for value in values:
+					hits = by_value.get(value)
+					if hits is None:
+						by_value[value] = [ordinal]
+					elif hits[-1] != ordinal:
+						hits.append(ordinal)
+		self.size = size
+		self.all = (1 << size) - 1
+		self.facets: Dict[str, Dict[str, int]] = {
+			facet: {value: ordinals_to_bits(hits, size) for value, hits in by_value.items()}
+			for facet, by_value in lists.items()
+		}
+		self._present: Dict[str, int] = {}
+
+	def get(self, facet: str, value: str) -> int:
+		return self.facets.get(facet, {}).get(value, 0)
+
+	def any_of(self, facet: str, values: Iterable[str]) -> int:
+		bits = 0
+		by_value = self.facets.get(facet, {})
+		for value in values:
+			bits |= by_value.get(value, 0)
+		return bits
+
+	def all_of(self, facet: str, values: Iterable[str]) -> int:
+		bits = self.all
+		by_value = self.facets.get(facet, {})
+		for value in values:
+			bits &= by_value.get(value, 0)
+		return bits
+
+	def present(self, facet: str) -> int:
+		# Documents with at least one value for facet; memoized, a racing duplicate is harmless.
+		bits = self._present.get(facet)
+		if bits is None:
+			bits = self._present[facet] = self.any_of(facet, self.facets.get(facet, {}))
+		return bits
+
+
+def trigrams(text: str) -> List[str]:
+	padded = f"  {text} "
+	return list(dict.fromkeys(padded[i:i + 3] for i in range(len(padded) - 2)))
+
+
+class TrigramIndex:
+	__slots__ = ("keys", "_padded", "_sizes", "postings")
+
+	def __init__(self, keys: Iterable[str]):
+		self.keys: List[str] = list(dict.fromkeys(k for k in keys if k))
+		self._padded = [f"  {k} " for k in self.keys]
+		self._sizes = array("I")
+		lists: Dict[str, List[int]] = {}
+		for i, key in enumerate(self.keys):
+			grams = trigrams(key)
+			self._sizes.append(len(grams))
+			for g in grams:
+				hits = lists.get(g)
+				if hits is None:
+					lists[g] = [i]
+				else:
+					hits.append(i)
+		self.postings: Dict[str, array] = {g: array("I", hits) for g, hits in lists.items()}
+
+	def search(self, text: str, k: int = 5, min_score: float = 0.5) -> List[Tuple[str, float]]:
+		# A key scoring Dice >= min_score shares at least `need` of the query's m trigrams, so
+		# it must appear in one of the (m - need + 1) rarest lists; common trigrams ("the",
+		# " a ") are only checked against those candidates, never walked.
+		grams = trigrams(text)
+		m = len(grams)
+		if not m or not self.keys:
+			return []
+		need = max(1, math.ceil(min_score * m / (2.0 - min_score))) if min_score > 0 else 1
+		if need > m:
+			return []
+		grams.sort(key=lambda g: len(self.postings.get(g, ())))
+		candidates: set = set()
+		for g in grams[:m - need + 1]:
+			candidates.update(self.postings.get(g, ()))
+		scored: List[Tuple[float, int]] = []
+		padded, sizes = self._padded, self._sizes
+		for i in candidates:
+			key = padded[i]
+			shared = sum(1 for g in grams if g in key)
+			score = 2.0 * shared / (m + sizes[i])
+			if score >= min_score:
+				scored.append((score, i))
+		return [(self.keys[i], score) for score, i in heapq.nlargest(k, scored, key=lambda x: (x[0], -x[1]))]
+
+
+class PhraseAutomaton:
+	"""Aho-Corasick over token sequences: finds every known phrase in one pass over the tokens."""
+
+	__slots__ = ("_goto", "_fail", "_out")
+
+	def __init__(self, phrases: Mapping[Tuple[str, ...], Any]):
+		goto: List[Dict[str, int]] = [{}]
+		out: List[List[Tuple[int, Any]]] = [[]]
+		for phrase, value in phrases.items():
+			state = 0
+			for tok in phrase:
+				nxt = goto[state].get(tok)
+				if nxt is None:
+					nxt = goto[state][tok] = len(goto)
+					goto.append({})
+					out.append([])
+				state = nxt
+			out[state].append((len(phrase), value))
+
+		# Breadth-first failure links; each state also inherits the outputs of its fallback.
+		fail = [0] * len(goto)
+		queue = deque(goto[0].values())
+		while queue:
+			state = queue.popleft()
+			for tok, nxt in goto[state].items():
+				queue.append(nxt)
+				f = fail[state]
+				while f and tok not in goto[f]:
+					f = fail[f]
+				fail[nxt] = goto[f].get(tok, 0)
+				out[nxt] = out[nxt] + out[fail[nxt]]
+		self._goto, self._fail, self._out = goto, fail, out
+
+	def find_all(self, tokens: Sequence[str]) -> List[Tuple[int, int, Any]]:
+		"""Every (start, end, value) occurrence, end exclusive, in order of end position."""
+		goto, fail, out = self._goto, self._fail, self._out
+		hits: List[Tuple[int, int, Any]] = []
+		state = 0
+		for pos, tok in enumerate(tokens):
+			while state and tok not in goto[state]:
+				state = fail[state]
+			state = goto[state].get(tok, 0)
+			for length, value in out[state]:
+				hits.append((pos + 1 - length, pos + 1, value))
+		return hits
+
+	def find(self, tokens: Sequence[str]) -> List[Tuple[int, int, Any]]:
+		"""Leftmost-longest, non-overlapping occurrences ("latin american" over "american")."""
+		picked: List[Tuple[int, int, Any]] = []
+		last_end = 0
+		for start, end, value in sorted(self.find_all(tokens), key=lambda h: (h[0], -h[1])):
+			if start >= last_end:
+				picked.append((start, end, value))
+				last_end = end
+		return picked
@@ -0,0 +1,79 @@
+"""Text folding shared by the catalog index, query handling and maintenance scripts.
+
+fold_text casefolds, strips Latin/Greek/Cyrillic diacritics (México -> mexico, Straße -> strasse)
+and turns everything that is not a letter, digit or combining mark into single spaces. Other
+scripts keep their letters and vowel signs, so Cyrillic, Devanagari or CJK text stays searchable.
+Pure-ASCII input takes a regex-only fast path identical to the old a-z0-9 normalization.
+fold_spans also maps each folded character back to its source index, for highlighting.
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Any, List, Tuple
+
+_ASCII_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+_ASCII_NON_ALNUM_TO_SPACE = str.maketrans({chr(i): " " for i in range(128) if not chr(i).isalnum()})
+_SPACES = re.compile(r"\s+")
+# Combining Diacritical Marks block only; Indic/Arabic/Hebrew marks carry meaning and stay.
+_DIACRITICS = re.compile("[\u0300-\u036f]+")
+_LATIN_EXTRAS = str.maketrans({
+	"æ": "ae", "œ": "oe", "ø": "o", "đ": "d", "ð": "d", "þ": "th", "ł": "l", "ı": "i", "ŀ": "l",
+})
+
+
+def _fold_char(ch: str) -> str:
+	if ch.isalnum():
+		return ch
+	return ch if unicodedata.category(ch).startswith("M") else " "
+
+
+def fold_text(value: Any) -> str:
+	try:
+		txt = str(value or "")
+	except Exception:
+		return ""
+
+	if txt.isascii():
+		return _ASCII_NON_ALNUM.sub(" ", txt.lower()).strip()
+
+	txt = unicodedata.normalize("NFKD", txt.casefold())
+	txt = _DIACRITICS.sub("", txt).translate(_LATIN_EXTRAS)
+	if txt.isascii():
+		# Accented Latin text is plain ASCII once folded; skip the per-character pass.
+		return _ASCII_NON_ALNUM.sub(" ", txt).strip()
+	txt = "".join(_fold_char(ch) for ch in txt)
+	return _SPACES.sub(" ", txt).strip()
+
+
+@lru_cache(maxsize=2048)
+def fold_name(value: str) -> str:
+	"""fold_text for short, frequently repeated strings such as country names."""
+	return fold_text(value)
+
+
+def fold_terms(value: Any) -> List[str]:
+	"""fold_text(value).split(), with a translate-based path for ASCII text (index builds)."""
+	txt = value if isinstance(value, str) else str(value or "")
+	if txt.isascii():
+		return txt.lower().translate(_ASCII_NON_ALNUM_TO_SPACE).split()
+	return fold_text(txt).split()
+
+
+def fold_spans(value: Any) -> Tuple[str, List[int]]:
+	"""fold_text(value) plus, for every folded character, the index of the source character."""
+	txt = str(value or "")
+	chars: List[str] = []
+	origin: List[int] = []
+	for i, ch in enumerate(txt):
+		folded = _DIACRITICS.sub("", unicodedata.normalize("NFKD", ch.casefold())).translate(_LATIN_EXTRAS)
+		for c in folded:
+			c = _fold_char(c)
+			if c == " " and (not chars or chars[-1] == " "):
+				continue
+			chars.append(c)
+			origin.append(i)
+	while chars and chars[-1] == " ":
+		chars.pop()
+		origin.pop()
+	return "".join(chars), origin
@@ -1 +1,11 @@
-from atlas_chat import atlasCatalog, atlasChat  # noqa: F401
+import os
+
+from atlas_chat import atlasBook, atlasCatalog, atlasChat, atlasSearch, atlasWarm, warm_on_import  # noqa: F401
+
+# The aggregate trigger pulls in the Firestore client and grpc at import; only load it for its
+# own instances (FUNCTION_TARGET=atlasCatalogAggregate) and for deploy-time discovery (unset).
+if os.environ.get("FUNCTION_TARGET", "") in ("", "atlasCatalogAggregate"):
+	from atlas_aggregate import atlasCatalogAggregate  # noqa: F401
+
+# Opt-in (ATLAS_WARMUP_ON_IMPORT=1): start building the catalog snapshot while the instance boots.
+warm_on_import()
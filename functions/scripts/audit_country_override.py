@@ -14,7 +14,7 @@ import csv
 import sys
 from pathlib import Path
 
-# Allow importing atlas_chat helpers when run from repo root.
+# Allow importing functions/ helpers when run from repo root.
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
 try:
@@ -23,11 +23,11 @@ except ImportError:
 	print("firebase_admin not installed; activate functions/venv first", file=sys.stderr)
 	sys.exit(1)
 
-from atlas_chat import _extract_iso2_candidates  # noqa: E402
+from atlas_countries import extract_iso2_candidates  # noqa: E402
 
 
 def _first_iso2(field) -> str | None:
-	cands = _extract_iso2_candidates(field)
+	cands = extract_iso2_candidates(field)
 	return cands[0] if cands else None
 
 
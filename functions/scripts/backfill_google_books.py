@@ -20,7 +20,6 @@ import re
 import ssl
 import sys
 import time
-import unicodedata
 import urllib.error
 import urllib.parse
 import urllib.request
@@ -36,6 +35,8 @@ except ImportError:
 	print("firebase_admin not installed; activate functions/venv first", file=sys.stderr)
 	sys.exit(1)
 
+from atlas_text import fold_text  # noqa: E402
+
 USER_AGENT = "AtlasGoogleBooksBackfill/1.0 (+https://map.ponder-app.ai)"
 GOOGLE_ID_RE = re.compile(r"[?&]id=([^&]+)")
 ISBN_RE = re.compile(r"/(\d{13})(?:\?|$)")
@@ -45,10 +46,7 @@ API_429_BASE_SEC = 15.0
 
 
 def _norm(text: str) -> str:
-	out = unicodedata.normalize("NFKD", (text or "").lower())
-	out = "".join(ch for ch in out if not unicodedata.combining(ch))
-	out = re.sub(r"[^a-z0-9]+", " ", out)
-	return re.sub(r"\s+", " ", out).strip()
+	return fold_text(text)
 
 
 def _tokens(text: str) -> set[str]:
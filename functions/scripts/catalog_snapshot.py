@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""Write catalog snapshot files for ATLAS_CATALOG_SOURCE=file and profile ranking against them.
+
+  dump       copy the configured catalog source (Firestore by default) into a JSONL(.gz) file
+  synthetic  generate N fake books with realistic tags, countries and blurb lengths
+  bench      load a snapshot file and time candidate ranking and prompt building per query
+
+  python functions/scripts/catalog_snapshot.py dump --out /tmp/atlas.jsonl.gz
+  python functions/scripts/catalog_snapshot.py synthetic --count 100000 --out /tmp/atlas-100k.jsonl.gz
+  python functions/scripts/catalog_snapshot.py bench /tmp/atlas-100k.jsonl.gz --repeat 5
+  python functions/scripts/catalog_snapshot.py bench /tmp/atlas-100k.jsonl.gz --engine numpy --compare
+  ATLAS_CATALOG_SOURCE=file ATLAS_CATALOG_FILE=/tmp/atlas-100k.jsonl.gz firebase emulators:start --only functions
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Allow importing functions/ helpers when run from repo root.
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+try:
+	import atlas_chat  # noqa: E402
+	from atlas_countries import _ISO3166  # noqa: E402
+except ImportError as e:
+	print(f"{e}; activate functions/venv first", file=sys.stderr)
+	sys.exit(1)
+
+WORDS = (
+	"river night garden city letters mother salt house winter border island memory fire song "
+	"stranger harbor daughter silence empire rain mountain kingdom ghost exile lantern orchard "
+	"summer glass wolf desert bridge tide archive heart ash sea crown"
+).split()
+FIRST_NAMES = "Amara Jun Lucía Tomasz Nneka Farid Ingrid Mei Rafael Aiyana Kofi Sasha Leila Mateo Yuki".split()
+LAST_NAMES = "Okafor Haddad Lindqvist Moreno Tanaka Kowalski Mensah Ruiz Novak Achebe Park Silva Costa".split()
+TAGS = (
+	"Queer Gay Lesbian Trans Bisexual Memoir Romance Historical Fantasy Literary Coming-of-age "
+	"Poetry Essays Family War Mystery Young Adult Speculative Classic Short Stories Migration"
+).split()
+CATEGORIES = ("Fiction", "Nonfiction", "Poetry", "Biography & Autobiography", "History", "Young Adult Fiction")
+QUERIES = (
+	"queer romance set in Africa",
+	"a memoir about migration",
+	"historical fiction in South America",
+	"books like Giovanni's Room",
+	"something short from Japan",
+	"lesbian fantasy",
+)
+
+
+def _synthetic_rows(count: int, seed: int):
+	rng = random.Random(seed)
+	countries = [row[0] for row in _ISO3166]
+	base_ms = 1_700_000_000_000
+	for i in range(count):
+		title = " ".join(rng.sample(WORDS, rng.randint(1, 4))).title()
+		blurb = " ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 160))).capitalize() + "."
+		home = rng.choice(countries)
+		yield {
+			"id": f"syn{i:07d}",
+			"_updated_ms": base_ms + i,
+			"title": f"The {title}",
+			"author": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+			"summary": blurb,
+			"description": blurb if rng.random() < 0.7 else "",
+			"year": str(rng.randint(1920, 2025)),
+			"page_count": rng.randint(90, 700),
+			"tags": rng.sample(TAGS, rng.randint(1, 5)),
+			"categories": [rng.choice(CATEGORIES)],
+			"country_override": home if rng.random() < 0.6 else "",
+			"setting_country": rng.sample(countries, rng.randint(0, 2)) or [home],
+			"author_country": [home],
+			"author_origin": [rng.choice(countries)] if rng.random() < 0.2 else [],
+			"cover_url": "",
+			"read": rng.random() < 0.3,
+			"stamp": rng.random() < 0.05,
+		}
+
+
+def _write_rows(path: str, rows) -> int:
+	import gzip
+
+	opener = gzip.open if path.endswith(".gz") else open
+	n = 0
+	with opener(path, "wt", encoding="utf-8") as f:
+		for row in rows:
+			f.write(json.dumps(row, ensure_ascii=False, separators=(",", ":")) + "\n")
+			n += 1
+	return n
+
+
+def _bench(path: str, repeat: int, engine: str = "python", compare: bool = False) -> None:
+	started = time.perf_counter()
+	atlas_chat._set_catalog_source(atlas_chat.FileCatalogSource(path))
+	catalog = atlas_chat._current_catalog()
+	print(f"loaded {len(catalog)} book(s), {len(catalog.available_countries)} countries in {time.perf_counter() - started:.2f}s")
+	started = time.perf_counter()
+	index = catalog.search_index()
+	print(f"search index: {len(index.text)} term(s) in {time.perf_counter() - started:.2f}s")
+	atlas_chat.ATLAS_CHAT_ENGINE = engine
+	if engine != "python":
+		started = time.perf_counter()
+		index.ranking_matrix()
+		print(f"{engine} ranking matrix in {time.perf_counter() - started:.2f}s")
+
+	for query in QUERIES:
+		rank_ms, prompt_ms, sizes = [], [], []
+		for _ in range(repeat):
+			t0 = time.perf_counter()
+			tier1, tier2, _ = atlas_chat._build_tiered_candidates(
+				catalog.books, query, None, catalog.available_countries, index
+			)
+			t1 = time.perf_counter()
+			prompt = json.dumps({"detail": atlas_chat._compact_detail_candidates(tier1), "index": tier2}, ensure_ascii=False)
+			t2 = time.perf_counter()
+			rank_ms.append((t1 - t0) * 1000)
+			prompt_ms.append((t2 - t1) * 1000)
+			sizes.append(len(prompt))
+		line = (
+			f"{query!r:42} rank={statistics.median(rank_ms):8.1f}ms "
+			f"prompt={statistics.median(prompt_ms):7.1f}ms chars={sizes[-1]}"
+		)
+		if compare and engine != "python":
+			atlas_chat.ATLAS_CHAT_ENGINE = "python"
+			baseline = atlas_chat._build_tiered_candidates(catalog.books, query, None, catalog.available_countries, index)
+			atlas_chat.ATLAS_CHAT_ENGINE = engine
+			line += " same_as_python=" + str([b["id"] for b in tier1] + [r["id"] for r in tier2] == (
+				[b["id"] for b in baseline[0]] + [r["id"] for r in baseline[1]]
+			))
+		print(line)
+
+
+def main() -> int:
+	parser = argparse.ArgumentParser(description="Atlas catalog snapshot files")
+	sub = parser.add_subparsers(dest="cmd", required=True)
+	dump = sub.add_parser("dump", help="Copy the configured catalog source into a snapshot file")
+	dump.add_argument("--out", required=True, help=".jsonl or .jsonl.gz path")
+	synth = sub.add_parser("synthetic", help="Generate a synthetic snapshot file")
+	synth.add_argument("--count", type=int, default=100_000)
+	synth.add_argument("--seed", type=int, default=7)
+	synth.add_argument("--out", required=True, help=".jsonl or .jsonl.gz path")
+	bench = sub.add_parser("bench", help="Time ranking and prompt building against a snapshot file")
+	bench.add_argument("path")
+	bench.add_argument("--repeat", type=int, default=3)
+	bench.add_argument("--engine", choices=("python", "numpy"), default="python", help="Ranking engine (ATLAS_CHAT_ENGINE)")
+	bench.add_argument("--compare", action="store_true", help="Check each ranking against the python engine")
+	args = parser.parse_args()
+
+	if args.cmd == "dump":
+		items = atlas_chat._get_catalog_source().read()
+		print(f"Wrote {atlas_chat._write_catalog_file(args.out, items)} book(s) to {args.out}")
+	elif args.cmd == "synthetic":
+		print(f"Wrote {_write_rows(args.out, _synthetic_rows(args.count, args.seed))} synthetic book(s) to {args.out}")
+	else:
+		_bench(args.path, max(1, args.repeat), args.engine, args.compare)
+	return 0
+
+
+if __name__ == "__main__":
+	raise SystemExit(main())
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Export the client catalog to Hosting as a content-hashed static file plus a manifest.
+
+Writes public/catalog/catalog.<hash>.json (the same body atlasCatalog serves for ?fields=lite)
+and public/catalog/manifest.json pointing at it. The manifest carries the body's content digest
+(its ETag hash): versions only track the newest update, so a deletion can leave the version
+unchanged, while the digest changes with any row. The map loads the manifest first and only
+falls back to the atlasCatalog function when it is missing. Hosting compresses both files at
+the edge (brotli/gzip), so only the minified JSON is written.
+
+  python functions/scripts/export_static_catalog.py
+  python functions/scripts/export_static_catalog.py --unless-digest-at https://map.ponder-app.ai/catalog/manifest.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+# Allow importing functions/ helpers when run from repo root.
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+try:
+	import atlas_chat  # noqa: E402
+except ImportError as e:
+	print(f"{e}; activate functions/venv first", file=sys.stderr)
+	sys.exit(1)
+
+ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_OUT = ROOT / "public" / "catalog"
+MANIFEST_NAME = "manifest.json"
+USER_AGENT = "AtlasCatalogExport/1.0 (+https://map.ponder-app.ai)"
+
+
+def _live_digest(url: str) -> str | None:
+	req = urllib.request.Request(url, headers={"User-Agent": USER_AGENT, "Cache-Control": "no-cache"})
+	try:
+		with urllib.request.urlopen(req, timeout=20) as resp:
+			return str(json.loads(resp.read().decode("utf-8")).get("digest") or "") or None
+	except Exception as e:
+		print(f"Could not read live manifest ({e}); exporting anyway", file=sys.stderr)
+		return None
+
+
+def _set_output(changed: bool) -> None:
+	path = os.environ.get("GITHUB_OUTPUT")
+	if path:
+		with open(path, "a", encoding="utf-8") as f:
+			f.write(f"changed={'true' if changed else 'false'}\n")
+
+
+def catalog_digest(encoded: dict) -> str:
+	return encoded["etag"].strip('"')
+
+
+def export_catalog(snapshot: atlas_chat.CatalogSnapshot, out_dir: Path, fields: str = "lite", keep: int = 2) -> dict:
+	encoded = snapshot.encoded_catalog(fields)
+	digest = catalog_digest(encoded)
+	name = f"catalog.{digest[:16]}.json"
+
+	out_dir.mkdir(parents=True, exist_ok=True)
+	(out_dir / name).write_bytes(encoded["identity"])
+
+	manifest = {
+		"path": name,
+		"fields": fields,
+		"version": snapshot.version,
+		"digest": digest,
+		"count": len(snapshot),
+		"bytes": len(encoded["identity"]),
+		"generated_at": int(time.time()),
+	}
+	(out_dir / MANIFEST_NAME).write_text(json.dumps(manifest, separators=(",", ":")) + "\n", encoding="utf-8")
+
+	# Keep the previous export(s) so pages holding an older manifest can still fetch them.
+	exports = sorted(out_dir.glob("catalog.*.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+	for old in [p for p in exports if p.name != name][max(0, keep - 1):]:
+		old.unlink()
+	return manifest
+
+
+def main() -> int:
+	parser = argparse.ArgumentParser(description="Export the Atlas catalog as static Hosting files")
+	parser.add_argument("--out", type=str, default=str(DEFAULT_OUT), help="Output directory under public/")
+	parser.add_argument("--fields", type=str, default="lite", choices=sorted(atlas_chat._CLIENT_PROJECTIONS))
+	parser.add_argument("--keep", type=int, default=2, help="Catalog exports to keep (current included)")
+	parser.add_argument("--unless-digest-at", type=str, default="", help="Skip when this live manifest already has the catalog's content digest")
+	args = parser.parse_args()
+
+	started = time.time()
+	items = atlas_chat._get_catalog_source().read()
+	by_id = {b["id"]: b for b in items}
+	iso_set = set()
+	for b in items:
+		iso_set |= atlas_chat._book_geo_iso2(b)
+	snapshot = atlas_chat._build_catalog_snapshot(items, by_id, atlas_chat._available_countries_from_iso2(iso_set), started)
+	if not len(snapshot):
+		print("Catalog is empty; refusing to export", file=sys.stderr)
+		return 1
+
+	digest = catalog_digest(snapshot.encoded_catalog(args.fields))
+	if args.unless_digest_at and _live_digest(args.unless_digest_at) == digest:
+		print(f"Live catalog already has digest {digest[:16]}; nothing to export")
+		_set_output(False)
+		return 0
+
+	manifest = export_catalog(snapshot, Path(args.out), args.fields, max(1, args.keep))
+	_set_output(True)
+	print(
+		f"Exported {manifest['count']} book(s) to {Path(args.out) / manifest['path']} "
+		f"({manifest['bytes']} bytes, version {manifest['version']}) in {time.time() - started:.1f}s"
+	)
+	return 0
+
+
+if __name__ == "__main__":
+	raise SystemExit(main())
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""Rebuild the sharded atlasCatalogShards aggregate from atlasBooks.
+
+Run once before enabling ATLAS_CATALOG_AGGREGATE, and again whenever the shard count
+or the aggregate format changes. The atlasCatalogAggregate trigger keeps it current after that.
+
+  python functions/scripts/rebuild_catalog_aggregate.py
+  ATLAS_CATALOG_AGGREGATE_SHARDS=32 python functions/scripts/rebuild_catalog_aggregate.py
+"""
+
+from __future__ import annotations
+
+import sys
+import time
+from pathlib import Path
+
+# Allow importing functions/ helpers when run from repo root.
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+try:
+	import atlas_aggregate  # noqa: E402
+	import atlas_chat  # noqa: E402
+except ImportError as e:
+	print(f"{e}; activate functions/venv first", file=sys.stderr)
+	sys.exit(1)
+
+
+def main() -> int:
+	started = time.time()
+	count = atlas_aggregate._rebuild_catalog_aggregates()
+	print(
+		f"Wrote {count} book(s) into {atlas_chat.ATLAS_CATALOG_AGGREGATE_SHARDS} shard(s) of "
+		f"{atlas_chat.ATLAS_CATALOG_AGGREGATE_COLLECTION} in {time.time() - started:.1f}s"
+	)
+	return 0
+
+
+if __name__ == "__main__":
+	raise SystemExit(main())
@@ -1,13 +1,28 @@
+import gzip
+import importlib.util
+import json
+import os
+import tempfile
+import threading
+import time
 import unittest
+from types import SimpleNamespace
+from unittest import mock
 
+from firebase_functions import https_fn
+from werkzeug.test import EnvironBuilder
+
+import atlas_aggregate
+import atlas_chat
+from atlas_search import bits_to_ordinals as _bits_to_ordinals
 from atlas_chat import (
+	_apply_atlas_book_changes,
 	_attach_book_display,
 	_book_record_for_client,
 	_build_tiered_candidates,
 	_catalog_already_fully_detailed,
 	_infer_geo_iso2_from_query,
 	_should_retry_full_catalog,
-	_score_book_for_query,
 	_validate_payload,
 )
 
@@ -15,9 +30,9 @@ from atlas_chat import (
 class TieredCandidatesTests(unittest.TestCase):
 	def test_all_books_reachable_via_tier1_or_tier2(self):
 		books = [
-			{"id": "a", "title": "Alpha", "author": "A", "_blob": "alpha queer romance", "_iso2_sets": {"any": {"US"}}},
-			{"id": "b", "title": "Beta", "author": "B", "_blob": "beta history", "_iso2_sets": {"any": {"FR"}}},
-			{"id": "c", "title": "Gamma", "author": "C", "_blob": "gamma", "_iso2_sets": {"any": set()}},
+			{"id": "a", "title": "Alpha", "author": "A", "summary": "queer romance", "_iso2_sets": {"any": {"US"}}},
+			{"id": "b", "title": "Beta", "author": "B", "summary": "history", "_iso2_sets": {"any": {"FR"}}},
+			{"id": "c", "title": "Gamma", "author": "C", "_iso2_sets": {"any": set()}},
 		]
 		tier1, tier2, stats = _build_tiered_candidates(books, "queer romance", "US", [])
 		self.assertEqual(stats["total"], 3)
@@ -25,10 +40,64 @@ class TieredCandidatesTests(unittest.TestCase):
 		ids = {b["id"] for b in tier1} | {b["id"] for b in tier2}
 		self.assertEqual(ids, {"a", "b", "c"})
 
+	def test_matches_whole_terms_not_substrings(self):
+		books = [
+			atlas_chat._book_record_from_doc("a", {"title": "A", "summary": "A novel in translation, transatlantic"}),
+			atlas_chat._book_record_from_doc("b", {"title": "B", "summary": "A trans coming of age story"}),
+		]
+		index = atlas_chat.CatalogSearchIndex(books)
+		with mock.patch.object(atlas_chat, "TIER1_DETAIL_COUNT", 1):
+			tier1, _, _ = _build_tiered_candidates(books, "trans", None, [])
+			self.assertEqual([b["id"] for b in tier1], ["b"])
+			self.assertEqual(index.count_score(0, ["trans"], None), 0.0)
+
+			with mock.patch.object(atlas_chat, "ATLAS_CHAT_PREFIX_MIN", 4):
+				self.assertEqual(index.count_score(0, ["trans"], None), 1.0)
+				self.assertEqual(_build_tiered_candidates(books, "transl", None, [])[0][0]["id"], "a")
+
+	def test_count_ranker_matches_per_book_scores(self):
+		available = [{"iso2": "NG", "name": "Nigeria"}, {"iso2": "FR", "name": "France"}]
+		books = [
+			atlas_chat._book_record_from_doc(f"b{i:02d}", {"title": f"T{i}", "summary": summary, "country_override": iso})
+			for i, (summary, iso) in enumerate([
+				("queer romance lagos", "NG"), ("history of paris", "FR"), ("gay memoir", "FR"),
+				("lesbian romance", ""), ("cookbook", "NG"), ("queer gay poetry", ["NG", "FR"]),
+			] * 3)
+		]
+		catalog = atlas_chat._build_catalog_snapshot(books, {b["id"]: b for b in books}, available, 0.0)
+		query = "queer romance from Nigeria"
+		tokens = atlas_chat._expand_theme_tokens(atlas_chat._tokenize_query(query))
+		match = atlas_chat._geo_matcher(available).match(query)
+		geo, themes = set(match.iso2), atlas_chat._theme_tokens_from_query([], tokens, match.terms)
+		index = catalog.search_index()
+		expected = sorted(range(len(books)), key=lambda i: (-index.count_score(i, tokens, "FR", geo, themes), books[i]["id"]))
+		expected = [books[i] for i in expected]
+
+		with mock.patch.object(atlas_chat, "TIER1_DETAIL_COUNT", 4), mock.patch.object(atlas_chat, "ATLAS_CHAT_RANKER", "count"):
+			tier1, tier2, _ = _build_tiered_candidates(books, query, "FR", available, index)
+		pinned = [b for i, b in enumerate(books) if b["_iso2_sets"]["any"] & geo and index.matches_theme(i, themes)]
+		self.assertEqual(tier1[:len(pinned)], pinned)
+		rest = [b["id"] for b in expected if b not in pinned]
+		self.assertEqual([b["id"] for b in tier1[len(pinned):]] + [b["id"] for b in tier2], rest)
+
+	def test_bm25f_prefers_title_and_rare_terms(self):
+		filler = " ".join(["river night garden city letters"] * 30)
+		books = [
+			atlas_chat._book_record_from_doc("a-summary", {"title": "Letters", "summary": f"{filler} a memoir"}),
+			atlas_chat._book_record_from_doc("b-title", {"title": "A Memoir", "summary": filler}),
+			atlas_chat._book_record_from_doc("c-tag", {"title": "Night", "summary": "short", "tags": ["Memoir"]}),
+		] + [
+			atlas_chat._book_record_from_doc(f"f{i}", {"title": f"Garden {i}", "summary": "night garden"})
+			for i in range(20)
+		]
+		with mock.patch.object(atlas_chat, "TIER1_DETAIL_COUNT", 3):
+			tier1, _, _ = _build_tiered_candidates(books, "memoir garden", None, [])
+			self.assertEqual([b["id"] for b in tier1], ["b-title", "c-tag", "a-summary"])
+
 	def test_score_boosts_selected_iso2(self):
-		b = {"_blob": "book", "_iso2_sets": {"any": {"DE"}}}
-		with_iso = _score_book_for_query(b, ["book"], "DE")
-		without_iso = _score_book_for_query(b, ["book"], None)
+		index = atlas_chat.CatalogSearchIndex([atlas_chat._book_record_from_doc("d", {"summary": "book", "country_override": "DE"})])
+		with_iso = index.count_score(0, ["book"], "DE")
+		without_iso = index.count_score(0, ["book"], None)
 		self.assertGreater(with_iso, without_iso)
 
 	def test_african_queer_book_pinned_to_tier1(self):
@@ -38,7 +107,6 @@ class TieredCandidatesTests(unittest.TestCase):
 			"author": "A Author",
 			"tags": ["LGBTQ"],
 			"categories": [],
-			"_blob": "african queer story lgbtq",
 			"_iso2_sets": {"any": {"NG"}},
 		}] + [
 			{
@@ -47,7 +115,7 @@ class TieredCandidatesTests(unittest.TestCase):
 				"author": "U Author",
 				"tags": ["queer"],
 				"categories": [],
-				"_blob": "queer romance us",
+				"summary": "queer romance us",
 				"_iso2_sets": {"any": {"US"}},
 			}
 			for i in range(60)
@@ -74,7 +142,6 @@ class TieredCandidatesTests(unittest.TestCase):
 			"author": "Z",
 			"tags": ["LGBTQ", "memoir"],
 			"categories": ["fiction"],
-			"_blob": "hidden gem",
 			"_iso2_sets": {"any": {"KE"}},
 			"_places": {"override": [{"iso2": "KE", "name": "Kenya"}]},
 		}] + [
@@ -84,7 +151,6 @@ class TieredCandidatesTests(unittest.TestCase):
 				"author": "F",
 				"tags": [],
 				"categories": [],
-				"_blob": f"filler {i}",
 				"_iso2_sets": {"any": {"US"}},
 			}
 			for i in range(60)
@@ -95,6 +161,254 @@ class TieredCandidatesTests(unittest.TestCase):
 		self.assertEqual(by_id["x"].get("tags"), ["LGBTQ", "memoir"])
 
 
+@unittest.skipIf(importlib.util.find_spec("numpy") is None, "numpy not installed")
+class NumpyEngineTests(unittest.TestCase):
+	def setUp(self):
+		summaries = [
+			"queer romance in lagos", "a history of paris", "gay memoir of exile", "lesbian romance",
+			"memoirs and essays", "queer gay poetry", "transatlantic letters", "a trans memoir",
+		]
+		isos = ["NG", "FR", "", "US", "NG", ["FR", "NG"], "US", "FR"]
+		self.books = [
+			atlas_chat._book_record_from_doc(
+				f"b{i:03d}",
+				{"title": f"Title {i % 7}", "summary": summaries[i % 8], "country_override": isos[(i * 3) % 8], "tags": ["Memoir"] if i % 5 == 0 else []},
+			)
+			for i in range(80)
+		]
+		self.available = [{"iso2": "NG", "name": "Nigeria"}, {"iso2": "FR", "name": "France"}, {"iso2": "US", "name": "United States"}]
+		self.index = atlas_chat.CatalogSearchIndex(self.books)
+
+	def _ranking(self, engine, query, selected):
+		with mock.patch.object(atlas_chat, "ATLAS_CHAT_ENGINE", engine):
+			tier1, tier2, _ = _build_tiered_candidates(self.books, query, selected, self.available, self.index)
+		return [b["id"] for b in tier1] + [r["id"] for r in tier2]
+
+	def test_matches_python_engine(self):
+		queries = [("queer romance from Nigeria", "FR"), ("memoir", None), ("trans letters", "US"), ("title 3", None), ("nothing here", None)]
+		for ranker in ("bm25f", "count"):
+			for prefix_min in (0, 4):
+				with mock.patch.object(atlas_chat, "ATLAS_CHAT_RANKER", ranker), mock.patch.object(atlas_chat, "ATLAS_CHAT_PREFIX_MIN", prefix_min):
+					for query, selected in queries:
+						with self.subTest(ranker=ranker, prefix_min=prefix_min, query=query):
+							self.assertEqual(self._ranking("numpy", query, selected), self._ranking("python", query, selected))
+
+	def test_falls_back_without_numpy(self):
+		with mock.patch.object(atlas_chat, "ATLAS_CHAT_ENGINE", "numpy"), mock.patch.object(atlas_chat, "_NUMPY_AVAILABLE", False):
+			self.assertFalse(atlas_chat._numpy_engine_enabled())
+			self.assertEqual(self._ranking("numpy", "memoir", None), self._ranking("python", "memoir", None))
+
+
+@unittest.skipIf(importlib.util.find_spec("numpy") is None, "numpy not installed")
+class SemanticCandidatesTests(unittest.TestCase):
+	def setUp(self):
+		self.books = [
+			atlas_chat._book_record_from_doc("target", {"title": "The Orchard", "summary": "A widow grieving the lover she lost one summer"}),
+		] + [
+			atlas_chat._book_record_from_doc(f"kw{i}", {"title": f"Heavy Story {i}", "summary": "A heavy story of a storm at sea"})
+			for i in range(6)
+		] + [
+			atlas_chat._book_record_from_doc(f"x{i}", {"title": f"Ledger {i}", "summary": "Accounts of a merchant bank and its railways"})
+			for i in range(6)
+		]
+		self.index = atlas_chat.CatalogSearchIndex(self.books)
+
+	def test_vectors_are_normalised_int8(self):
+		vectors = self.index.semantic_index().vectors
+		self.assertEqual(vectors.dtype.name, "int8")
+		self.assertEqual(vectors.shape, (len(self.books), atlas_chat.ATLAS_CHAT_SEMANTIC_DIM))
+		norms = (vectors.astype("float32") ** 2).sum(axis=1) ** 0.5
+		self.assertTrue(all(abs(n - 127) < 3 for n in norms))
+
+	def test_semantic_neighbours_fill_reserved_tier1_slots(self):
+		query = "a quiet grief-heavy first-love story"
+		with mock.patch.object(atlas_chat, "TIER1_DETAIL_COUNT", 3):
+			tier1, _, stats = _build_tiered_candidates(self.books, query, None, [], self.index)
+			self.assertNotIn("target", [b["id"] for b in tier1])
+			self.assertEqual(stats["semantic"], 0)
+
+			with mock.patch.object(atlas_chat, "ATLAS_CHAT_SEMANTIC_K", 1):
+				tier1, tier2, stats = _build_tiered_candidates(self.books, query, None, [], self.index)
+		self.assertEqual([b["id"] for b in tier1][:2], ["kw0", "kw1"])
+		self.assertEqual(tier1[2]["id"], "target")
+		self.assertEqual(stats["semantic"], 1)
+		self.assertEqual(len(tier1) + len(tier2), len(self.books))
+
+
+class QueryPlannerTests(unittest.TestCase):
+	def setUp(self):
+		self.planner = atlas_chat.QueryPlanner(atlas_chat._geo_matcher([{"iso2": "NG"}, {"iso2": "US"}, {"iso2": "VN"}]))
+
+	def test_plan_fields(self):
+		plan = self.planner.plan("Recommend a book by Chimamanda Ngozi Adichie set in Nigeria")
+		self.assertEqual(plan.geo_iso2, {"NG"})
+		self.assertNotIn("nigeria", plan.theme_tokens)
+		self.assertEqual(plan.authors, ("chimamanda ngozi adichie",))
+		self.assertEqual(plan.count, 1)
+
+		plan = self.planner.plan('Have you got \u201cGiovanni\u2019s Room\u201d? Two queer novels from Southeast Asia too')
+		self.assertEqual(plan.titles, ("giovanni s room",))
+		self.assertEqual(plan.geo_iso2, {"VN"})
+		self.assertIn("lesbian", plan.theme_tokens)
+		self.assertEqual(plan.count, 2)
+		self.assertEqual(self.planner.plan("queer books by the sea").authors, ())
+		self.assertEqual(self.planner.plan("recommend 12 books").count, atlas_chat.MAX_RECOMMENDATIONS)
+
+	def test_count_only_from_request_phrasing(self):
+		self.assertEqual(self.planner.plan("recommend a couple of books").count, 2)
+		self.assertEqual(self.planner.plan("give me 2 novels about grief").count, 2)
+		self.assertEqual(self.planner.plan("I read a book about grief, any more?").count, atlas_chat.MAX_RECOMMENDATIONS)
+		self.assertEqual(self.planner.plan("my friend wrote one memoir, find others").count, atlas_chat.MAX_RECOMMENDATIONS)
+
+	def test_memoized_on_normalized_text_with_lru(self):
+		first = self.planner.plan("Queer books  from Africa")
+		self.assertIs(self.planner.plan("queer books from africa "), first)
+		with mock.patch.object(atlas_chat, "ATLAS_CHAT_PLAN_CACHE", 2):
+			self.planner.plan("one")
+			self.planner.plan("two")
+		self.assertEqual(len(self.planner._cache), 2)
+		self.assertIsNot(self.planner.plan("queer books from africa"), first)
+
+	def test_validate_payload_honours_requested_count(self):
+		by_id = {bid: {"title": bid.upper(), "author": "A"} for bid in ("x", "y", "z")}
+		parsed = {"recommendations": [{"book_id": bid, "reason": "Fits."} for bid in by_id]}
+		self.assertEqual(len(_validate_payload(parsed, by_id, "a book", 1)["recommendations"]), 1)
+		self.assertEqual(len(_validate_payload(parsed, by_id, "books")["recommendations"]), 3)
+
+
+class LookupFastPathTests(unittest.TestCase):
+	def setUp(self):
+		self.books = [
+			atlas_chat._book_record_from_doc(bid, {"title": title, "author": author, "country_override": iso, "stamp": stamp})
+			for bid, title, author, iso, stamp in (
+				("g", "Giovanni's Room", "James Baldwin", "FR", False),
+				("f", "The Fire Next Time", "James Baldwin", "US", True),
+				("s", "Salvation", "Abdellah Taïa", "MA", False),
+				("m", "The Mother River", "Nneka Achebe", "NG", False),
+				("t", "Another Country", "James Baldwin", "US", False),
+				("l", "A Love Story", "Nneka Achebe", "NG", False),
+				("v", "Love Stories", "Ama Owusu", "NG", False),
+				("q", "Queer Romance", "Leila Slimani", "MA", False),
+			)
+		]
+		available = atlas_chat._available_countries_from_iso2({"FR", "US", "MA", "NG"})
+		self.catalog = atlas_chat._build_catalog_snapshot(self.books, {b["id"]: b for b in self.books}, available, 0.0)
+
+	def _answer(self, text):
+		plan = self.catalog.query_planner().plan(text)
+		return atlas_chat._lookup_recommendations(self.books, self.catalog.lookup_index(), plan)
+
+	def test_title_lookup(self):
+		for text in ("Do you have Giovanni's Room?", "giovannis room by james baldwin", 'Is "Giovanni\u2019s Room" in here'):
+			answer = self._answer(text)
+			self.assertEqual([r["book_id"] for r in answer["recommendations"]], ["g"], text)
+			self.assertEqual(answer["lookup"]["kind"], "title")
+		self.assertIsNone(self._answer("do you have Giovanni's Room by Nneka Achebe"))
+
+	def test_author_lookup(self):
+		answer = self._answer("anything by Abdellah Taia")
+		self.assertEqual([r["book_id"] for r in answer["recommendations"]], ["s"])
+		answer = self._answer("books by james baldwin")
+		self.assertEqual([r["book_id"] for r in answer["recommendations"]], ["f", "t", "g"])
+		self.assertEqual(self._answer("a book by James Baldwin")["recommendations"][0]["book_id"], "f")
+
+	def test_themed_queries_fall_through(self):
+		for text in ("queer romance from Nigeria", "memoirs", "books by james baldwin set in France"):
+			self.assertIsNone(self._answer(text), text)
+		with mock.patch.object(atlas_chat, "ATLAS_CHAT_LOOKUP_MIN", 1.5):
+			self.assertIsNone(self._answer("Do you have Giovanni's Room?"))
+
+	def test_similarity_and_descriptions_fall_through(self):
+		for text in ('books similar to "Giovanni\u2019s Room"', "something like Giovanni's Room", "more by James Baldwin", "a love story"):
+			self.assertIsNone(self._answer(text), text)
+		self.assertTrue(self.catalog.query_planner().plan("more by James Baldwin").similar)
+		self.assertEqual(self._answer('"A Love Story"')["recommendations"][0]["book_id"], "l")
+		self.assertEqual(self._answer("james baldwin")["lookup"]["kind"], "author")
+
+	def test_bare_theme_matching_a_title_falls_through(self):
+		for text in ("love stories", "Queer romance", "queer romance?"):
+			self.assertIsNone(self._answer(text), text)
+		for text in ('"Love Stories"', "do you have love stories?", "queer romance by leila slimani"):
+			self.assertEqual(self._answer(text)["lookup"]["kind"], "title", text)
+		self.assertEqual(self._answer("do you have queer romance")["recommendations"][0]["book_id"], "q")
+
+	def test_chat_answers_lookup_without_the_model(self):
+		with mock.patch.object(atlas_chat, "_load_atlas_catalog", return_value=self.catalog), \
+				mock.patch.dict(atlas_chat.os.environ, {"OPENAI_API_KEY": ""}), \
+				mock.patch.object(atlas_chat, "_recommend_with_llm") as recommend:
+			resp = atlas_chat.atlasChat(_post_request({"messages": [{"role": "user", "content": "do you have salvation?"}], "debug": True}))
+		recommend.assert_not_called()
+		payload = json.loads(resp.get_data())
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual([r["book_id"] for r in payload["recommendations"]], ["s"])
+		self.assertIn("**Salvation** by Abdellah Taïa", payload["assistant_markdown"])
+		self.assertEqual(payload["debug"]["candidate_pass"], "lookup")
+
+	def test_planner_failure_gets_the_chat_error_body(self):
+		with mock.patch.object(atlas_chat, "_load_atlas_catalog", return_value=self.catalog), \
+				mock.patch.object(atlas_chat.QueryPlanner, "plan", side_effect=RuntimeError("boom")), \
+				self.assertLogs(atlas_chat.logger, level="ERROR"):
+			resp = atlas_chat.atlasChat(_post_request({"messages": [{"role": "user", "content": "memoirs"}]}))
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(resp.headers["Access-Control-Allow-Origin"], "*")
+		self.assertEqual(json.loads(resp.get_data())["recommendations"], [])
+
+	def test_lookup_failure_gets_the_chat_error_body(self):
+		with mock.patch.object(atlas_chat, "_load_atlas_catalog", return_value=self.catalog), \
+				mock.patch.object(atlas_chat, "LookupIndex", side_effect=MemoryError), \
+				self.assertLogs(atlas_chat.logger, level="ERROR"):
+			resp = atlas_chat.atlasChat(_post_request({"messages": [{"role": "user", "content": "do you have salvation?"}]}))
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(resp.headers["Access-Control-Allow-Origin"], "*")
+		self.assertIn("went wrong", json.loads(resp.get_data())["assistant_markdown"])
+
+
+class TypeaheadTests(unittest.TestCase):
+	def setUp(self):
+		books = [
+			atlas_chat._book_record_from_doc(bid, {"title": title, "author": author, "tags": tags, "country_override": iso, "stamp": stamp})
+			for bid, title, author, tags, iso, stamp in (
+				("g", "Giovanni's Room", "James Baldwin", ["Classic"], "FR", False),
+				("r", "Roommates", "Ana Ruiz", ["Romance"], "MX", False),
+				("s", "Salvation", "Abdellah Taïa", ["Memoir"], "MA", True),
+				("p", "Pedro Páramo", "Juan Rulfo", ["Classic"], "MX", False),
+			)
+		]
+		self.catalog = atlas_chat._build_catalog_snapshot(books, {b["id"]: b for b in books}, [], 0.0)
+		patcher = mock.patch.object(atlas_chat, "_load_atlas_catalog", return_value=self.catalog)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def _search(self, query):
+		payload = json.loads(atlas_chat.atlasSearch(_get_request(query)).get_data())
+		return payload
+
+	def test_prefix_matches_every_field(self):
+		self.assertEqual([r["book"]["id"] for r in self._search("/?q=room")["results"]], ["g", "r"])
+		self.assertEqual([r["book"]["id"] for r in self._search("/?q=taï")["results"]], ["s"])
+		self.assertEqual([r["book"]["id"] for r in self._search("/?q=mexico")["results"]], ["p", "r"])
+		self.assertEqual([r["book"]["id"] for r in self._search("/?q=class%20bald")["results"]], ["g"])
+		self.assertEqual(self._search("/?q=c&k=5")["results"], [])
+
+	def test_highlights_point_into_original_strings(self):
+		result = self._search("/?q=pedro%20par")["results"][0]
+		self.assertEqual(result["highlights"]["title"], [[0, 5], [6, 9]])
+		self.assertEqual("Pedro Páramo"[6:9], "Pár")
+		result = self._search("/?q=memo")["results"][0]
+		self.assertEqual(result["highlights"]["tags"], [[0, 0, 4]])
+
+	def test_fuzzy_word_correction(self):
+		self.assertEqual([r["book"]["id"] for r in self._search("/?q=giovani%20bald")["results"]], ["g"])
+		self.assertEqual([r["book"]["id"] for r in self._search("/?q=rooom")["results"]], ["g", "r"])
+
+	def test_slim_shape_and_limits(self):
+		payload = self._search("/?q=room&k=1")
+		self.assertEqual(payload["count"], 1)
+		self.assertIn("has_blurb", payload["results"][0]["book"])
+		self.assertNotIn("summary", payload["results"][0]["book"])
+		self.assertEqual(atlas_chat.atlasSearch(_get_request("/?q=room&k=x")).status_code, 400)
+
+
 class FullCatalogRetryTests(unittest.TestCase):
 	def test_retry_when_tiered_returns_no_recommendations(self):
 		clean = {"recommendations": [], "assistant_markdown": "No match."}
@@ -168,5 +482,798 @@ class AtlasCatalogTests(unittest.TestCase):
 		self.assertEqual(rec["google_books_url"], "https://books.google.com/books?id=rvePDwAAQBAJ")
 
 
+def _get_request(path="/", headers=None):
+	return https_fn.Request(EnvironBuilder(path=path, method="GET", headers=headers or {}).get_environ())
+
+
+class CatalogResponseTests(unittest.TestCase):
+	def setUp(self):
+		self.items = [{"id": "a", "title": "Alpha", "author": "A", "summary": "Queer romance " * 40}]
+		catalog = atlas_chat._build_catalog_snapshot(self.items, {}, [], time.time())
+		patcher = mock.patch.object(atlas_chat, "_load_atlas_catalog", return_value=catalog)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def test_gzip_body_and_etag(self):
+		resp = atlas_chat.atlasCatalog(_get_request(headers={"Accept-Encoding": "gzip"}))
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(resp.headers["Content-Encoding"], "gzip")
+		self.assertIn("max-age", resp.headers["Cache-Control"])
+		payload = json.loads(gzip.decompress(resp.get_data()))
+		self.assertEqual(payload["count"], 1)
+		self.assertEqual(payload["books"][0]["id"], "a")
+		self.assertTrue(resp.headers["ETag"].startswith('"'))
+		self.assertTrue(resp.headers["ETag"].endswith('-gz"'))
+
+	def test_identity_when_not_accepted(self):
+		resp = atlas_chat.atlasCatalog(_get_request(headers={"Accept-Encoding": "gzip;q=0"}))
+		self.assertNotIn("Content-Encoding", resp.headers)
+		self.assertEqual(json.loads(resp.get_data())["count"], 1)
+
+	def test_matching_etag_returns_304(self):
+		first = atlas_chat.atlasCatalog(_get_request())
+		second = atlas_chat.atlasCatalog(_get_request(headers={"If-None-Match": first.headers["ETag"]}))
+		self.assertEqual(second.status_code, 304)
+		self.assertEqual(second.get_data(), b"")
+
+	def test_unloaded_catalog_is_not_cached(self):
+		unloaded = atlas_chat.CatalogSnapshot(0, 0.0, (), {}, (), atlas_chat.OrderedDict(), 0, {})
+		with mock.patch.object(atlas_chat, "_load_atlas_catalog", return_value=unloaded):
+			resp = atlas_chat.atlasCatalog(_get_request())
+		self.assertEqual(resp.status_code, 503)
+		self.assertEqual(resp.headers["Cache-Control"], "no-store")
+		self.assertEqual(resp.headers["Access-Control-Allow-Origin"], "*")
+
+		empty = atlas_chat._build_catalog_snapshot([], {}, [], time.time())
+		with mock.patch.object(atlas_chat, "_load_atlas_catalog", return_value=empty):
+			resp = atlas_chat.atlasCatalog(_get_request())
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(resp.headers["Cache-Control"], "no-store")
+
+	def test_each_encoding_has_its_own_etag(self):
+		tags = {
+			enc: atlas_chat.atlasCatalog(_get_request(headers={"Accept-Encoding": enc})).headers["ETag"]
+			for enc in ("identity", "gzip")
+		}
+		self.assertEqual(tags["gzip"], tags["identity"][:-1] + '-gz"')
+		revalidated = atlas_chat.atlasCatalog(_get_request(headers={"Accept-Encoding": "identity", "If-None-Match": tags["gzip"]}))
+		self.assertEqual(revalidated.status_code, 304)
+		self.assertEqual(revalidated.headers["ETag"], tags["identity"])
+
+	def test_body_encoded_once_per_catalog(self):
+		spy = mock.Mock(wraps=atlas_chat._book_record_for_client)
+		with mock.patch.dict(atlas_chat._CLIENT_PROJECTIONS, {"full": spy}):
+			atlas_chat.atlasCatalog(_get_request())
+			atlas_chat.atlasCatalog(_get_request())
+		self.assertEqual(spy.call_count, 1)
+
+
+class CatalogDeltaTests(unittest.TestCase):
+	def setUp(self):
+		atlas_chat._ATLAS_CATALOG = atlas_chat.CatalogSnapshot(0, 0.0, (), {}, (), atlas_chat.OrderedDict(), 0, {})
+
+	def tearDown(self):
+		self.setUp()
+
+	def _publish(self, books):
+		items = [atlas_chat._book_record_from_doc(bid, {"title": bid}, ms) for bid, ms in books]
+		atlas_chat._publish_atlas_books(items, {b["id"]: b for b in items}, [], 1_700_000_000.0)
+		return items
+
+	def _get(self, since):
+		with mock.patch.object(atlas_chat, "_load_atlas_catalog", side_effect=atlas_chat._current_catalog):
+			resp = atlas_chat.atlasCatalog(_get_request(f"/?since={since}"))
+		return json.loads(resp.get_data())
+
+	def test_version_tracks_newest_update(self):
+		self._publish([("a", 100), ("b", 200)])
+		self.assertEqual(atlas_chat._current_catalog().version, 200)
+
+	def test_delta_returns_upserts_and_deletes(self):
+		self._publish([("a", 100), ("b", 200), ("c", 300), ("d", 300)])
+		self._publish([("a", 100), ("b", 400), ("c", 300)])
+		payload = self._get(300)
+		self.assertTrue(payload["delta"])
+		self.assertEqual([b["id"] for b in payload["upserts"]], ["b"])
+		self.assertEqual(payload["deletes"], ["d"])
+		self.assertEqual(payload["count"], 3)
+		self.assertEqual(payload["version"], 401)
+
+	def test_first_load_cannot_answer_older_cursors(self):
+		self._publish([("a", 100), ("c", 300)])
+		self.assertNotIn("delta", self._get(150))
+		self.assertTrue(self._get(300)["delta"])
+
+	def test_full_snapshot_when_history_evicted(self):
+		self._publish([("a", 100), ("b", 200), ("c", 200)])
+		with mock.patch.object(atlas_chat, "ATLAS_CATALOG_TOMBSTONE_LIMIT", 0):
+			self._publish([("a", 100), ("c", 200)])
+		payload = self._get(200)
+		self.assertNotIn("delta", payload)
+		self.assertEqual(payload["count"], 2)
+		self.assertEqual(payload["version"], atlas_chat._current_catalog().version)
+
+
+class CountryBucketTests(unittest.TestCase):
+	def setUp(self):
+		items = [
+			atlas_chat._book_record_from_doc("z", {"title": "Zami", "country_override": "US"}),
+			atlas_chat._book_record_from_doc("g", {"title": "giovanni's Room", "setting_country": ["FR"], "author_country": ["US"]}),
+			atlas_chat._book_record_from_doc("m", {"title": "Maurice", "country_override": "GB"}),
+		]
+		catalog = atlas_chat._build_catalog_snapshot(items, {b["id"]: b for b in items}, [], time.time())
+		patcher = mock.patch.object(atlas_chat, "_load_atlas_catalog", return_value=catalog)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def test_bucket_sorted_by_title(self):
+		resp = atlas_chat.atlasCatalog(_get_request("/?iso2=us"))
+		payload = json.loads(resp.get_data())
+		self.assertEqual(payload["iso2"], "US")
+		self.assertEqual([b["id"] for b in payload["books"]], ["g", "z"])
+		self.assertIn("ETag", resp.headers)
+
+	def test_prebuild_encodes_lite_buckets(self):
+		catalog = atlas_chat._load_atlas_catalog()
+		atlas_chat._prebuild_catalog(catalog)
+		with mock.patch.object(atlas_chat, "_encode_json_body") as encode:
+			resp = atlas_chat.atlasCatalog(_get_request("/?iso2=FR&fields=lite"))
+		encode.assert_not_called()
+		self.assertEqual([b["id"] for b in json.loads(resp.get_data())["books"]], ["g"])
+
+	def test_unknown_country_is_empty(self):
+		payload = json.loads(atlas_chat.atlasCatalog(_get_request("/?iso2=KE")).get_data())
+		self.assertEqual(payload["books"], [])
+
+	def test_invalid_iso2_rejected(self):
+		self.assertEqual(atlas_chat.atlasCatalog(_get_request("/?iso2=USA")).status_code, 400)
+
+
+class CatalogFilterTests(unittest.TestCase):
+	def setUp(self):
+		items = [
+			atlas_chat._book_record_from_doc("z", {"title": "Zami", "country_override": "US", "tags": ["Memoir"], "stamp": True}),
+			atlas_chat._book_record_from_doc("g", {"title": "Giovanni's Room", "setting_country": ["FR"], "tags": ["Memoir"]}),
+			atlas_chat._book_record_from_doc("m", {"title": "Maurice", "country_override": "GB", "tags": ["Romance"], "read": True}),
+			atlas_chat._book_record_from_doc("o", {"title": "Orlando", "country_override": ["GB", "US"], "tags": ["Fantasy", "memoir"]}),
+		]
+		self.catalog = atlas_chat._build_catalog_snapshot(items, {b["id"]: b for b in items}, [], time.time())
+		patcher = mock.patch.object(atlas_chat, "_load_atlas_catalog", return_value=self.catalog)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def _ids(self, query):
+		payload = json.loads(atlas_chat.atlasCatalog(_get_request(query)).get_data())
+		return sorted(b["id"] for b in payload["books"])
+
+	def test_facet_bitmaps(self):
+		facets = self.catalog.facet_bitmaps()
+		self.assertEqual(_bits_to_ordinals(facets.get("override", "GB")), [2, 3])
+		self.assertEqual(_bits_to_ordinals(facets.get("setting", "FR")), [1])
+		self.assertEqual(_bits_to_ordinals(facets.get("tag", "memoir")), [0, 1, 3])
+		self.assertEqual(_bits_to_ordinals(facets.get("flag", "read")), [2])
+		self.assertEqual(_bits_to_ordinals(facets.present("override")), [0, 2, 3])
+
+	def test_filters_combine_like_the_list_view(self):
+		self.assertEqual(self._ids("/?country=us"), ["o", "z"])
+		self.assertEqual(self._ids("/?tags=memoir"), ["o", "z"])
+		self.assertEqual(self._ids("/?tags=Romance,fantasy"), ["m", "o"])
+		self.assertEqual(self._ids("/?country=GB&tags=memoir"), ["o"])
+		self.assertEqual(self._ids("/?pick=1"), ["z"])
+		self.assertEqual(self._ids("/?country=KE"), [])
+
+	def test_invalid_country_rejected(self):
+		self.assertEqual(atlas_chat.atlasCatalog(_get_request("/?country=USA")).status_code, 400)
+
+	def test_filtered_bodies_encoded_once_per_filter(self):
+		with mock.patch.object(atlas_chat, "_encode_json_body", wraps=atlas_chat._encode_json_body) as encode:
+			first = atlas_chat.atlasCatalog(_get_request("/?tags=memoir,romance"))
+			second = atlas_chat.atlasCatalog(_get_request("/?tags=Romance,memoir"))
+			self.assertEqual(encode.call_count, 1)
+			self.assertEqual(first.headers["ETag"], second.headers["ETag"])
+			with mock.patch.object(atlas_chat, "ATLAS_CATALOG_FILTER_CACHE", 1):
+				self.assertEqual(self._ids("/?country=GB"), ["m", "o"])
+			self.assertEqual(encode.call_count, 1)
+
+
+class LiteCatalogTests(unittest.TestCase):
+	def setUp(self):
+		self.rec = atlas_chat._book_record_from_doc("a", {"title": "Alpha", "summary": "Long blurb " * 50})
+		by_id = {"a": self.rec}
+		catalog = atlas_chat._build_catalog_snapshot([self.rec], by_id, [], time.time())
+		patcher = mock.patch.object(atlas_chat, "_load_atlas_catalog", return_value=catalog)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def test_lite_projection_drops_long_text(self):
+		payload = json.loads(atlas_chat.atlasCatalog(_get_request("/?fields=lite")).get_data())
+		book = payload["books"][0]
+		self.assertNotIn("summary", book)
+		self.assertNotIn("description", book)
+		self.assertTrue(book["has_blurb"])
+		self.assertEqual(book["title"], "Alpha")
+
+	def test_unknown_projection_rejected(self):
+		self.assertEqual(atlas_chat.atlasCatalog(_get_request("/?fields=everything")).status_code, 400)
+
+	def test_book_detail_returns_long_text(self):
+		resp = atlas_chat.atlasBook(_get_request("/?id=a"))
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(json.loads(resp.get_data())["book"]["summary"], self.rec["summary"])
+
+	def test_book_detail_encoded_once(self):
+		with mock.patch.object(atlas_chat, "_encode_json_body", wraps=atlas_chat._encode_json_body) as encode:
+			first = atlas_chat.atlasBook(_get_request("/?id=a"))
+			second = atlas_chat.atlasBook(_get_request("/?id=a", headers={"If-None-Match": first.headers["ETag"]}))
+		self.assertEqual(second.status_code, 304)
+		self.assertEqual(encode.call_count, 1)
+
+	def test_book_detail_missing_id(self):
+		self.assertEqual(atlas_chat.atlasBook(_get_request("/?id=nope")).status_code, 404)
+		self.assertEqual(atlas_chat.atlasBook(_get_request("/")).status_code, 400)
+
+
+class _FakeQuery:
+	def __init__(self, docs):
+		self.docs = docs
+		self.selected = None
+
+	def select(self, fields):
+		self.selected = tuple(fields)
+		return self
+
+	def stream(self):
+		return iter(self.docs)
+
+
+def _fake_doc(bid, data, nested=False):
+	parent = SimpleNamespace(parent=SimpleNamespace() if nested else None)
+	return SimpleNamespace(id=bid, to_dict=lambda: data, reference=SimpleNamespace(parent=parent), update_time=None)
+
+
+class CatalogIngestionTests(unittest.TestCase):
+	def test_sequential_read_requests_only_mapped_fields(self):
+		query = _FakeQuery([_fake_doc("a", {"title": "Alpha"})])
+		db = SimpleNamespace(collection=lambda name: query)
+		with mock.patch.object(atlas_chat, "_get_db", return_value=db):
+			items = atlas_chat._read_atlas_books()
+		self.assertEqual([b["id"] for b in items], ["a"])
+		self.assertEqual(query.selected, atlas_chat.ATLAS_BOOK_FIELDS)
+
+	def test_partitioned_read_keeps_order_and_skips_nested(self):
+		parts = [
+			_FakeQuery([_fake_doc("a", {"title": "Alpha"}), _fake_doc("b", {"title": "Nested"}, nested=True)]),
+			_FakeQuery([_fake_doc("c", {"title": "Gamma"})]),
+		]
+		group = SimpleNamespace(get_partitions=lambda n: [SimpleNamespace(query=lambda q=q: q) for q in parts])
+		db = SimpleNamespace(collection_group=lambda name: group)
+		with mock.patch.object(atlas_chat, "_get_db", return_value=db), \
+			mock.patch.object(atlas_chat, "ATLAS_CATALOG_READ_PARTITIONS", 4):
+			items = atlas_chat._read_atlas_books()
+		self.assertEqual([b["id"] for b in items], ["a", "c"])
+		self.assertTrue(all(q.selected == atlas_chat.ATLAS_BOOK_FIELDS for q in parts))
+
+
+class CompactBookStoreTests(unittest.TestCase):
+	def test_records_share_interned_vocabularies(self):
+		a = atlas_chat._book_record_from_doc("a", {"title": "A", "tags": ["Gay", "Memoir"], "country_override": "US"})
+		b = atlas_chat._book_record_from_doc("b", {"title": "B", "tags": ["Gay", "Memoir"], "country_override": "US"})
+		self.assertIs(a["tags"], b["tags"])
+		self.assertIs(a["_iso2_sets"], b["_iso2_sets"])
+		self.assertIs(a["_places"], b["_places"])
+		self.assertEqual(a["_iso2_sets"]["any"], frozenset({"US"}))
+		self.assertFalse(hasattr(a, "__dict__"))
+
+	def test_publish_prunes_shared_tables(self):
+		self.addCleanup(setattr, atlas_chat, "_ATLAS_CATALOG", atlas_chat._ATLAS_CATALOG)
+		old = atlas_chat._book_record_from_doc("a", {"title": "A", "tags": ["Zine"], "country_override": "TV"})
+		kept = atlas_chat._book_record_from_doc("b", {"title": "B", "tags": ["Memoir"], "country_override": "US"})
+		atlas_chat._publish_atlas_books([old, kept], {"a": old, "b": kept}, [], time.time())
+		atlas_chat._publish_atlas_books([kept], {"b": kept}, [], time.time())
+
+		self.assertNotIn("Zine", atlas_chat._TAG_VOCAB.ids)
+		self.assertNotIn("TV", atlas_chat._SHARED_PLACE_ENTRIES)
+		self.assertNotIn(old["_places"], [hit[0] for hit in atlas_chat._SHARED_GEO.values()])
+		again = atlas_chat._book_record_from_doc("c", {"title": "C", "tags": ["Memoir"], "country_override": "US"})
+		self.assertIs(again["tags"], kept["tags"])
+		self.assertIs(again["_places"], kept["_places"])
+		readded = atlas_chat._book_record_from_doc("d", {"title": "D", "tags": ["Zine"], "country_override": "TV"})
+		self.assertEqual(readded["tags"], ("Zine",))
+		self.assertEqual(readded["_iso2_sets"]["any"], frozenset({"TV"}))
+
+	def test_record_mapping_api(self):
+		rec = atlas_chat._book_record_from_doc("a", {"title": "A", "summary": "Same", "description": "Same"})
+		self.assertEqual(rec.get("title"), "A")
+		self.assertIsNone(rec.get("missing"))
+		self.assertEqual(rec.get("missing", "x"), "x")
+		self.assertIs(rec["description"], rec["summary"])
+		self.assertNotIn("_blob", rec)
+		with self.assertRaises(KeyError):
+			rec["missing"]
+
+	def test_folded_fields_precomputed(self):
+		rec = atlas_chat._book_record_from_doc("a", {"title": "Pedro Páramo", "author": "Juan Rulfo", "setting_country": ["México"]})
+		self.assertEqual(rec["_title_norm"], "pedro paramo")
+		self.assertEqual(rec["_author_norm"], "juan rulfo")
+		self.assertEqual(atlas_chat._search_fields(rec)["places"], ["mx", "mexico"])
+
+	def test_accented_query_matches_country(self):
+		available = [{"iso2": "MX", "name": "Mexico"}, {"iso2": "FR", "name": "France"}]
+		self.assertEqual(atlas_chat._infer_geo_iso2_from_query("novelas de México", available), {"MX"})
+		self.assertEqual(atlas_chat._tokenize_query("Novelas de Páramo"), ["novelas", "de", "paramo"])
+
+	def test_client_record_from_compact_store(self):
+		rec = atlas_chat._book_record_from_doc("a", {"title": "A", "tags": ["Gay"], "setting_country": ["France"]})
+		client = _book_record_for_client(rec)
+		self.assertEqual(client["tags"], ["Gay"])
+		self.assertEqual(client["setting_country"], ["France"])
+
+
+def _fake_change(kind, bid, data=None):
+	doc = SimpleNamespace(id=bid, to_dict=lambda: data)
+	return SimpleNamespace(type=SimpleNamespace(name=kind), document=doc)
+
+
+def _post_request(body):
+	return https_fn.Request(EnvironBuilder(path="/", method="POST", json=body).get_environ())
+
+
+class CatalogSnapshotTests(unittest.TestCase):
+	def tearDown(self):
+		atlas_chat._ATLAS_CATALOG = atlas_chat.CatalogSnapshot(0, 0.0, (), {}, (), atlas_chat.OrderedDict(), 0, {})
+
+	def _records(self, *ids):
+		items = [atlas_chat._book_record_from_doc(bid, {"title": bid.title(), "country_override": "US"}, 100) for bid in ids]
+		return items, {b["id"]: b for b in items}
+
+	def test_pinned_snapshot_survives_publish(self):
+		items, by_id = self._records("a", "b")
+		pinned = atlas_chat._publish_atlas_books(items, by_id, [], time.time())
+		items2, by_id2 = self._records("a")
+		latest = atlas_chat._publish_atlas_books(items2, by_id2, [], time.time())
+		self.assertEqual([b["id"] for b in pinned.books], ["a", "b"])
+		self.assertIn("b", pinned.by_id)
+		self.assertEqual(dict(latest.tombstones), {"b": latest.version})
+		self.assertEqual(dict(pinned.tombstones), {})
+		self.assertIs(atlas_chat._current_catalog(), latest)
+
+	def test_reload_publishes_with_indexes_built(self):
+		items, by_id = self._records("a", "b")
+		first = atlas_chat._publish_atlas_books(items, by_id, [], time.time())
+		self.assertEqual(first._derived, {})
+		seen = []
+		real_prebuild = atlas_chat._prebuild_catalog
+
+		def prebuild(catalog, steps=None):
+			seen.append(atlas_chat._current_catalog())
+			return real_prebuild(catalog, steps)
+
+		with mock.patch.object(atlas_chat, "_prebuild_catalog", side_effect=prebuild):
+			latest = atlas_chat._publish_atlas_books(items[:1], {"a": items[0]}, [], time.time())
+		self.assertEqual(seen, [first])
+		self.assertTrue({"search", "typeahead", "lookup", "planner"} <= set(latest._derived))
+		self.assertIn("lite", latest._encoded)
+
+	def test_index_builds_do_not_block_other_keys(self):
+		items, by_id = self._records("a")
+		snapshot = atlas_chat._build_catalog_snapshot(items, by_id, [], 0.0)
+		done = []
+
+		def build(_books):
+			worker = threading.Thread(target=lambda: done.append(snapshot.encoded_catalog("lite")))
+			worker.start()
+			worker.join(timeout=5)
+			return len(done)
+
+		self.assertEqual(snapshot.derived("slow", build), 1)
+
+	def test_snapshot_is_read_only(self):
+		items, by_id = self._records("a")
+		snapshot = atlas_chat._publish_atlas_books(items, by_id, [], time.time())
+		by_id["z"] = items[0]
+		self.assertNotIn("z", snapshot.by_id)
+		with self.assertRaises(TypeError):
+			snapshot.by_id["z"] = items[0]
+		with self.assertRaises(AttributeError):
+			snapshot.books.append(items[0])
+
+	def test_chat_request_uses_one_snapshot(self):
+		items, by_id = self._records("a", "b")
+		atlas_chat._publish_atlas_books(items, by_id, [], time.time())
+		others, other_by_id = self._records("c")
+
+		def recommend(**kwargs):
+			# A reload lands mid-request; validation must still see the pinned catalog.
+			atlas_chat._publish_atlas_books(others, other_by_id, [], time.time())
+			return {"assistant_markdown": "Try **A**.", "recommendations": [{"book_id": "a", "reason": "fits"}]}
+
+		with mock.patch.dict(atlas_chat.os.environ, {"OPENAI_API_KEY": "k"}), \
+				mock.patch.object(atlas_chat, "_load_atlas_catalog", side_effect=atlas_chat._current_catalog), \
+				mock.patch.object(atlas_chat, "_recommend_with_llm", side_effect=recommend):
+			resp = atlas_chat.atlasChat(_post_request({"messages": [{"role": "user", "content": "something"}]}))
+		payload = json.loads(resp.get_data())
+		self.assertEqual([r["book_id"] for r in payload["recommendations"]], ["a"])
+		self.assertEqual(payload["books"][0]["title"], "A")
+
+
+class WarmupTests(unittest.TestCase):
+	def setUp(self):
+		items = [atlas_chat._book_record_from_doc("a", {"title": "Alpha", "country_override": "US"}, 100)]
+		self.catalog = atlas_chat._build_catalog_snapshot(items, {"a": items[0]}, [], time.time())
+		for target, kwargs in (
+			("_get_db", {"return_value": object()}),
+			("_load_atlas_catalog", {"return_value": self.catalog}),
+			("_ATLAS_WARMUP_REPORT", {"new": {}}),
+		):
+			patcher = mock.patch.object(atlas_chat, target, **kwargs)
+			patcher.start()
+			self.addCleanup(patcher.stop)
+
+	def test_warm_endpoint_reports_step_timings(self):
+		payload = json.loads(atlas_chat.atlasWarm(_get_request()).get_data())
+		self.assertTrue(payload["ok"])
+		self.assertEqual(payload["books"], 1)
+		self.assertEqual(
+			[step["step"] for step in payload["steps"]],
+			["firestore_client", "catalog"] + [name for name, _ in atlas_chat._WARMUP_STEPS],
+		)
+		self.assertTrue(all(step["ms"] >= 0 for step in payload["steps"]))
+		self.assertFalse(payload["warm_start"])
+		self.assertIn("full", self.catalog._encoded)
+		self.assertIn("search", self.catalog._derived)
+
+		again = json.loads(atlas_chat.atlasWarm(_get_request()).get_data())
+		self.assertTrue(again["warm_start"])
+
+	def test_non_firestore_source_skips_the_client(self):
+		with mock.patch.object(atlas_chat, "_ATLAS_CATALOG_SOURCE", atlas_chat.MemoryCatalogSource([])), \
+				mock.patch.object(atlas_chat, "_get_db") as get_db:
+			payload = json.loads(atlas_chat.atlasWarm(_get_request()).get_data())
+		get_db.assert_not_called()
+		self.assertEqual(payload["steps"][0]["step"], "catalog")
+
+	def test_empty_catalog_is_not_warm(self):
+		empty = atlas_chat._build_catalog_snapshot([], {}, [], 0.0)
+		with mock.patch.object(atlas_chat, "_load_atlas_catalog", return_value=empty):
+			resp = atlas_chat.atlasWarm(_get_request())
+		self.assertEqual(resp.status_code, 503)
+		self.assertEqual(resp.headers["Cache-Control"], "no-store")
+
+	def test_import_warmup_only_when_serving(self):
+		with mock.patch.object(atlas_chat, "ATLAS_WARMUP_ON_IMPORT", True), \
+				mock.patch.object(atlas_chat, "_start_instance_warmup", return_value=True) as start, \
+				mock.patch.dict(atlas_chat.os.environ, {}, clear=True):
+			self.assertFalse(atlas_chat.warm_on_import())
+			start.assert_not_called()
+			atlas_chat.os.environ["K_SERVICE"] = "atlascatalogaggregate"
+			atlas_chat.os.environ["FUNCTION_TARGET"] = "atlasCatalogAggregate"
+			self.assertFalse(atlas_chat.warm_on_import())
+			start.assert_not_called()
+			atlas_chat.os.environ["K_SERVICE"] = "atlaschat"
+			atlas_chat.os.environ["FUNCTION_TARGET"] = "atlasChat"
+			self.assertTrue(atlas_chat.warm_on_import())
+			start.assert_called_once()
+
+
+class _FakeShardStore:
+	"""Just enough of the Firestore client for the aggregate shard read/write paths."""
+
+	def __init__(self):
+		self.docs = {}
+		self.writes = 0
+
+	def collection(self, name):
+		return SimpleNamespace(document=lambda doc_id: SimpleNamespace(id=doc_id, get=lambda transaction=None: self._snap(doc_id)))
+
+	def _snap(self, doc_id):
+		data, ms = self.docs.get(doc_id, (None, 0))
+		stamp = SimpleNamespace(timestamp=lambda: ms / 1000)
+		return SimpleNamespace(id=doc_id, exists=data is not None, to_dict=lambda: data, update_time=stamp)
+
+	def set(self, ref, data):
+		self.writes += 1
+		self.docs[ref.id] = (data, 1000 * self.writes)
+
+	def get_all(self, refs):
+		return [self._snap(ref.id) for ref in refs]
+
+	def batch(self):
+		return SimpleNamespace(set=self.set, commit=lambda: None)
+
+
+class CatalogAggregateTests(unittest.TestCase):
+	def setUp(self):
+		self.store = _FakeShardStore()
+		self.books = [
+			atlas_chat._book_record_from_doc("b", {"title": "Pedro Páramo", "setting_country": ["México"], "tags": ["Classic"]}, 200),
+			atlas_chat._book_record_from_doc("a", {"title": "Zami", "country_override": "US", "summary": "Memoir"}, 100),
+		]
+		for target, kwargs in (
+			("_get_db", {"return_value": self.store}),
+			("_read_atlas_books", {"return_value": self.books}),
+			("ATLAS_CATALOG_AGGREGATE_SHARDS", {"new": 4}),
+		):
+			patcher = mock.patch.object(atlas_chat, target, **kwargs)
+			patcher.start()
+			self.addCleanup(patcher.stop)
+		atlas_chat._ATLAS_AGGREGATE_SHARD_CACHE.clear()
+		self.addCleanup(atlas_chat._ATLAS_AGGREGATE_SHARD_CACHE.clear)
+
+	def test_rebuild_round_trips_records(self):
+		self.assertEqual(atlas_aggregate._rebuild_catalog_aggregates(), 2)
+		self.assertEqual(len(self.store.docs), 4)
+		items = atlas_chat._read_atlas_books_from_aggregates()
+		self.assertEqual([b["id"] for b in items], ["a", "b"])
+		loaded = {b["id"]: b for b in items}
+		for rec in self.books:
+			for key in ("title", "summary", "tags", "_title_norm", "_iso2_sets", "_updated_ms"):
+				self.assertEqual(loaded[rec["id"]][key], rec[key])
+		self.assertEqual(loaded["b"]["_iso2_sets"]["setting"], frozenset({"MX"}))
+		self.assertNotIn("_blob", atlas_chat._aggregate_entry(self.books[0]))
+
+	def test_unchanged_shards_reuse_records(self):
+		atlas_aggregate._rebuild_catalog_aggregates()
+		first = {b["id"]: b for b in atlas_chat._read_atlas_books_from_aggregates()}
+		second = {b["id"]: b for b in atlas_chat._read_atlas_books_from_aggregates()}
+		self.assertIs(first["a"], second["a"])
+
+	def test_unchanged_shards_keep_the_published_snapshot(self):
+		atlas_aggregate._rebuild_catalog_aggregates()
+		self.addCleanup(setattr, atlas_chat, "_ATLAS_CATALOG", atlas_chat._ATLAS_CATALOG)
+		with mock.patch.object(atlas_chat, "ATLAS_CATALOG_AGGREGATE", True), \
+				mock.patch.object(atlas_chat, "_ATLAS_CATALOG_SOURCE", atlas_chat.FirestoreCatalogSource()):
+			self.assertTrue(atlas_chat._stream_atlas_books())
+			published = atlas_chat._current_catalog()
+			published.loaded_at -= 100
+			with mock.patch.object(atlas_chat, "_prebuild_catalog") as prebuild:
+				self.assertTrue(atlas_chat._stream_atlas_books())
+				prebuild.assert_not_called()
+			self.assertIs(atlas_chat._current_catalog(), published)
+			self.assertLess(atlas_chat._atlas_books_age(), 5)
+
+			ref = self.store.collection("x").document(atlas_chat._aggregate_shard_id("a"))
+			entry = atlas_chat._aggregate_entry(atlas_chat._book_record_from_doc("a", {"title": "Zami 2"}, 300))
+			atlas_aggregate._write_aggregate_entry.to_wrap(self.store, ref, "a", entry, 300)
+			self.assertTrue(atlas_chat._stream_atlas_books())
+			self.assertEqual(atlas_chat._current_catalog().by_id["a"]["title"], "Zami 2")
+
+	def test_trigger_write_ignores_older_events(self):
+		atlas_aggregate._rebuild_catalog_aggregates()
+		write = atlas_aggregate._write_aggregate_entry.to_wrap
+		ref = self.store.collection("x").document(atlas_chat._aggregate_shard_id("a"))
+		newer = atlas_chat._aggregate_entry(atlas_chat._book_record_from_doc("a", {"title": "Zami 2"}, 300))
+		self.assertTrue(write(self.store, ref, "a", newer, 300))
+		older = atlas_chat._aggregate_entry(atlas_chat._book_record_from_doc("a", {"title": "Zami 0"}, 50))
+		self.assertFalse(write(self.store, ref, "a", older, 50))
+		loaded = {b["id"]: b for b in atlas_chat._read_atlas_books_from_aggregates()}
+		self.assertEqual(loaded["a"]["title"], "Zami 2")
+
+		self.assertTrue(write(self.store, ref, "a", None, 500))
+		self.assertNotIn("a", {b["id"] for b in atlas_chat._read_atlas_books_from_aggregates()})
+
+	def test_deletion_marker_blocks_late_older_upserts(self):
+		atlas_aggregate._rebuild_catalog_aggregates()
+		write = atlas_aggregate._write_aggregate_entry.to_wrap
+		ref = self.store.collection("x").document(atlas_chat._aggregate_shard_id("a"))
+		late = atlas_chat._aggregate_entry(atlas_chat._book_record_from_doc("a", {"title": "Zami"}, 450))
+		self.assertTrue(write(self.store, ref, "a", None, 500))
+		self.assertFalse(write(self.store, ref, "a", late, 450))
+		self.assertNotIn("a", {b["id"] for b in atlas_chat._read_atlas_books_from_aggregates()})
+		data = self.store.docs[ref.id][0]
+		self.assertEqual(atlas_chat._decode_aggregate_shard(data, markers=True)["a"], {"id": "a", "_deleted_ms": 500})
+
+		# A recreate after the delete wins, and markers past their TTL are pruned.
+		self.assertTrue(write(self.store, ref, "a", atlas_chat._aggregate_entry(atlas_chat._book_record_from_doc("a", {"title": "Zami 3"}, 600)), 600))
+		self.assertEqual({b["id"]: b for b in atlas_chat._read_atlas_books_from_aggregates()}["a"]["title"], "Zami 3")
+		self.assertTrue(write(self.store, ref, "c", None, 700))
+		with mock.patch.object(atlas_chat, "ATLAS_CATALOG_AGGREGATE_MARKER_TTL_SEC", 1):
+			self.assertTrue(write(self.store, ref, "d", None, 2000))
+		self.assertEqual(sorted(atlas_chat._decode_aggregate_shard(self.store.docs[ref.id][0], markers=True)), ["a", "d"])
+
+	def test_missing_or_stale_shards_fall_back_to_stream(self):
+		with mock.patch.object(atlas_chat, "ATLAS_CATALOG_AGGREGATE", True), self.assertLogs(level="WARNING"):
+			self.assertIs(atlas_chat._read_catalog_items(), self.books)
+			atlas_aggregate._rebuild_catalog_aggregates()
+			with mock.patch.object(atlas_chat, "_AGGREGATE_FORMAT", 99):
+				self.assertIs(atlas_chat._read_catalog_items(), self.books)
+			self.assertEqual([b["id"] for b in atlas_chat._read_catalog_items()], ["a", "b"])
+
+
+class CatalogSourceTests(unittest.TestCase):
+	def setUp(self):
+		self.tmp = tempfile.TemporaryDirectory()
+		self.addCleanup(self.tmp.cleanup)
+		previous = atlas_chat._get_catalog_source()
+		self.addCleanup(atlas_chat._set_catalog_source, previous, reload=False)
+		self.addCleanup(setattr, atlas_chat, "_ATLAS_CATALOG", atlas_chat._ATLAS_CATALOG)
+		self.rows = [
+			{"id": "b", "title": "Pedro Páramo", "setting_country": ["Mexico"], "_updated_ms": 200},
+			{"id": "a", "title": "Zami", "country_override": "US", "tags": ["Memoir"], "_updated_ms": 100},
+		]
+
+	def test_jsonl_gz_round_trip(self):
+		path = os.path.join(self.tmp.name, "catalog.jsonl.gz")
+		items = atlas_chat.MemoryCatalogSource(self.rows).read()
+		self.assertEqual(atlas_chat._write_catalog_file(path, items), 2)
+		source = atlas_chat.FileCatalogSource(path)
+		loaded = source.read()
+		self.assertEqual([b["id"] for b in loaded], ["a", "b"])
+		self.assertEqual(loaded[1]["_title_norm"], "pedro paramo")
+		self.assertEqual(loaded[0]["tags"], ("Memoir",))
+		self.assertIs(source.read()[0], loaded[0])
+
+	def test_unchanged_file_keeps_the_published_snapshot(self):
+		path = os.path.join(self.tmp.name, "catalog.jsonl")
+		atlas_chat._write_catalog_file(path, atlas_chat.MemoryCatalogSource(self.rows).read())
+		atlas_chat._set_catalog_source(atlas_chat.FileCatalogSource(path))
+		published = atlas_chat._current_catalog()
+		with mock.patch.object(atlas_chat, "_build_catalog_snapshot") as build:
+			self.assertTrue(atlas_chat._stream_atlas_books())
+			build.assert_not_called()
+		self.assertIs(atlas_chat._current_catalog(), published)
+
+	def test_reads_static_export_json(self):
+		path = os.path.join(self.tmp.name, "catalog.json")
+		with open(path, "w", encoding="utf-8") as f:
+			json.dump({"books": self.rows, "count": 2, "version": 200}, f)
+		self.assertEqual([b["id"] for b in atlas_chat.FileCatalogSource(path).read()], ["a", "b"])
+
+	def test_memory_source_serves_http_functions(self):
+		atlas_chat._set_catalog_source(atlas_chat.MemoryCatalogSource(self.rows))
+		payload = json.loads(atlas_chat.atlasCatalog(_get_request("/?iso2=MX")).get_data())
+		self.assertEqual([b["id"] for b in payload["books"]], ["b"])
+		self.assertEqual(payload["version"], 200)
+
+	def test_source_must_implement_read(self):
+		class NoRead(atlas_chat.CatalogSource):
+			name = "broken"
+
+		with self.assertRaises(TypeError):
+			NoRead()
+
+	def test_source_from_env(self):
+		with mock.patch.object(atlas_chat, "ATLAS_CATALOG_SOURCE", "file"), mock.patch.object(atlas_chat, "ATLAS_CATALOG_FILE", ""):
+			with self.assertRaises(ValueError):
+				atlas_chat._catalog_source_from_env()
+		with mock.patch.object(atlas_chat, "ATLAS_CATALOG_SOURCE", "memory"):
+			self.assertIsInstance(atlas_chat._catalog_source_from_env(), atlas_chat.MemoryCatalogSource)
+		self.assertIsInstance(atlas_chat._catalog_source_from_env(), atlas_chat.FirestoreCatalogSource)
+
+
+class CatalogListenerTests(unittest.TestCase):
+	def setUp(self):
+		atlas_chat._ATLAS_LISTENER_BOOKS.clear()
+		atlas_chat._ATLAS_LISTENER_ISO_COUNTS.clear()
+
+	def tearDown(self):
+		atlas_chat._ATLAS_LISTENER_BOOKS.clear()
+		atlas_chat._ATLAS_LISTENER_ISO_COUNTS.clear()
+		atlas_chat._publish_atlas_books([], {}, [], 0.0)
+		atlas_chat._ATLAS_LISTENER = None
+		atlas_chat._ATLAS_LISTENER_FAILED_AT = 0.0
+		atlas_chat._ATLAS_LISTENER_READY.clear()
+		atlas_chat._ATLAS_LISTENER_DIRTY.clear()
+
+	def test_patches_only_changed_documents(self):
+		_apply_atlas_book_changes([
+			_fake_change("ADDED", "b", {"title": "Beta", "country_override": "FR"}),
+			_fake_change("ADDED", "a", {"title": "Alpha", "country_override": "US"}),
+		])
+		untouched = atlas_chat._publish_listener_books().by_id["a"]
+
+		upserted, removed = _apply_atlas_book_changes([
+			_fake_change("MODIFIED", "b", {"title": "Beta 2", "country_override": "DE"}),
+			_fake_change("ADDED", "c", {"title": "Gamma", "country_override": "US"}),
+		])
+		self.assertEqual((upserted, removed), (2, 0))
+		catalog = atlas_chat._publish_listener_books()
+		self.assertIs(catalog.by_id["a"], untouched)
+		self.assertEqual([b["id"] for b in catalog.books], ["a", "b", "c"])
+		self.assertEqual(catalog.by_id["b"]["title"], "Beta 2")
+		self.assertEqual([c["iso2"] for c in catalog.available_countries], ["DE", "US"])
+
+	def test_removed_documents_drop_countries(self):
+		_apply_atlas_book_changes([
+			_fake_change("ADDED", "a", {"title": "Alpha", "country_override": "US"}),
+			_fake_change("ADDED", "b", {"title": "Beta", "country_override": "FR"}),
+		])
+		_apply_atlas_book_changes([_fake_change("REMOVED", "b")])
+		catalog = atlas_chat._publish_listener_books()
+		self.assertNotIn("b", catalog.by_id)
+		self.assertEqual([c["iso2"] for c in catalog.available_countries], ["US"])
+
+	def test_later_changes_are_coalesced_off_the_callback_thread(self):
+		atlas_chat._on_atlas_books_snapshot([], [_fake_change("ADDED", "a", {"title": "Alpha"})], None)
+		self.assertEqual([b["id"] for b in atlas_chat._current_catalog().books], ["a"])
+
+		published = []
+		publish = atlas_chat._publish_atlas_books
+
+		def record(*args):
+			published.append(threading.current_thread().name)
+			return publish(*args)
+
+		with mock.patch.object(atlas_chat, "ATLAS_CATALOG_LISTENER_DEBOUNCE_SEC", 0.2), \
+				mock.patch.object(atlas_chat, "_publish_atlas_books", side_effect=record):
+			for bid in ("b", "c", "d"):
+				atlas_chat._on_atlas_books_snapshot([], [_fake_change("ADDED", bid, {"title": bid})], None)
+			self.assertEqual(published, [])
+			deadline = time.time() + 5
+			while len(atlas_chat._current_catalog()) < 4 and time.time() < deadline:
+				time.sleep(0.02)
+		self.assertEqual([b["id"] for b in atlas_chat._current_catalog().books], ["a", "b", "c", "d"])
+		self.assertEqual(published, ["atlas-listener-publish"])
+
+	def test_failed_first_snapshot_falls_back_at_once(self):
+		watch = mock.Mock(is_active=True)
+
+		def on_snapshot(callback):
+			callback([], [_fake_change("ADDED", "a", {"title": "Alpha"})], None)
+			return watch
+
+		db = mock.Mock()
+		db.collection.return_value.on_snapshot.side_effect = on_snapshot
+		with mock.patch.object(atlas_chat, "_get_db", return_value=db), \
+				mock.patch.object(atlas_chat, "ATLAS_CATALOG_LISTENER_WAIT_SEC", 30):
+			started = time.time()
+			with mock.patch.object(atlas_chat, "_apply_atlas_book_changes", side_effect=ValueError("bad document")), \
+					self.assertLogs(level="WARNING"):
+				self.assertFalse(atlas_chat._ensure_atlas_books_listener())
+				self.assertFalse(atlas_chat._ensure_atlas_books_listener())
+			self.assertLess(time.time() - started, 5)
+			watch.unsubscribe.assert_called_once()
+			self.assertIsNone(atlas_chat._ATLAS_LISTENER)
+			self.assertEqual(db.collection.return_value.on_snapshot.call_count, 1)
+
+			with mock.patch.object(atlas_chat, "ATLAS_CATALOG_LISTENER_RETRY_SEC", 0):
+				self.assertTrue(atlas_chat._ensure_atlas_books_listener())
+		self.assertEqual([b["id"] for b in atlas_chat._current_catalog().books], ["a"])
+
+
+class CatalogReloadTests(unittest.TestCase):
+	def tearDown(self):
+		thread = atlas_chat._ATLAS_RELOAD_THREAD
+		if thread is not None:
+			thread.join(timeout=2)
+		atlas_chat._publish_atlas_books([], {}, [], 0.0)
+
+	def test_stale_catalog_served_while_single_reload_runs(self):
+		stale = [{"id": "old"}]
+		ttl = atlas_chat.ATLAS_CHAT_CACHE_TTL_SEC
+		atlas_chat._publish_atlas_books(stale, {"old": stale[0]}, [], time.time() - ttl - 1)
+
+		release = threading.Event()
+		calls = []
+
+		def slow_stream():
+			calls.append(1)
+			release.wait(timeout=2)
+			atlas_chat._publish_atlas_books([{"id": "new"}], {}, [], time.time())
+			return True
+
+		with mock.patch.object(atlas_chat, "_stream_atlas_books", side_effect=slow_stream):
+			first = atlas_chat._load_atlas_catalog()
+			second = atlas_chat._load_atlas_catalog()
+			self.assertEqual(first.books, tuple(stale))
+			self.assertIs(second, first)
+			release.set()
+			atlas_chat._ATLAS_RELOAD_THREAD.join(timeout=2)
+
+		self.assertEqual(len(calls), 1)
+		self.assertEqual(atlas_chat._current_catalog().books, ({"id": "new"},))
+
+	def test_past_max_staleness_blocks_on_reload(self):
+		stale = [{"id": "old"}]
+		atlas_chat._publish_atlas_books(stale, {}, [], time.time() - atlas_chat.ATLAS_CATALOG_MAX_STALE_SEC - 1)
+
+		def stream():
+			atlas_chat._publish_atlas_books([{"id": "new"}], {}, [], time.time())
+			return True
+
+		with mock.patch.object(atlas_chat, "_stream_atlas_books", side_effect=stream):
+			catalog = atlas_chat._load_atlas_catalog()
+		self.assertEqual(catalog.books, ({"id": "new"},))
+
+
 if __name__ == "__main__":
 	unittest.main()
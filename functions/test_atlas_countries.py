@@ -0,0 +1,41 @@
+import unittest
+from unittest import mock
+
+import atlas_countries
+from atlas_countries import country_string_to_iso2, extract_iso2_candidates, iso2_to_country_name
+
+
+class CountryResolverTests(unittest.TestCase):
+	def test_codes_and_names(self):
+		self.assertEqual(country_string_to_iso2("fr"), "FR")
+		self.assertEqual(country_string_to_iso2("NGA"), "NG")
+		self.assertEqual(country_string_to_iso2("Korea, Republic of"), "KR")
+		self.assertEqual(country_string_to_iso2("Plurinational State of Bolivia"), "BO")
+		self.assertEqual(country_string_to_iso2("united_states"), "US")
+
+	def test_demonyms_and_historical_spellings(self):
+		self.assertEqual(country_string_to_iso2("Nigerian"), "NG")
+		self.assertEqual(country_string_to_iso2("Burma"), "MM")
+		self.assertEqual(country_string_to_iso2("Côte d'Ivoire"), "CI")
+		self.assertEqual(country_string_to_iso2("México"), "MX")
+
+	def test_alias_table_skips_pycountry(self):
+		atlas_countries._resolve.cache_clear()
+		with mock.patch.object(atlas_countries, "_pycountry_iso2", return_value=None) as fallback:
+			self.assertEqual(country_string_to_iso2("Lebanon"), "LB")
+			self.assertIsNone(country_string_to_iso2("Atlantis"))
+		fallback.assert_called_once_with("Atlantis")
+
+	def test_extract_candidates_dedupes(self):
+		self.assertEqual(extract_iso2_candidates("France; FR / Nigeria"), ["FR", "NG"])
+		self.assertEqual(extract_iso2_candidates({"iso2": "US", "name": "United States"}), ["US"])
+		self.assertEqual(extract_iso2_candidates(("Kenya",)), ["KE"])
+
+	def test_iso2_to_country_name(self):
+		self.assertEqual(iso2_to_country_name("us"), "United States")
+		self.assertEqual(iso2_to_country_name("XK"), "XK")
+		self.assertEqual(iso2_to_country_name("USA"), "")
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+
+from atlas_geo import REGIONS, GeoMatcher
+
+
+class GeoMatcherTests(unittest.TestCase):
+	def setUp(self):
+		self.matcher = GeoMatcher(["NG", "US", "MX", "VN", "TH", "JM", "MA", "DZ", "GB", "BR", "EG"])
+
+	def _iso2(self, text):
+		return set(self.matcher.match(text).iso2)
+
+	def test_m49_subregions(self):
+		self.assertEqual(self._iso2("novels set in Southeast Asia"), {"VN", "TH"})
+		self.assertEqual(self._iso2("south east asian poetry"), {"VN", "TH"})
+		self.assertEqual(self._iso2("Caribbean memoirs"), {"JM"})
+		self.assertEqual(self._iso2("queer books from Africa"), {"NG", "MA", "DZ", "EG"})
+
+	def test_informal_regions(self):
+		self.assertEqual(self._iso2("Maghreb fiction"), {"MA", "DZ"})
+		self.assertEqual(self._iso2("middle eastern writers"), {"EG"})
+
+	def test_longest_phrase_wins(self):
+		self.assertEqual(self._iso2("latin american fiction"), {"MX", "JM", "BR"})
+		self.assertEqual(self._iso2("american fiction"), {"US"})
+
+	def test_countries_aliases_and_demonyms(self):
+		self.assertEqual(self._iso2("novelas de México"), {"MX"})
+		self.assertEqual(self._iso2("books from the UK and Nigeria"), {"GB", "NG"})
+		self.assertEqual(self._iso2("Nigerian romance"), {"NG"})
+
+	def test_ignores_language_names_and_short_words(self):
+		self.assertEqual(self._iso2("written in english"), set())
+		self.assertEqual(self._iso2("can you find trans books per author"), set())
+
+	def test_caucasian_is_not_the_caucasus(self):
+		matcher = GeoMatcher(["AM", "AZ", "GE", "US"])
+		self.assertEqual(set(matcher.match("books with caucasian leads").iso2), set())
+		self.assertEqual(set(matcher.match("novels from the Caucasus").iso2), {"AM", "AZ", "GE"})
+
+	def test_terms_only_cover_available_places(self):
+		match = self.matcher.match("queer books from Nigeria and France")
+		self.assertEqual(set(match.iso2), {"NG"})
+		self.assertEqual(set(match.terms), {"nigeria"})
+
+	def test_hierarchy_rolls_up(self):
+		self.assertTrue(REGIONS["South-eastern Asia"] < REGIONS["Asia"])
+		self.assertTrue(REGIONS["Caribbean"] < REGIONS["Latin America and the Caribbean"] < REGIONS["Americas"])
+		self.assertEqual(REGIONS["Africa"], REGIONS["Northern Africa"] | REGIONS["Sub-Saharan Africa"])
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,135 @@
+import unittest
+
+from atlas_search import (
+	BM25FIndex,
+	FacetBitmaps,
+	InvertedIndex,
+	PhraseAutomaton,
+	TrigramIndex,
+	bits_to_ordinals,
+	ordinals_to_bits,
+	union,
+)
+
+
+class InvertedIndexTests(unittest.TestCase):
+	def setUp(self):
+		self.index = InvertedIndex([
+			"queer romance in translation".split(),
+			"a trans memoir memoir".split(),
+			"memoirs of a translator".split(),
+		], min_len=2)
+
+	def test_posting_lists_are_sorted_and_deduplicated(self):
+		self.assertEqual(self.index.size, 3)
+		self.assertEqual(list(self.index.lookup("memoir")), [1])
+		self.assertEqual(list(self.index.lookup("of")), [2])
+		self.assertNotIn("a", self.index)
+		self.assertEqual(list(self.index.lookup("missing")), [])
+
+	def test_exact_lookup_ignores_longer_terms(self):
+		self.assertEqual(list(self.index.lookup("trans")), [1])
+
+	def test_prefix_lookup_unions_matching_terms(self):
+		self.assertEqual(self.index.terms_with_prefix("transl"), ["translation", "translator"])
+		self.assertEqual(list(self.index.lookup("trans", prefix=True)), [0, 1, 2])
+		self.assertEqual(list(self.index.lookup("memoir", prefix=True)), [1, 2])
+		self.assertEqual(list(self.index.lookup("zzz", prefix=True)), [])
+
+	def test_union(self):
+		self.assertEqual(list(union([[3, 1], [1, 2], []])), [1, 2, 3])
+
+
+class BM25FIndexTests(unittest.TestCase):
+	def setUp(self):
+		weights = {"title": 3.0, "body": 1.0}
+		self.index = BM25FIndex([
+			{"title": ["salt"], "body": ["river", "house"]},
+			{"title": ["house"], "body": ["salt", "river", "night", "garden", "city"]},
+			{"title": ["night"], "body": ["river"]},
+		], weights, b={"title": 0.0, "body": 0.75})
+
+	def _scores(self, *terms, prefix=False):
+		scores = {}
+		for term in terms:
+			self.index.score_into(scores, term, prefix=prefix)
+		return scores
+
+	def test_field_weight_and_length(self):
+		self.assertEqual(self.index.avg_len, {"title": 1.0, "body": 8 / 3})
+		scores = self._scores("salt")
+		self.assertGreater(scores[0], scores[1])
+		self.assertNotIn(2, scores)
+
+	def test_rare_terms_outweigh_common_ones(self):
+		self.assertGreater(self.index.idf["garden"], self.index.idf["river"])
+		scores = self._scores("garden", "river")
+		self.assertEqual(max(scores, key=scores.get), 1)
+
+	def test_prefix_counts_best_expansion_once(self):
+		exact = self._scores("night")
+		self.assertEqual(self._scores("nig", prefix=True), exact)
+		self.assertEqual(self._scores("nig"), {})
+
+
+class FacetBitmapsTests(unittest.TestCase):
+	def setUp(self):
+		self.facets = FacetBitmaps([
+			{"tag": ["memoir", "queer"], "flag": ["stamp"]},
+			{"tag": ["queer"]},
+			{},
+			{"tag": ["memoir"], "flag": ["read"]},
+		])
+
+	def test_bits_round_trip(self):
+		for ordinals in ([], [0], [7, 8], [3, 64, 65, 1000]):
+			self.assertEqual(bits_to_ordinals(ordinals_to_bits(ordinals, 1001)), ordinals)
+
+	def test_and_or(self):
+		f = self.facets
+		self.assertEqual(f.all, 0b1111)
+		self.assertEqual(bits_to_ordinals(f.any_of("tag", ["memoir", "queer"])), [0, 1, 3])
+		self.assertEqual(bits_to_ordinals(f.all_of("tag", ["memoir", "queer"])), [0])
+		self.assertEqual(bits_to_ordinals(f.get("tag", "memoir") & ~f.get("flag", "stamp")), [3])
+		self.assertEqual(bits_to_ordinals(f.present("flag")), [0, 3])
+		self.assertEqual(f.get("tag", "missing"), 0)
+		self.assertEqual(f.get("missing", "x"), 0)
+
+
+class TrigramIndexTests(unittest.TestCase):
+	def setUp(self):
+		self.index = TrigramIndex(["giovanni s room", "a room of one s own", "room", "the color purple", "room"])
+
+	def test_keys_are_distinct(self):
+		self.assertEqual(len(self.index.keys), 4)
+
+	def test_fuzzy_match_scores_dice(self):
+		self.assertEqual(self.index.search("the colour purple", 1, 0.8)[0][0], "the color purple")
+		self.assertEqual(self.index.search("room", 1, 0.9), [("room", 1.0)])
+		self.assertEqual(self.index.search("purple", 5, 0.9), [])
+
+	def test_threshold_filter_matches_full_scan(self):
+		full = self.index.search("rooms", 10, 0.0)
+		for cutoff in (0.2, 0.4, 0.6):
+			self.assertEqual(self.index.search("rooms", 10, cutoff), [hit for hit in full if hit[1] >= cutoff])
+
+
+class PhraseAutomatonTests(unittest.TestCase):
+	def setUp(self):
+		self.automaton = PhraseAutomaton({
+			("he",): "he", ("she",): "she", ("his",): "his", ("he", "rs"): "hers",
+			("south", "east", "asia"): "sea", ("east", "asia"): "ea",
+		})
+
+	def test_find_all_reports_overlapping_matches(self):
+		hits = self.automaton.find_all("south east asia".split())
+		self.assertEqual(sorted(hits), [(0, 3, "sea"), (1, 3, "ea")])
+
+	def test_find_is_leftmost_longest(self):
+		self.assertEqual(self.automaton.find("she he rs south east asia".split()), [(0, 1, "she"), (1, 3, "hers"), (3, 6, "sea")])
+		self.assertEqual(self.automaton.find("in east asia".split()), [(1, 3, "ea")])
+		self.assertEqual(self.automaton.find([]), [])
+
+
+if __name__ == "__main__":
+	unittest.main()
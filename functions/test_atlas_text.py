@@ -0,0 +1,44 @@
+import unittest
+
+from atlas_text import fold_name, fold_spans, fold_terms, fold_text
+
+
+class FoldTextTests(unittest.TestCase):
+	def test_ascii_matches_legacy_normalization(self):
+		self.assertEqual(fold_text("  Giovanni's Room (1956)!  "), "giovanni s room 1956")
+		self.assertEqual(fold_text("snake_case"), "snake case")
+		self.assertEqual(fold_text(None), "")
+
+	def test_folds_latin_diacritics(self):
+		self.assertEqual(fold_text("México"), "mexico")
+		self.assertEqual(fold_text("Abdellah Taïa"), "abdellah taia")
+		self.assertEqual(fold_text("Straße"), "strasse")
+		self.assertEqual(fold_text("Ærø — Łódź"), "aero lodz")
+		self.assertEqual(fold_text("Ｆｕｌｌｗｉｄｔｈ"), "fullwidth")
+
+	def test_keeps_non_latin_scripts(self):
+		self.assertEqual(fold_text("Ελλάδα"), "ελλαδα")
+		self.assertEqual(fold_text("Москва, 1937"), "москва 1937")
+		self.assertEqual(fold_text("東京物語"), "東京物語")
+		self.assertEqual(fold_text("हिन्दी उपन्यास"), "हिन्दी उपन्यास")
+
+	def test_fold_terms_matches_fold_text(self):
+		for value in ("  Giovanni's Room (1956)!  ", "snake_case--Ünïcode", "Москва, 1937", "", None):
+			self.assertEqual(fold_terms(value), fold_text(value).split())
+
+	def test_fold_spans_map_back_to_source(self):
+		for value in ("  Giovanni's Room (1956)!  ", "Straße — Œuvre", "Abdellah Taïa", "Москва, 1937", ""):
+			folded, origin = fold_spans(value)
+			self.assertEqual(folded, fold_text(value))
+			self.assertEqual(len(origin), len(folded))
+		folded, origin = fold_spans("Pedro Páramo")
+		start = folded.index("paramo")
+		self.assertEqual("Pedro Páramo"[origin[start]:origin[start + 5] + 1], "Páramo")
+
+	def test_fold_name_is_memoized(self):
+		self.assertEqual(fold_name("Côte d'Ivoire"), "cote d ivoire")
+		self.assertIs(fold_name("Côte d'Ivoire"), fold_name("Côte d'Ivoire"))
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -43,6 +43,23 @@ class CIConfigTests(unittest.TestCase):
 		self.assertIn("scripts/prepare_functions_venv.sh", content)
 		self.assertIn("functions:atlasCatalog,functions:atlasChat", content)
 
+	def test_rewritten_functions_are_deployed(self):
+		data = json.loads(FIREBASE_JSON.read_text())
+		content = (ROOT / ".github/workflows/firebase-hosting-merge.yml").read_text()
+		for rewrite in data["hosting"]["rewrites"]:
+			if "function" in rewrite:
+				self.assertIn(f"functions:{rewrite['function']}", content)
+
+	def test_hosting_deploy_exports_static_catalog(self):
+		content = (ROOT / ".github/workflows/firebase-hosting-merge.yml").read_text()
+		deploy_job = content[content.index("build_and_deploy:"):content.index("deploy_functions:")]
+		self.assertLess(
+			deploy_job.index("export_static_catalog.py"),
+			deploy_job.index("action-hosting-deploy"),
+		)
+		headers = json.loads(FIREBASE_JSON.read_text())["hosting"]["headers"]
+		self.assertIn("/catalog/catalog.*.json", [h["source"] for h in headers])
+
 	def test_prepare_venv_script_exists(self):
 		self.assertTrue(PREPARE_VENV_SCRIPT.is_file())
 		content = PREPARE_VENV_SCRIPT.read_text()
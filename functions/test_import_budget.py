@@ -0,0 +1,61 @@
+import os
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+FUNCTIONS_DIR = Path(__file__).resolve().parent
+# Cumulative import time of `main` for an HTTP instance, in milliseconds. Generous on purpose:
+# CI runners are noisy, and the goal is to catch a heavy module creeping back in at import.
+IMPORT_BUDGET_MS = int(os.environ.get("ATLAS_IMPORT_BUDGET_MS") or 2500)
+# Loaded lazily (first Firestore read / first chat call) or only by the aggregate trigger.
+DEFERRED_MODULES = (
+	"google.cloud.firestore_v1",
+	"grpc",
+	"firebase_functions.firestore_fn",
+	"atlas_aggregate",
+	"pycountry",
+	"numpy",
+)
+
+
+def _import_main(function_target: str):
+	env = dict(os.environ, FUNCTION_TARGET=function_target)
+	env.pop("ATLAS_WARMUP_ON_IMPORT", None)
+	proc = subprocess.run(
+		[sys.executable, "-X", "importtime", "-c", "import main"],
+		cwd=FUNCTIONS_DIR,
+		env=env,
+		capture_output=True,
+		text=True,
+		timeout=120,
+	)
+	if proc.returncode != 0:
+		raise AssertionError(f"import main failed:\n{proc.stderr[-2000:]}")
+	# "import time: self [us] | cumulative | imported package"
+	cumulative = {}
+	for line in proc.stderr.splitlines():
+		parts = line.split("|")
+		if len(parts) == 3 and parts[1].strip().isdigit():
+			cumulative[parts[2].strip()] = int(parts[1])
+	return cumulative
+
+
+class ImportBudgetTests(unittest.TestCase):
+	def test_http_instance_skips_heavy_imports(self):
+		modules = _import_main("atlasCatalog")
+		for name in DEFERRED_MODULES:
+			self.assertNotIn(name, modules, f"{name} must not be imported by main for HTTP functions")
+		self.assertLess(
+			modules["main"] / 1000,
+			IMPORT_BUDGET_MS,
+			f"import main took {modules['main'] / 1000:.0f}ms (budget {IMPORT_BUDGET_MS}ms)",
+		)
+
+	def test_trigger_instance_and_discovery_load_the_trigger(self):
+		for target in ("atlasCatalogAggregate", ""):
+			self.assertIn("atlas_aggregate", _import_main(target))
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -8,6 +8,9 @@ window.ATLAS_CONFIG = {
 	},
 	atlas: {
 		chatEndpoint: "https://us-central1-YOUR_PROJECT.cloudfunctions.net/atlasChat",
-		catalogEndpoint: "https://us-central1-YOUR_PROJECT.cloudfunctions.net/atlasCatalog"
+		catalogEndpoint: "https://us-central1-YOUR_PROJECT.cloudfunctions.net/atlasCatalog",
+		bookEndpoint: "https://us-central1-YOUR_PROJECT.cloudfunctions.net/atlasBook",
+		// Written by functions/scripts/export_static_catalog.py at deploy; "" disables it.
+		staticCatalogManifest: "/catalog/manifest.json"
 	}
 };
@@ -15,6 +15,7 @@ window.ATLAS_CONFIG = {
 	},
 	atlas: {
 		chatEndpoint: "https://us-central1-ponder-f84ce.cloudfunctions.net/atlasChat",
-		catalogEndpoint: "https://us-central1-ponder-f84ce.cloudfunctions.net/atlasCatalog"
+		catalogEndpoint: "https://us-central1-ponder-f84ce.cloudfunctions.net/atlasCatalog",
+		bookEndpoint: "https://us-central1-ponder-f84ce.cloudfunctions.net/atlasBook"
 	}
 };
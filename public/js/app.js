@@ -26,6 +26,27 @@ function resolveCatalogEndpoint(){
 
 const CATALOG_ENDPOINT = resolveCatalogEndpoint();
 
+function resolveBookEndpoint(){
+	if (typeof atlasEndpoints.bookEndpoint === "string" && atlasEndpoints.bookEndpoint.trim()) {
+		return atlasEndpoints.bookEndpoint.trim();
+	}
+	if (/\/atlasCatalog\/?$/i.test(CATALOG_ENDPOINT)) return CATALOG_ENDPOINT.replace(/\/atlasCatalog\/?$/i, "/atlasBook");
+	return "/api/atlas/book";
+}
+
+const BOOK_ENDPOINT = resolveBookEndpoint();
+
+// Static catalog exported to Hosting at deploy (functions/scripts/export_static_catalog.py).
+// Set atlas.staticCatalogManifest to "" to always use the catalog function.
+function resolveStaticCatalogManifest(){
+	const configured = atlasEndpoints.staticCatalogManifest;
+	if (typeof configured === "string") return configured.trim();
+	if (configured === false) return "";
+	return "/catalog/manifest.json";
+}
+
+const STATIC_CATALOG_MANIFEST = resolveStaticCatalogManifest();
+
 // ─────────── Section Header ───────────
 const MAPTILER_KEY = maptilerConfig.apiKey || "";
 const STYLE_ID     = maptilerConfig.styleId || "";
@@ -254,6 +275,7 @@ function displayCoverUrl(url){
 
 // ─────────── Book catalog (server-side Firestore via Cloud Function) ───────────
 let _allBooksPromise = null;
+let _allBooksRecords = null;
 const _booksByIsoCache = new Map();
 
 function recordBookFromApi(data){
@@ -273,27 +295,178 @@ function recordBookFromApi(data){
 		bookshop_url: bookshopUrl,
 		tags: normalizeTagList(data.tags),
 		stamp: data.stamp === true,
+		has_blurb: data.has_blurb === true || Boolean(summary.trim() || description.trim()),
 		iso2Sets: iso2SetsForRecord(data)
 	};
 }
 
+const CATALOG_STORAGE_KEY = "atlas_catalog_v2";
+// Summaries and descriptions are fetched per book from BOOK_ENDPOINT when opened.
+const CATALOG_FIELDS = "lite";
+
+function catalogUrl(params){
+	const url = new URL(CATALOG_ENDPOINT, window.location.href);
+	for (const [key, value] of Object.entries(params || {})) url.searchParams.set(key, String(value));
+	return url.toString();
+}
+
+function readStoredCatalog(){
+	try {
+		const raw = localStorage.getItem(CATALOG_STORAGE_KEY);
+		if (!raw) return null;
+		const stored = JSON.parse(raw);
+		if (!stored || !Number.isFinite(stored.version) || !Array.isArray(stored.books)) return null;
+		return stored;
+	} catch (_) {
+		return null;
+	}
+}
+
+// digest is the static export's content hash; copies patched from the function carry none.
+function writeStoredCatalog(version, rows, digest = null){
+	if (!Number.isFinite(version) || version <= 0) return;
+	try {
+		localStorage.setItem(CATALOG_STORAGE_KEY, JSON.stringify({ version, digest, books: rows }));
+	} catch (err) {
+		console.warn("[atlas] catalog storage failed", err);
+	}
+}
+
+async function fetchCatalogPayload(params){
+	const res = await fetch(catalogUrl({ fields: CATALOG_FIELDS, ...params }), {
+		method: "GET",
+		credentials: "omit",
+		headers: { Accept: "application/json" }
+	});
+	if (!res.ok) throw new Error(`Catalog HTTP ${res.status}`);
+	return res.json();
+}
+
+function mergeCatalogDelta(rows, payload){
+	const byId = new Map(rows.map(row => [row.id, row]));
+	for (const id of (Array.isArray(payload.deletes) ? payload.deletes : [])) byId.delete(id);
+	for (const row of (Array.isArray(payload.upserts) ? payload.upserts : [])) {
+		if (row && row.id) byId.set(row.id, row);
+	}
+	return Array.from(byId.values());
+}
+
+async function fetchCatalogRows(){
+	const stored = readStoredCatalog();
+	if (stored) {
+		try {
+			const payload = await fetchCatalogPayload({ since: stored.version });
+			if (payload?.delta === true) {
+				const rows = mergeCatalogDelta(stored.books, payload);
+				// A count mismatch means we missed a deletion; resync from a full snapshot.
+				if (rows.length === payload.count) {
+					console.log(`[atlas] catalog delta: ${payload.upserts?.length || 0} upsert(s), ${payload.deletes?.length || 0} delete(s)`);
+					writeStoredCatalog(payload.version, rows);
+					return rows;
+				}
+			} else if (Array.isArray(payload?.books)) {
+				writeStoredCatalog(payload.version, payload.books);
+				return payload.books;
+			}
+		} catch (err) {
+			console.warn("[atlas] catalog delta failed; loading full catalog", err);
+		}
+	}
+
+	const payload = await fetchCatalogPayload({});
+	const rows = Array.isArray(payload?.books) ? payload.books : [];
+	writeStoredCatalog(payload?.version, rows);
+	return rows;
+}
+
+async function fetchStaticCatalogRows(){
+	if (!STATIC_CATALOG_MANIFEST) return null;
+	const manifestUrl = new URL(STATIC_CATALOG_MANIFEST, window.location.href);
+	const res = await fetch(manifestUrl.toString(), {
+		method: "GET",
+		cache: "no-cache",
+		credentials: "omit",
+		headers: { Accept: "application/json" }
+	});
+	if (!res.ok) return null;
+	const manifest = await res.json();
+	if (!manifest?.path || manifest.fields !== CATALOG_FIELDS || !manifest.digest) return null;
+
+	// Only a stored copy of this exact export is reused: versions track the newest update, so a
+	// deletion can leave them unchanged, and function versions are not comparable with exports.
+	const stored = readStoredCatalog();
+	if (stored && stored.digest === manifest.digest) return stored.books;
+
+	const body = await fetch(new URL(manifest.path, manifestUrl).toString(), {
+		method: "GET",
+		credentials: "omit",
+		headers: { Accept: "application/json" }
+	});
+	if (!body.ok) return null;
+	const payload = await body.json();
+	if (!Array.isArray(payload?.books)) return null;
+	writeStoredCatalog(payload.version, payload.books, manifest.digest);
+	return payload.books;
+}
+
+const _bookDetailPromises = new Map();
+// Ids whose last detail fetch failed; their blurb slot offers a retry instead of a skeleton.
+const _bookDetailFailed = new Set();
+
+function bookNeedsDetail(book){
+	return Boolean(book && book.id && book.has_blurb && !getBookDisplayBlurb(book));
+}
+
+async function ensureBookDetail(book){
+	if (!bookNeedsDetail(book)) return book;
+	_bookDetailFailed.delete(book.id);
+	let promise = _bookDetailPromises.get(book.id);
+	if (!promise) {
+		promise = (async () => {
+			const url = new URL(BOOK_ENDPOINT, window.location.href);
+			url.searchParams.set("id", book.id);
+			const res = await fetch(url.toString(), {
+				method: "GET",
+				credentials: "omit",
+				headers: { Accept: "application/json" }
+			});
+			if (!res.ok) throw new Error(`Book HTTP ${res.status}`);
+			const payload = await res.json();
+			return payload?.book || {};
+		})().catch(err => {
+			_bookDetailPromises.delete(book.id);
+			_bookDetailFailed.add(book.id);
+			throw err;
+		});
+		_bookDetailPromises.set(book.id, promise);
+	}
+	const detail = await promise;
+	book.summary = typeof detail.summary === "string" ? detail.summary : "";
+	book.description = typeof detail.description === "string" ? detail.description : "";
+	if (!getBookDisplayBlurb(book)) book.has_blurb = false;
+	return book;
+}
+
 async function loadAllBooks(){
 	if (_allBooksPromise) return _allBooksPromise;
 
 	_allBooksPromise = (async () => {
-		if (!CATALOG_ENDPOINT) throw new Error("Catalog endpoint not configured");
-
-		const res = await fetch(CATALOG_ENDPOINT, {
-			method: "GET",
-			credentials: "omit",
-			headers: { Accept: "application/json" }
-		});
-		if (!res.ok) throw new Error(`Catalog HTTP ${res.status}`);
+		let rows = null;
+		let source = "static catalog";
+		try {
+			rows = await fetchStaticCatalogRows();
+		} catch (err) {
+			console.warn("[atlas] static catalog unavailable; using catalog API", err);
+		}
+		if (!rows) {
+			if (!CATALOG_ENDPOINT) throw new Error("Catalog endpoint not configured");
+			rows = await fetchCatalogRows();
+			source = "catalog API";
+		}
 
-		const payload = await res.json();
-		const rows = Array.isArray(payload?.books) ? payload.books : [];
 		const records = rows.map(recordBookFromApi);
-		console.log(`[atlas] cached ${records.length} book(s) from catalog API`);
+		_allBooksRecords = records;
+		console.log(`[atlas] cached ${records.length} book(s) from ${source}`);
 		return records;
 	})().catch(err => {
 		_allBooksPromise = null;
@@ -415,12 +588,64 @@ function iso2SetsForRecord(data){
 	return { override, setting, author, any: Array.from(anySet) };
 }
 
-function hasIso2Match(iso2Sets, candidates){
-	const pool = iso2Sets?.any;
-	if (!Array.isArray(pool) || !pool.length || !candidates.length) return false;
-	const wanted = new Set(candidates);
-	for (const iso of pool) if (wanted.has(iso)) return true;
-	return false;
+// Bitmap indexes over one records array (bit i = records[i]): per ISO2 code for any place
+// and for overrides, per lowercased tag, and for Editor's Picks. Country, tag and pick
+// filters become word-wise AND/OR instead of per-book membership tests.
+const _recordFacetsCache = new WeakMap();
+
+function recordFacets(records){
+	let facets = _recordFacetsCache.get(records);
+	if (facets) return facets;
+	const words = Math.ceil(records.length / 32);
+	const bitsFor = (map, key) => {
+		let bits = map.get(key);
+		if (!bits){
+			bits = new Uint32Array(words);
+			map.set(key, bits);
+		}
+		return bits;
+	};
+	facets = { words, any: new Map(), override: new Map(), tag: new Map(), hasOverride: new Uint32Array(words), pick: new Uint32Array(words) };
+	records.forEach((rec, i) => {
+		const w = i >>> 5;
+		const bit = 1 << (i & 31);
+		for (const iso of (rec.iso2Sets?.any || [])) bitsFor(facets.any, iso)[w] |= bit;
+		const overrides = rec.iso2Sets?.override || [];
+		if (overrides.length) facets.hasOverride[w] |= bit;
+		for (const iso of overrides) bitsFor(facets.override, iso)[w] |= bit;
+		for (const tag of (rec.tags || [])) bitsFor(facets.tag, String(tag).toLowerCase())[w] |= bit;
+		if (isEditorsPick(rec)) facets.pick[w] |= bit;
+	});
+	_recordFacetsCache.set(records, facets);
+	return facets;
+}
+
+function bitsAnyOf(facets, map, keys){
+	const out = new Uint32Array(facets.words);
+	for (const key of keys){
+		const bits = map.get(key);
+		if (!bits) continue;
+		for (let w = 0; w < out.length; w++) out[w] |= bits[w];
+	}
+	return out;
+}
+
+function bitsAndInto(target, bits){
+	for (let w = 0; w < target.length; w++) target[w] &= bits ? bits[w] : 0;
+	return target;
+}
+
+function recordsInBits(records, bits){
+	const out = [];
+	for (let w = 0; w < bits.length; w++){
+		let word = bits[w];
+		while (word){
+			const low = word & -word;
+			out.push(records[(w << 5) + 31 - Math.clz32(low)]);
+			word ^= low;
+		}
+	}
+	return out;
 }
 
 const HIDDEN_BOOK_TAGS = new Set(["needs review"]);
@@ -529,6 +754,19 @@ async function fetchBooksByCountry(iso2){
 		const normalizedCandidates = Array.from(new Set(candidates.map(normalizeCountryToken).filter(Boolean)));
 		if (!normalizedCandidates.length) return [];
 
+		// Until the full catalog lands, ask the server for this country's pre-sorted slice.
+		if (!_allBooksRecords) {
+			try {
+				const payload = await fetchCatalogPayload({ iso2: ISO });
+				const rows = Array.isArray(payload?.books) ? payload.books : [];
+				const items = rows.map(recordBookFromApi);
+				console.log("[atlas] fetched", items.length, "book(s) for", ISO, "from country bucket");
+				return items;
+			} catch (err) {
+				console.warn("[atlas] country bucket failed; waiting for full catalog", err);
+			}
+		}
+
 		let records = [];
 		try {
 			records = await loadAllBooks();
@@ -537,7 +775,8 @@ async function fetchBooksByCountry(iso2){
 			throw err;
 		}
 
-		const items = records.filter(rec => hasIso2Match(rec.iso2Sets, normalizedCandidates));
+		const facets = recordFacets(records);
+		const items = recordsInBits(records, bitsAnyOf(facets, facets.any, normalizedCandidates));
 
 		items.sort((a,b)=>String(a.title||"").localeCompare(String(b.title||"")));
 		console.log("[atlas] fetched", items.length, "book(s) for", ISO, "from cache");
@@ -631,7 +870,7 @@ function getBookDisplayBlurb(book){
 }
 
 function bookHasExpandableContent(book){
-	return getBookDisplayBlurb(book) !== null;
+	return getBookDisplayBlurb(book) !== null || book?.has_blurb === true;
 }
 
 function buildBookBlurbHtml(book, options = {}){
@@ -670,7 +909,7 @@ function buildBookDetailHtml(book){
 	const author = String(book.author || "").trim() || "Unknown";
 	const cover = displayCoverUrl(book.cover_url);
 	const safeAlt = `Cover of '${title}'`;
-	const summaryHtml = buildBookBlurbHtml(book);
+	const summaryHtml = bookNeedsDetail(book) ? buildBlurbPendingHtml(book) : buildBookBlurbHtml(book);
 	const actionButtonsHtml = buildBookActionButtonsHtml(book);
 	const tags = Array.isArray(book.tags) ? book.tags : [];
 
@@ -705,9 +944,18 @@ function buildBookDetailHtml(book){
   `;
 }
 
+function buildBlurbLoadingHtml(){
+	return `<div class="atlas-book-detail-description"><div class="atlas-loading-lines"><div class="atlas-loading-line long"></div><div class="atlas-loading-line short"></div></div></div>`;
+}
+
+function buildBlurbPendingHtml(book){
+	if (!_bookDetailFailed.has(book.id)) return buildBlurbLoadingHtml();
+	return `<div class="atlas-book-detail-description atlas-book-blurb-error">Couldn't load the description. <button type="button" class="atlas-book-blurb-retry">Try again</button></div>`;
+}
+
 function buildBookExpandPanelHtml(book){
 	const blurb = getBookDisplayBlurb(book);
-	if (!blurb) return "";
+	if (!blurb) return bookNeedsDetail(book) ? buildBlurbPendingHtml(book) : "";
 
 	const summaryHtml = buildBookBlurbHtml(book, { showCitation: false });
 	const footerParts = [];
@@ -789,15 +1037,32 @@ function showBookDetail(book, iso){
 	selectedBook = book;
 	if (infoBox) infoBox.classList.add("is-book-detail");
 
-	mountBookDetail(booksList, book, () => {
+	const onBack = () => {
 		if (infoBox) infoBox.classList.remove("is-book-detail");
 		renderBooks(lastBooksItems, lastBooksIso);
 		requestAnimationFrame(placeInfoChip);
-	});
+	};
+	const mountDetail = () => {
+		mountBookDetail(booksList, book, onBack);
+		const retry = booksList.querySelector(".atlas-book-blurb-retry");
+		if (retry) retry.addEventListener("click", loadDetail);
+		requestAnimationFrame(placeInfoChip);
+	};
+	const loadDetail = () => {
+		const pending = ensureBookDetail(book);
+		mountDetail();
+		pending
+			.catch(err => console.warn("[atlas] book detail failed", err))
+			.then(() => {
+				if (selectedBook === book) mountDetail();
+			});
+	};
 
 	booksList.hidden = false;
 	emptyMsg.hidden = true;
-	requestAnimationFrame(placeInfoChip);
+
+	if (bookNeedsDetail(book)) loadDetail();
+	else mountDetail();
 }
 
 function handleBookCardClick(event){
@@ -2316,22 +2581,12 @@ function applyListFilters(records, { countryIso, tags, editorsPick }){
 		? tags.filter(Boolean).map(t => String(t).toLowerCase())
 		: [];
 
-	return records.filter(rec => {
-		const overrides = rec.iso2Sets?.override || [];
-		if (!overrides.length) return false;
-
-		if (country && !overrides.includes(country)) return false;
-
-		if (editorsPick && !isEditorsPick(rec)) return false;
-
-		if (tagList.length){
-			const bookTags = (rec.tags || []).map(t => String(t).toLowerCase());
-			const matchesAnyTag = tagList.some(t => bookTags.includes(t));
-			if (!matchesAnyTag) return false;
-		}
-
-		return true;
-	});
+	const facets = recordFacets(records);
+	const bits = Uint32Array.from(facets.hasOverride);
+	if (country) bitsAndInto(bits, facets.override.get(country));
+	if (editorsPick) bitsAndInto(bits, facets.pick);
+	if (tagList.length) bitsAndInto(bits, bitsAnyOf(facets, facets.tag, tagList));
+	return recordsInBits(records, bits);
 }
 
 function groupBooksByCountry(records){
@@ -2529,6 +2784,11 @@ async function renderListView(){
 		listViewInner.innerHTML = html;
 		attachCoverFallbacks(listViewInner);
 
+		if (listExpandedBookId){
+			const expandedRow = listViewInner.querySelector(`.atlas-list-book-row[data-book-id="${CSS.escape(listExpandedBookId)}"]`);
+			if (expandedRow) loadListRowDetail(expandedRow, listExpandedBookId);
+		}
+
 		const scrollBookId = listScrollToBookId;
 		listScrollToBookId = null;
 		const scrollTargetId = scrollBookId || listExpandedBookId;
@@ -2564,11 +2824,35 @@ function toggleListBookRow(rowEl){
 		const toggle = rowEl.querySelector(".atlas-book");
 		if (toggle) toggle.setAttribute("aria-expanded", "true");
 		listExpandedBookId = bookId || null;
+		loadListRowDetail(rowEl, bookId);
 	} else {
 		listExpandedBookId = null;
 	}
 }
 
+function findListBook(bookId){
+	for (const section of listSections){
+		const book = section.books.find(b => b.id === bookId);
+		if (book) return book;
+	}
+	return null;
+}
+
+function loadListRowDetail(rowEl, bookId){
+	const book = findListBook(bookId);
+	if (!bookNeedsDetail(book)) return;
+	const renderPanel = () => {
+		const panel = rowEl.querySelector(".atlas-list-book-panel");
+		if (!panel) return;
+		panel.innerHTML = buildBookExpandPanelHtml(book);
+	};
+	const pending = ensureBookDetail(book);
+	renderPanel();
+	pending
+		.catch(err => console.warn("[atlas] book detail failed", err))
+		.then(renderPanel);
+}
+
 async function openBookInListView(bookId){
 	const records = await loadAllBooks();
 	const book = records.find(r => r.id === bookId);
@@ -2599,6 +2883,10 @@ function handleListViewClick(event){
 
 	const rowEl = event.target.closest(".atlas-list-book-row");
 	if (!rowEl || !listViewInner) return;
+	if (event.target.closest(".atlas-book-blurb-retry")){
+		loadListRowDetail(rowEl, rowEl.getAttribute("data-book-id"));
+		return;
+	}
 	if (!event.target.closest(".atlas-book")) return;
 
 	toggleListBookRow(rowEl);